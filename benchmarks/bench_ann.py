@@ -0,0 +1,151 @@
+"""Benchmark approximate (IVF) against exact semantic search.
+
+Fills a chunk store with synthetic chunks, embeds them with a stand-in
+provider that places chunks around a few hundred topic centers, builds
+the local vector store with its ANN index, then times queries with exact
+search and with a range of probes, measuring recall of the exact top k.
+
+Needs NumPy (pip install 'aidocs[vectors]').
+
+Usage:
+    python benchmarks/bench_ann.py [--chunks 100000] [--dimensions 384] [--probes 4 16 64]
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from aidocs_cli.chunk_store import ChunkStore
+from aidocs_cli.embeddings import EmbeddingProvider
+from aidocs_cli.vector_store import VectorStore, update_vector_store
+
+RESULTS_VERSION = 1
+
+# Chunks per synthetic file
+FILE_CHUNKS = 20
+
+# Spread of chunks around their topic center, relative to the center
+NOISE = 1.0
+
+
+class TopicProvider(EmbeddingProvider):
+    """Embeds "topic T chunk N" as the center of topic T plus noise seeded by N.
+
+    Queries draw their noise from another stream, so they are new points
+    near a topic rather than copies of stored chunks.
+    """
+
+    name = "bench"
+    max_batch_inputs = 4096
+    max_batch_tokens = 4096 * 512
+
+    def __init__(self, dimensions: int, topics: int, seed: int):
+        super().__init__("bench-topics", dimensions)
+        self.centers = np.random.default_rng(seed).standard_normal((topics, dimensions)).astype(np.float32)
+        self.seed = seed
+
+    def vector(self, topic: int, chunk: int, stream: int = 0) -> np.ndarray:
+        noise = np.random.default_rng((self.seed, stream, chunk)).standard_normal(self.dimensions).astype(np.float32)
+        return self.centers[topic] + NOISE * noise
+
+    def embed(self, inputs: list[str]) -> Optional[list[list[float]]]:
+        vectors = []
+        for text in inputs:
+            _, topic, _, chunk = text.split()
+            vectors.append(self.vector(int(topic), int(chunk)).tolist())
+        return vectors
+
+
+def fill_chunk_store(docs: Path, chunks: int, topics: int, seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    files = []
+    for start in range(0, chunks, FILE_CHUNKS):
+        file_chunks = [
+            {"chunk_index": i, "title": f"Chunk {start + i}", "hierarchy": [f"Chunk {start + i}"],
+             "content": f"topic {rng.integers(topics)} chunk {start + i}"}
+            for i in range(min(FILE_CHUNKS, chunks - start))
+        ]
+        files.append((f"docs/file-{start // FILE_CHUNKS:06}.md", {
+            "file_hash": f"sha256:{start}",
+            "chunked_at": "2024-01-01T00:00:00",
+            "total_chunks": len(file_chunks),
+            "chunks": file_chunks,
+        }))
+    with ChunkStore.open(docs) as store:
+        store.put_many(files)
+
+
+def time_queries(vectors: VectorStore, queries: np.ndarray, k: int, probes: int) -> tuple[float, list[set]]:
+    """Run every query, returning the median latency and the hits of each."""
+    latencies = []
+    hits = []
+    for query in queries:
+        start = time.perf_counter()
+        results = vectors.search(query, k, probes)
+        latencies.append(time.perf_counter() - start)
+        hits.append({(path, chunk_index) for path, chunk_index, _ in results})
+    return float(np.median(latencies)), hits
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--lists", type=int, default=None, help="ANN clusters (default: about sqrt(chunks))")
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", type=Path, help="Write results here instead of stdout")
+    args = parser.parse_args()
+
+    provider = TopicProvider(args.dimensions, args.topics, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = np.array([provider.vector(int(rng.integers(args.topics)), i, stream=1) for i in range(args.queries)])
+
+    with tempfile.TemporaryDirectory(prefix="aidocs-ann-") as tmp:
+        docs = Path(tmp) / "docs"
+        fill_chunk_store(docs, args.chunks, args.topics, args.seed)
+
+        start = time.perf_counter()
+        stats = update_vector_store(docs, provider, ann_min_chunks=0, ann_lists=args.lists)
+        build_seconds = time.perf_counter() - start
+        print(f"Built {stats['chunks']:,} x {args.dimensions} vectors, {stats['lists']} lists in {build_seconds:.1f}s",
+              file=sys.stderr)
+
+        vectors = VectorStore.open(docs)
+        exact_seconds, exact_hits = time_queries(vectors, queries, args.k, probes=0)
+        results = {"exact": {"seconds": exact_seconds, "recall": 1.0}}
+        print(f"{'exact':>12} {exact_seconds * 1000:8.2f} ms  recall@{args.k} 1.000", file=sys.stderr)
+
+        for probes in args.probes:
+            seconds, hits = time_queries(vectors, queries, args.k, probes)
+            recall = float(np.mean([len(a & b) / len(b) for a, b in zip(hits, exact_hits) if b]))
+            results[f"probes={probes}"] = {"seconds": seconds, "recall": recall}
+            print(f"{f'probes={probes}':>12} {seconds * 1000:8.2f} ms  recall@{args.k} {recall:.3f}"
+                  f"  {exact_seconds / seconds:5.1f}x faster", file=sys.stderr)
+
+    output = json.dumps({
+        "version": RESULTS_VERSION,
+        "chunks": stats["chunks"],
+        "dimensions": args.dimensions,
+        "lists": stats["lists"],
+        "k": args.k,
+        "build_seconds": build_seconds,
+        "results": results,
+    }, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Micro-benchmark for the markdown heading splitter.
+
+Compares split_by_headings against the previous multi-pass implementation
+(kept below as the baseline) on a long reference page.
+
+Usage:
+    python benchmarks/bench_chunker.py [--headings 10000] [--repeat 3]
+"""
+
+import argparse
+import re
+import time
+
+from aidocs_cli.chunker import split_by_headings
+
+
+def baseline_split_by_headings(content: str, split_level: int = 2) -> list[dict]:
+    """The previous implementation: regex per line, backward hierarchy walk,
+    and a rescan of all headings per chunk."""
+    headings = []
+    lines = content.split("\n")
+    for i, line in enumerate(lines):
+        match = re.match(r"^(#{1,6})\s+(.+)$", line)
+        if match:
+            headings.append({"level": len(match.group(1)), "title": match.group(2).strip(), "line": i})
+
+    def get_hierarchy(current_index: int) -> list[str]:
+        current = headings[current_index]
+        hierarchy = [current["title"]]
+        for i in range(current_index - 1, -1, -1):
+            if headings[i]["level"] < current["level"]:
+                hierarchy.insert(0, headings[i]["title"])
+                current = headings[i]
+        return hierarchy
+
+    split_indices = [i for i, h in enumerate(headings) if h["level"] == split_level]
+    chunks = []
+    for i, split_idx in enumerate(split_indices):
+        start_line = headings[split_idx]["line"]
+        end_line = headings[split_indices[i + 1]]["line"] if i + 1 < len(split_indices) else len(lines)
+        chunks.append({
+            "title": headings[split_idx]["title"],
+            "hierarchy": get_hierarchy(split_idx),
+            "content": "\n".join(lines[start_line:end_line]).strip(),
+            "headings": [
+                f"{'#' * h['level']} {h['title']}"
+                for h in headings
+                if start_line <= h["line"] < end_line
+            ],
+        })
+    return chunks
+
+
+def make_reference_page(headings: int) -> str:
+    """Build a page with one H1 and the given number of ##/### headings."""
+    lines = ["# API Reference", "", "Overview.", ""]
+    for i in range(headings - 1):
+        level = 2 if i % 3 == 0 else 3
+        lines += [f"{'#' * level} Method {i}", "", f"Calls method {i}.", ""]
+    return "\n".join(lines)
+
+
+def best_time(func, content: str, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(content)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--headings", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    content = make_reference_page(args.headings)
+    baseline = best_time(baseline_split_by_headings, content, args.repeat)
+    current = best_time(split_by_headings, content, args.repeat)
+
+    print(f"headings:  {args.headings:,} ({len(content):,} chars)")
+    print(f"baseline:  {baseline * 1000:9.1f} ms")
+    print(f"current:   {current * 1000:9.1f} ms")
+    print(f"speedup:   {baseline / current:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Benchmark suite for chunking, manifest and sync planning.
+
+Generates a synthetic corpus (see corpus.py), times the chunking
+pipeline on it and writes the results as JSON. Given the results of an
+earlier run as a baseline, fails when a benchmark got slower than its
+threshold allows.
+
+Usage:
+    python benchmarks/bench_suite.py [--size medium] [--repeat 5] [--output results.json]
+    python benchmarks/bench_suite.py --baseline results.json  # exit 1 on regressions
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from corpus import SIZES, generate_corpus
+
+from aidocs_cli.chunker import (
+    chunk_directory,
+    load_manifest,
+    save_manifest,
+    split_by_headings,
+    split_by_tokens,
+    update_manifest,
+)
+from aidocs_cli.embeddings import generate_sync_sql
+
+RESULTS_VERSION = 1
+
+# Allowed slowdown against the baseline, as a ratio of the best times
+DEFAULT_MAX_SLOWDOWN = 1.25
+THRESHOLDS = {
+    # Dominated by stat calls and small file writes; noisier run to run
+    "chunk_directory.noop": 1.5,
+    "manifest.load": 1.5,
+    "manifest.save": 1.5,
+    "manifest.update": 1.5,
+}
+
+# Differences below this are timer and scheduler noise, never regressions
+MIN_DELTA_SECONDS = 0.01
+
+# Share of files edited before the incremental chunking run
+INCREMENTAL_SHARE = 0.01
+
+
+def best_of(repeat: int, run: Callable[[], None], setup: Optional[Callable[[], None]] = None) -> dict:
+    """Time run() repeat times, calling setup() untimed before each."""
+    runs = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        run()
+        runs.append(time.perf_counter() - start)
+    return {"seconds": min(runs), "runs": runs}
+
+
+def run_suite(docs: Path, repeat: int, jobs: Optional[int]) -> dict[str, dict]:
+    """Run every benchmark against a generated docs tree."""
+    chunks_dir = docs / ".chunks"
+    md_files = sorted(docs.rglob("*.md"))
+    contents = [path.read_text(encoding="utf-8") for path in md_files]
+    results = {}
+
+    def clear_chunks() -> None:
+        shutil.rmtree(chunks_dir, ignore_errors=True)
+
+    results["split_by_headings"] = best_of(repeat, lambda: [split_by_headings(c) for c in contents])
+    results["split_by_tokens"] = best_of(repeat, lambda: [split_by_tokens(c) for c in contents])
+
+    run_chunking = lambda: chunk_directory(docs, jobs=jobs)  # noqa: E731
+    results["chunk_directory.cold"] = best_of(repeat, run_chunking, setup=clear_chunks)
+    results["chunk_directory.noop"] = best_of(repeat, run_chunking)
+
+    edited = md_files[::max(1, round(1 / INCREMENTAL_SHARE))]
+    edits = iter(range(repeat))
+
+    def edit_files() -> None:
+        edit = next(edits)
+        for path in edited:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(f"\nEdit {edit}.\n")
+            # Keep the mtime old enough for the stat of unedited files to be trusted
+            st = path.stat()
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns - 10_000_000_000))
+
+    results["chunk_directory.incremental"] = best_of(repeat, run_chunking, setup=edit_files)
+
+    manifest = load_manifest(docs)
+    some_file = next(iter(manifest["files"]))
+    results["manifest.load"] = best_of(repeat, lambda: load_manifest(docs))
+    results["manifest.save"] = best_of(repeat, lambda: save_manifest(docs, manifest))
+    results["manifest.update"] = best_of(
+        repeat,
+        lambda: update_manifest(docs, {some_file: manifest["files"][some_file]}),
+    )
+
+    def plan_sync() -> None:
+        result = generate_sync_sql(docs, dry=True)
+        if not result["success"]:
+            raise RuntimeError(result.get("error"))
+
+    results["generate_sync_sql.dry"] = best_of(repeat, plan_sync)
+
+    return results
+
+
+def compare(results: dict, baseline: dict, max_slowdown: Optional[float]) -> list[str]:
+    """Find benchmarks slower than their threshold against the baseline.
+
+    Returns:
+        List of regression descriptions (empty if none)
+    """
+    if baseline["corpus"] != results["corpus"]:
+        raise SystemExit(f"Baseline corpus {baseline['corpus']} differs from {results['corpus']}")
+
+    regressions = []
+    for name, result in results["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+
+        threshold = max_slowdown or THRESHOLDS.get(name, DEFAULT_MAX_SLOWDOWN)
+        ratio = result["seconds"] / previous["seconds"]
+        regressed = ratio > threshold and result["seconds"] - previous["seconds"] > MIN_DELTA_SECONDS
+        line = f"{name:30} {previous['seconds'] * 1000:10.1f} ms {result['seconds'] * 1000:10.1f} ms {ratio:6.2f}x"
+        print(line + ("  REGRESSION" if regressed else ""), file=sys.stderr)
+        if regressed:
+            regressions.append(f"{name}: {ratio:.2f}x slower (threshold {threshold:.2f}x)")
+
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=list(SIZES), default="medium")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes for chunk_directory")
+    parser.add_argument("--output", type=Path, help="Write results here instead of stdout")
+    parser.add_argument("--baseline", type=Path, help="Results of an earlier run to check for regressions")
+    parser.add_argument("--max-slowdown", type=float, help="Override every threshold (e.g. 1.1)")
+    parser.add_argument("--workdir", type=Path, help="Generate the corpus here instead of a temp dir")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="aidocs-bench-") as tmp:
+        docs = (args.workdir or Path(tmp)) / "docs"
+        corpus = generate_corpus(docs, args.size, args.seed)
+        print(f"Corpus: {corpus['files']:,} files, {corpus['bytes'] / 1e6:.1f} MB", file=sys.stderr)
+        timings = run_suite(docs, args.repeat, args.jobs)
+
+    results = {
+        "version": RESULTS_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "corpus": corpus,
+        "repeat": args.repeat,
+        "results": timings,
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text(encoding="utf-8")), args.max_slowdown)
+        if regressions:
+            print("\n".join(["", "Regressions:"] + regressions), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Synthetic documentation trees for benchmarks.
+
+Generates reproducible docs trees that look like real generated docs:
+nested directories, deep heading nesting, front matter, code fences with
+comment lines that look like headings, tables, HTML blocks, boilerplate
+sections shared by many pages, and translated copies of pages where only
+some sections are translated.
+
+Usage:
+    python benchmarks/corpus.py DIR [--size medium] [--seed 1]
+"""
+
+import argparse
+import os
+import random
+import shutil
+from pathlib import Path
+
+# pages: English pages; languages: translated copies of part of them;
+# large_pages: multi-MB generated reference pages
+SIZES = {
+    "small": {"pages": 30, "languages": ["fr"], "large_pages": 0},
+    "medium": {"pages": 600, "languages": ["fr", "de"], "large_pages": 0},
+    "huge": {"pages": 5000, "languages": ["fr", "de", "ja"], "large_pages": 2},
+}
+
+# Share of pages that get translated, and of their sections left untouched
+TRANSLATED_PAGES = 0.3
+UNTRANSLATED_SECTIONS = 0.5
+
+# Sections of a large reference page (about 10 MB)
+LARGE_PAGE_SECTIONS = 20_000
+
+# Fixed mtime for every file, well outside chunk_directory's racy window,
+# so repeated runs take the stat fast path
+MTIME_NS = 1_600_000_000 * 1_000_000_000
+
+WORDS = (
+    "user account project team invoice payment webhook token request response "
+    "field value record list filter sort page limit error status create update "
+    "delete archive restore export import schedule notify permission role admin "
+    "setting option default required optional string integer boolean returns"
+).split()
+
+AREAS = ["guides", "api", "reference", "admin", "integrations", "billing"]
+TOPICS = ["users", "teams", "projects", "invoices", "webhooks", "reports", "roles", "exports"]
+
+BOILERPLATE = [
+    "## Authentication\n\nAll requests must include a bearer token in the "
+    "`Authorization` header. Tokens are created under Settings > API and can "
+    "be revoked at any time. Requests without a valid token get a 401 response.",
+    "## Rate limits\n\nEach token may make 600 requests per minute. Responses "
+    "include `X-RateLimit-Remaining`; a 429 response carries `Retry-After`.",
+    "## Need help?\n\nContact support@example.com or open a ticket from the dashboard.",
+]
+
+
+def sentence(rng: random.Random, words: int = 12) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def paragraph(rng: random.Random) -> str:
+    return " ".join(sentence(rng, rng.randint(6, 18)) for _ in range(rng.randint(2, 6)))
+
+
+def code_block(rng: random.Random) -> str:
+    lines = ["```bash", "# install the client"]
+    for _ in range(rng.randint(2, 8)):
+        lines.append(f"curl -X {rng.choice(['GET', 'POST', 'DELETE'])} https://api.example.com/{rng.choice(TOPICS)}")
+    lines += ["## not a heading", "```"]
+    return "\n".join(lines)
+
+
+def table(rng: random.Random) -> str:
+    rows = ["| Field | Type | Description |", "| --- | --- | --- |"]
+    for _ in range(rng.randint(2, 6)):
+        rows.append(f"| `{rng.choice(WORDS)}` | {rng.choice(['string', 'integer', 'boolean'])} | {sentence(rng, 6)} |")
+    return "\n".join(rows)
+
+
+def block(rng: random.Random) -> str:
+    kind = rng.random()
+    if kind < 0.55:
+        return paragraph(rng)
+    if kind < 0.75:
+        return code_block(rng)
+    if kind < 0.9:
+        return table(rng)
+    if kind < 0.95:
+        return f"![{rng.choice(TOPICS)}](images/{rng.choice(TOPICS)}.png)"
+    return f'<div class="note">\n\n# {sentence(rng, 3)}\n\n</div>'
+
+
+def make_sections(rng: random.Random, title: str) -> list[str]:
+    """Build a page as a list of sections, each starting with its heading.
+
+    Headings go up to ###### with a random walk over levels.
+    """
+    front_matter = f"---\ntitle: {title}\ntags: [{rng.choice(TOPICS)}]\n---\n\n" if rng.random() < 0.3 else ""
+    sections = [f"{front_matter}# {title}\n\n{paragraph(rng)}"]
+
+    level = 2
+    for _ in range(rng.randint(4, 14)):
+        level = max(2, min(6, level + rng.choice([-2, -1, 0, 1, 1])))
+        heading = f"{'#' * level} {sentence(rng, rng.randint(1, 4))[:-1]}"
+        body = "\n\n".join(block(rng) for _ in range(rng.randint(1, 4)))
+        sections.append(f"{heading}\n\n{body}")
+
+    for text in BOILERPLATE:
+        if rng.random() < 0.6:
+            sections.append(text)
+
+    return sections
+
+
+def translate(rng: random.Random, section: str, language: str) -> str:
+    """Fake a translation by tagging every prose line."""
+    if rng.random() < UNTRANSLATED_SECTIONS:
+        return section
+    return "\n".join(
+        f"{line} [{language}]" if line and line[0].isalpha() else line
+        for line in section.split("\n")
+    )
+
+
+def make_large_page(rng: random.Random, title: str) -> str:
+    lines = [f"# {title}", "", paragraph(rng), ""]
+    for i in range(LARGE_PAGE_SECTIONS):
+        level = 2 if i % 4 == 0 else 3
+        lines += [f"{'#' * level} {title} method {i}", "", paragraph(rng), "", code_block(rng), ""]
+    return "\n".join(lines)
+
+
+def generate_corpus(root: Path, size: str = "medium", seed: int = 1) -> dict:
+    """Write a synthetic docs tree, replacing anything already at root.
+
+    Args:
+        root: Directory to create the docs tree in
+        size: One of SIZES
+        seed: Random seed; the same size and seed give the same tree
+
+    Returns:
+        Dict with "size", "seed", "files" and "bytes"
+    """
+    spec = SIZES[size]
+    rng = random.Random(seed)
+
+    if root.exists():
+        shutil.rmtree(root)
+
+    pages: dict[Path, str] = {}
+    for i in range(spec["pages"]):
+        area = rng.choice(AREAS)
+        depth = rng.randint(0, 2)
+        parts = [area] + [rng.choice(TOPICS) for _ in range(depth)]
+        title = f"{rng.choice(TOPICS).title()} {sentence(rng, 2)[:-1]}"
+        sections = make_sections(rng, title)
+        rel_path = Path(*parts) / f"page-{i:05}.md"
+        pages[rel_path] = "\n\n".join(sections) + "\n"
+
+        if rng.random() < TRANSLATED_PAGES:
+            for language in spec["languages"]:
+                translated = [translate(rng, section, language) for section in sections]
+                pages[Path(language) / rel_path] = "\n\n".join(translated) + "\n"
+
+    for i in range(spec["large_pages"]):
+        pages[Path("reference") / f"generated-{i}.md"] = make_large_page(rng, f"Generated API {i}")
+
+    total_bytes = 0
+    for rel_path, content in pages.items():
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+        os.utime(path, ns=(MTIME_NS, MTIME_NS))
+        total_bytes += path.stat().st_size
+
+    return {"size": size, "seed": seed, "files": len(pages), "bytes": total_bytes}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("dir", type=Path)
+    parser.add_argument("--size", choices=list(SIZES), default="medium")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    info = generate_corpus(args.dir, args.size, args.seed)
+    print(f"{info['files']:,} files, {info['bytes'] / 1e6:.1f} MB in {args.dir}")
+
+
+if __name__ == "__main__":
+    main()
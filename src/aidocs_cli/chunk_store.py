@@ -0,0 +1,383 @@
+"""Consolidated SQLite store for markdown chunks."""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from array import array
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+CHUNK_STORE_FILENAME = "chunks.db"
+
+# Bumped when the tables change; a store with another version is rebuilt
+SCHEMA_VERSION = 2
+
+# Bytes of a chunk content's key (a truncated SHA-256)
+KEY_SIZE = 16
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_CHUNK = 500
+
+# Chunks streamed through put_iter() and iter_chunks() are written and read
+# in batches of at most this many (and for writes, this much content)
+_STREAM_CHUNKS = 64
+_STREAM_BYTES = 1024 * 1024
+
+# Let SQLite read the database through a memory map instead of read() calls
+MMAP_SIZE = 256 * 1024 * 1024
+
+
+def get_chunk_store_path(docs_dir: Path) -> Path:
+    """Get the path of the chunk store for a docs directory."""
+    return docs_dir / ".chunks" / CHUNK_STORE_FILENAME
+
+
+class ChunkStore:
+    """All chunks of a docs directory in one SQLite database.
+
+    Replaces the per-file .chunks.json files. Each file is one row keyed by
+    its manifest path, holding its chunks as a compact JSON array plus an
+    index of each chunk's byte offsets in it. Loading a file is a single
+    JSON parse, and a single chunk is read straight from its byte range
+    with incremental blob I/O. The database is memory-mapped for reads.
+
+    Chunk contents are deduplicated across the tree: each distinct content
+    is stored once in the contents table, keyed by its hash and counting
+    the chunks that refer to it, and a file's row lists the key of each
+    of its chunks. Boilerplate repeated across pages costs one copy.
+    """
+
+    def __init__(self, path: Path, readonly: bool = False):
+        self.path = path
+        self.lock = threading.Lock()
+
+        if readonly:
+            self.conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(str(path), check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            if self.schema_version() != SCHEMA_VERSION:
+                self._create_tables()
+
+        self.conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+
+    def _create_tables(self) -> None:
+        # Chunks can always be rebuilt from the markdown, so an older
+        # layout is dropped rather than migrated
+        with self.conn:
+            self.conn.execute("DROP TABLE IF EXISTS files")
+            self.conn.execute("DROP TABLE IF EXISTS contents")
+            self.conn.execute(
+                "CREATE TABLE files ("
+                " path TEXT PRIMARY KEY,"
+                " file_hash TEXT NOT NULL,"
+                " chunked_at TEXT NOT NULL,"
+                " total_chunks INTEGER NOT NULL,"
+                " offsets BLOB NOT NULL,"
+                " content_keys BLOB NOT NULL,"
+                " chunks BLOB NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE contents ("
+                " key BLOB PRIMARY KEY,"
+                " refs INTEGER NOT NULL,"
+                " content TEXT NOT NULL)"
+            )
+            self.conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def schema_version(self) -> int:
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    @classmethod
+    def open(cls, docs_dir: Path, readonly: bool = False) -> Optional["ChunkStore"]:
+        """Open the chunk store of a docs directory.
+
+        Returns:
+            The store, or None if readonly and it does not exist yet (or
+            was written by a version with other tables).
+        """
+        path = get_chunk_store_path(docs_dir)
+        if readonly and not path.exists():
+            return None
+
+        store = cls(path, readonly=readonly)
+        if readonly and store.schema_version() != SCHEMA_VERSION:
+            store.close()
+            return None
+        return store
+
+    def __enter__(self) -> "ChunkStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def put(self, path: str, chunks_data: dict) -> None:
+        """Store the chunks of a file, replacing any previous ones."""
+        self.put_many([(path, chunks_data)])
+
+    def put_many(self, files: Iterable[tuple[str, dict]]) -> None:
+        """Store the chunks of several files in one transaction."""
+        self.put_iter((path, data["file_hash"], data["chunks"], data.get("chunked_at")) for path, data in files)
+
+    def put_iter(
+        self,
+        files: Iterable[tuple],
+        skip_errors: tuple[type[BaseException], ...] = (),
+    ) -> dict[str, int]:
+        """Store files as their chunks are produced, in one transaction.
+
+        Both the files and each file's chunks are consumed lazily. Contents
+        are written a few dozen chunks at a time, so only the metadata of
+        the current file's chunks is held, never their text.
+
+        Args:
+            files: (path, file hash, chunks) or (path, file hash, chunks,
+                chunked at) of each file; the chunks may be any iterable
+            skip_errors: Exceptions that, raised while reading a file's
+                chunks, roll back just that file instead of the whole write
+
+        Returns:
+            Number of chunks stored for each file. A file without chunks
+            (or skipped on an error) is left as it was.
+        """
+        counts = {}
+        with self.lock, self.conn:
+            # Explicitly, or releasing the first savepoint would commit
+            self.conn.execute("BEGIN")
+            for path, file_hash, chunks, *chunked_at in files:
+                self.conn.execute("SAVEPOINT put_file")
+                try:
+                    count = self._put_file(path, file_hash, chunks, *chunked_at)
+                except skip_errors:
+                    self.conn.execute("ROLLBACK TO put_file")
+                    count = 0
+                self.conn.execute("RELEASE put_file")
+                if count:
+                    counts[path] = count
+        return counts
+
+    def _put_file(self, path: str, file_hash: str, chunks: Iterable[dict], chunked_at: Optional[str] = None) -> int:
+        """Write one file's chunks (caller holds the lock and a transaction)."""
+        keys = []
+        parts = []
+        ref_changes: Counter = Counter()
+        contents = {}
+        pending_bytes = 0
+        for chunk in chunks:
+            key = content_key(chunk["content"])
+            keys.append(key)
+            ref_changes[key] += 1
+            contents[key] = chunk["content"]
+            pending_bytes += len(chunk["content"])
+            # Keep the key order; the content is filled back in on load
+            parts.append(_encode_chunk({**chunk, "content": None}))
+            if len(contents) >= _STREAM_CHUNKS or pending_bytes >= _STREAM_BYTES:
+                self._change_refs(ref_changes, contents)
+                ref_changes, contents, pending_bytes = Counter(), {}, 0
+        if not keys:
+            return 0
+
+        ref_changes.subtract(self._stored_keys([path]))
+        offsets, blob = _join_chunks(parts)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (path, file_hash, chunked_at or datetime.now(timezone.utc).isoformat(),
+             len(keys), offsets, b"".join(keys), blob),
+        )
+        self._change_refs(ref_changes, contents)
+        return len(keys)
+
+    def delete(self, paths: list[str]) -> None:
+        """Remove files and their chunks."""
+        with self.lock, self.conn:
+            ref_changes: Counter = Counter()
+            ref_changes.subtract(self._stored_keys(paths))
+            self.conn.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in paths])
+            self._change_refs(ref_changes, {})
+
+    def _stored_keys(self, paths: list[str]) -> list[bytes]:
+        """Get the content keys of the stored chunks of files."""
+        keys = []
+        for path in paths:
+            row = self.conn.execute("SELECT content_keys FROM files WHERE path = ?", (path,)).fetchone()
+            if row:
+                keys += _split_keys(row[0])
+        return keys
+
+    def _change_refs(self, ref_changes: Counter, contents: dict[bytes, str]) -> None:
+        """Apply reference count changes, adding new contents and dropping unused ones."""
+        added = [(key, count, contents[key]) for key, count in ref_changes.items() if count > 0]
+        removed = [(-count, key) for key, count in ref_changes.items() if count < 0]
+
+        self.conn.executemany(
+            "INSERT INTO contents VALUES (?, ?, ?)"
+            " ON CONFLICT (key) DO UPDATE SET refs = refs + excluded.refs",
+            added,
+        )
+        if removed:
+            self.conn.executemany("UPDATE contents SET refs = refs - ? WHERE key = ?", removed)
+            self.conn.executemany("DELETE FROM contents WHERE key = ? AND refs <= 0", [(key,) for _, key in removed])
+
+    def duplicate_stats(self) -> dict:
+        """Count stored chunks against their distinct contents.
+
+        Returns:
+            Dict with "chunks", "unique" and "duplicate_ratio" (the share
+            of chunks that reuse another chunk's stored content)
+        """
+        with self.lock:
+            chunks, unique = self.conn.execute("SELECT COALESCE(SUM(refs), 0), COUNT(*) FROM contents").fetchone()
+        return {
+            "chunks": chunks,
+            "unique": unique,
+            "duplicate_ratio": (chunks - unique) / chunks if chunks else 0.0,
+        }
+
+    def hashes(self) -> dict[str, str]:
+        """Get the content hash of every stored file."""
+        with self.lock:
+            return dict(self.conn.execute("SELECT path, file_hash FROM files"))
+
+    def get(self, path: str) -> Optional[dict]:
+        """Load a file's chunks, in the shape chunk_file returns.
+
+        Returns:
+            Dict with file info and chunks, or None if the file is not stored.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT file_hash, chunked_at, total_chunks, content_keys, chunks FROM files WHERE path = ?",
+                (path,),
+            ).fetchone()
+            if row is None:
+                return None
+
+            keys = _split_keys(row[3])
+            contents = self._contents(keys)
+
+        chunks = json.loads(row[4])
+        for chunk, key in zip(chunks, keys):
+            chunk["content"] = contents[key]
+
+        return {
+            "file_path": path,
+            "file_hash": row[0],
+            "chunked_at": row[1],
+            "total_chunks": row[2],
+            "chunks": chunks,
+        }
+
+    def get_chunk(self, path: str, chunk_index: int) -> Optional[dict]:
+        """Load a single chunk, reading only its bytes."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT rowid, offsets, substr(content_keys, ?, ?) FROM files WHERE path = ?",
+                (chunk_index * KEY_SIZE + 1, KEY_SIZE, path),
+            ).fetchone()
+            if row is None:
+                return None
+
+            offsets = array("Q")
+            offsets.frombytes(row[1])
+            if not 0 <= chunk_index < len(offsets) - 1:
+                return None
+
+            start = offsets[chunk_index]
+            with self.conn.blobopen("files", "chunks", row[0], readonly=True) as blob:
+                blob.seek(start)
+                data = blob.read(offsets[chunk_index + 1] - 1 - start)
+
+            content = self._contents([row[2]])[row[2]]
+
+        chunk = json.loads(data)
+        chunk["content"] = content
+        return chunk
+
+    def iter_chunks(self, path: str) -> Iterator[dict]:
+        """Yield a file's chunks, reading a few dozen at a time.
+
+        Unlike get(), memory doesn't grow with the size of the file.
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT rowid, offsets, content_keys FROM files WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return
+
+        offsets = array("Q")
+        offsets.frombytes(row[1])
+        keys = _split_keys(row[2])
+        for start in range(0, len(keys), _STREAM_CHUNKS):
+            batch = keys[start:start + _STREAM_CHUNKS]
+            with self.lock:
+                with self.conn.blobopen("files", "chunks", row[0], readonly=True) as blob:
+                    blob.seek(offsets[start])
+                    data = blob.read(offsets[start + len(batch)] - 1 - offsets[start])
+                contents = self._contents(batch)
+
+            chunks = json.loads(b"[" + data + b"]")
+            for chunk, key in zip(chunks, batch):
+                chunk["content"] = contents[key]
+                yield chunk
+
+    def iter_files(self) -> Iterator[tuple[str, Iterator[dict]]]:
+        """Yield (path, chunks) for every stored file, in path order.
+
+        The chunks are read as they are iterated, see iter_chunks().
+        """
+        with self.lock:
+            paths = [path for path, in self.conn.execute("SELECT path FROM files ORDER BY path")]
+        for path in paths:
+            yield path, self.iter_chunks(path)
+
+    def _contents(self, keys: list[bytes]) -> dict[bytes, str]:
+        """Look up chunk contents by key (caller holds the lock)."""
+        unique = list(dict.fromkeys(keys))
+        contents = {}
+        for i in range(0, len(unique), _QUERY_CHUNK):
+            batch = unique[i:i + _QUERY_CHUNK]
+            placeholders = ",".join("?" * len(batch))
+            contents.update(self.conn.execute(
+                f"SELECT key, content FROM contents WHERE key IN ({placeholders})",
+                batch,
+            ))
+        return contents
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+def content_key(content: str) -> bytes:
+    """Get the key a chunk content is stored under."""
+    return hashlib.sha256(content.encode("utf-8")).digest()[:KEY_SIZE]
+
+
+def _split_keys(data: bytes) -> list[bytes]:
+    return [data[i:i + KEY_SIZE] for i in range(0, len(data), KEY_SIZE)]
+
+
+def _encode_chunk(chunk: dict) -> bytes:
+    return json.dumps(chunk, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _join_chunks(parts: list[bytes]) -> tuple[bytes, bytes]:
+    """Join encoded chunks into one JSON array and the byte range of each element.
+
+    Returns:
+        (offsets, blob) where chunk i is blob[offsets[i]:offsets[i + 1] - 1]
+        (each range is followed by a comma or the closing bracket)
+    """
+    offsets = array("Q")
+    position = 1  # past the opening bracket
+    for part in parts:
+        offsets.append(position)
+        position += len(part) + 1  # element and the comma after it
+    offsets.append(position)
+
+    return offsets.tobytes(), b"[" + b",".join(parts) + b"]"
@@ -1,42 +1,99 @@
 """Markdown chunking utilities for vector DB import."""
 
+import codecs
 import hashlib
-import json
+import io
+import os
 import re
+import time
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
 from datetime import datetime, timezone
+from itertools import chain, islice
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from .chunk_store import ChunkStore
+from .embeddings import estimate_tokens
+from .markdown_blocks import BLANK, HEADING, HEADING_RE, BlockScanner, find_headings  # noqa: F401
+from .search_index import update_search_index
+from .state import JournaledState
+
+# Below this many files, chunk in-process rather than start a worker pool
+PARALLEL_MIN_FILES = 64
+
+# Files modified this recently may change again without their mtime moving,
+# so their stat is not trusted to skip hashing (git's "racily clean" rule)
+RACY_STAT_NS = 2_000_000_000
+
+# Token budgets for size-aware chunking (estimated tokens, see estimate_tokens)
+DEFAULT_TARGET_TOKENS = 512
+DEFAULT_MAX_TOKENS = 2048
+
+# Where a line too long for one chunk is cut, in order of preference
+LONG_LINE_BREAKS = (re.compile(r"\n"), re.compile(r"[.!?][)\"']?\s"), re.compile(r"\s"))
+
+# Files are read this much at a time when chunked incrementally
+READ_BLOCK_SIZE = 1024 * 1024
+
+# Files at least this large are hashed first and chunked incrementally,
+# instead of read into memory once for both
+STREAM_MIN_BYTES = 8 * 1024 * 1024
+
+# Changed files written to the chunk store per transaction
+STORE_BATCH_FILES = 256
 
 
 def calculate_file_hash(path: Path) -> str:
     """Calculate SHA256 hash of a file."""
-    sha256 = hashlib.sha256()
     with open(path, "rb") as f:
-        for block in iter(lambda: f.read(4096), b""):
-            sha256.update(block)
+        return _format_hash(hashlib.file_digest(f, "sha256"))
+
+
+def _format_hash(sha256) -> str:
     return f"sha256:{sha256.hexdigest()[:16]}"
 
 
+def file_stat(path: Path) -> dict:
+    """Stat fields stored in the manifest to skip re-hashing unchanged files.
+
+    Returns:
+        Dict with "mtime_ns", "size" and "inode", or an empty dict if the
+        file was modified too recently for its stat to be trusted.
+    """
+    st = path.stat()
+    if time.time_ns() - st.st_mtime_ns < RACY_STAT_NS:
+        return {}
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "inode": st.st_ino}
+
+
+def stat_matches(entry: dict, path: Path) -> bool:
+    """Check a manifest entry's stat fields against the file on disk."""
+    if "mtime_ns" not in entry:
+        return False
+    try:
+        st = path.stat()
+    except OSError:
+        return False
+    return (
+        entry["mtime_ns"] == st.st_mtime_ns
+        and entry.get("size") == st.st_size
+        and entry.get("inode") == st.st_ino
+    )
+
+
 def parse_markdown_headings(content: str) -> list[dict]:
     """Parse markdown content and extract heading structure.
 
+    Lines inside code fences, front matter and HTML blocks are skipped.
+
     Returns list of headings with their level and position.
     """
-    headings = []
-    lines = content.split("\n")
-
-    for i, line in enumerate(lines):
-        match = re.match(r"^(#{1,6})\s+(.+)$", line)
-        if match:
-            level = len(match.group(1))
-            title = match.group(2).strip()
-            headings.append({
-                "level": level,
-                "title": title,
-                "line": i,
-            })
-
-    return headings
+    return [
+        {"level": level, "title": title, "line": i}
+        for i, level, title in find_headings(content.split("\n"))
+    ]
 
 
 def get_hierarchy(headings: list[dict], current_index: int) -> list[str]:
@@ -47,15 +104,41 @@ def get_hierarchy(headings: list[dict], current_index: int) -> list[str]:
     current = headings[current_index]
     hierarchy = [current["title"]]
 
-    # Look backwards for parent headings
+    # Look backwards for parent headings, stopping at the top level
     for i in range(current_index - 1, -1, -1):
+        if current["level"] == 1:
+            break
         if headings[i]["level"] < current["level"]:
-            hierarchy.insert(0, headings[i]["title"])
+            hierarchy.append(headings[i]["title"])
             current = headings[i]
 
+    hierarchy.reverse()
     return hierarchy
 
 
+def _make_chunk(
+    chunk_index: int,
+    title: str,
+    hierarchy: list[str],
+    content: str,
+    headings: list[str],
+    char_count: Optional[int] = None,
+) -> dict:
+    return {
+        "chunk_index": chunk_index,
+        "title": title,
+        "hierarchy": hierarchy,
+        "content": content,
+        "char_count": len(content) if char_count is None else char_count,
+        "metadata": {
+            "token_count": estimate_tokens(content),
+            "headings": headings,
+            "has_code": "```" in content,
+            "has_images": "![" in content,
+        }
+    }
+
+
 def split_by_headings(content: str, split_level: int = 2) -> list[dict]:
     """Split markdown content into chunks at the specified heading level.
 
@@ -66,111 +149,579 @@ def split_by_headings(content: str, split_level: int = 2) -> list[dict]:
     Returns:
         List of chunks with title, content, hierarchy, and metadata.
     """
-    headings = parse_markdown_headings(content)
-    lines = content.split("\n")
-    chunks = []
+    return list(_iter_heading_chunks(content.split("\n"), split_level))
 
-    if not headings:
-        # No headings - return entire content as single chunk
-        return [{
-            "chunk_index": 0,
-            "title": "Content",
-            "hierarchy": [],
-            "content": content.strip(),
-            "char_count": len(content),
-            "metadata": {
-                "headings": [],
-                "has_code": "```" in content,
-                "has_images": "![" in content,
-            }
-        }]
 
-    # Find split points (headings at the specified level)
-    split_indices = [i for i, h in enumerate(headings) if h["level"] == split_level]
+def _iter_heading_chunks(lines: Iterable[str], split_level: int) -> Iterator[dict]:
+    """Yield the chunks of split_by_headings, each once its section closes.
 
-    if not split_indices:
-        # No headings at split level - return entire content as single chunk
-        return [{
-            "chunk_index": 0,
-            "title": headings[0]["title"] if headings else "Content",
-            "hierarchy": [headings[0]["title"]] if headings else [],
-            "content": content.strip(),
-            "char_count": len(content),
-            "metadata": {
-                "headings": [f"{'#' * h['level']} {h['title']}" for h in headings],
-                "has_code": "```" in content,
-                "has_images": "![" in content,
-            }
-        }]
-
-    # Extract content before first split heading (if any)
-    first_split_line = headings[split_indices[0]]["line"]
-    if first_split_line > 0:
-        intro_content = "\n".join(lines[:first_split_line]).strip()
-        if intro_content:
-            # Find the title (first H1 if exists)
-            intro_title = "Introduction"
-            for h in headings:
-                if h["line"] < first_split_line and h["level"] == 1:
-                    intro_title = h["title"]
-                    break
-
-            chunks.append({
-                "chunk_index": 0,
-                "title": intro_title,
-                "hierarchy": [intro_title],
-                "content": intro_content,
-                "char_count": len(intro_content),
-                "metadata": {
-                    "headings": [f"{'#' * h['level']} {h['title']}"
-                                for h in headings if h["line"] < first_split_line],
-                    "has_code": "```" in intro_content,
-                    "has_images": "![" in intro_content,
+    Headings are parsed in a single pass with a stack of open parents, so
+    each chunk's hierarchy and nested headings are known as soon as its
+    heading is read. Only the lines of the open section are held. Lines
+    inside code fences, front matter and HTML blocks are never headings.
+    """
+    stack: list[tuple[int, str]] = []  # (level, title) of open parent headings
+    first_title: Optional[str] = None
+    intro_title: Optional[str] = None
+    intro_headings: list[str] = []
+    section: Optional[dict] = None  # open split section, None while in the intro
+    section_lines: list[str] = []
+    char_count = -1  # of the whole content, for files that stay one chunk
+    chunk_index = 0
+
+    scanner = BlockScanner()
+
+    for line in lines:
+        char_count += len(line) + 1
+
+        if scanner.scan(line) == HEADING:
+            level = scanner.level
+            title = scanner.title
+            label = f"{'#' * level} {title}"
+
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+
+            if level == split_level:
+                # The open section (or intro) ends here
+                chunk_content = "\n".join(section_lines).strip()
+                if section is not None:
+                    yield _make_chunk(chunk_index, section["title"], section["hierarchy"], chunk_content, section["headings"])
+                    chunk_index += 1
+                elif chunk_content:
+                    # Title is the first H1 if one exists
+                    intro = intro_title if intro_title is not None else "Introduction"
+                    yield _make_chunk(chunk_index, intro, [intro], chunk_content, intro_headings)
+                    chunk_index += 1
+
+                section = {
+                    "title": title,
+                    "hierarchy": [t for _, t in stack] + [title],
+                    "headings": [label],
                 }
-            })
+                section_lines = []
+            elif section is not None:
+                section["headings"].append(label)
+            else:
+                intro_headings.append(label)
+                if level == 1 and intro_title is None:
+                    intro_title = title
+
+            stack.append((level, title))
+            if first_title is None:
+                first_title = title
+
+        section_lines.append(line)
+
+    chunk_content = "\n".join(section_lines).strip()
+    if section is not None:
+        yield _make_chunk(chunk_index, section["title"], section["hierarchy"], chunk_content, section["headings"])
+    elif first_title is not None:
+        # No headings at split level - return entire content as single chunk
+        yield _make_chunk(0, first_title, [first_title], chunk_content, intro_headings, char_count)
+    elif chunk_content:
+        # No headings - return entire content as single chunk
+        yield _make_chunk(0, "Content", [], chunk_content, [], char_count)
 
-    # Extract content for each split heading
-    for i, split_idx in enumerate(split_indices):
-        heading = headings[split_idx]
-        start_line = heading["line"]
 
-        # Find end line (next split heading or end of file)
-        if i + 1 < len(split_indices):
-            end_line = headings[split_indices[i + 1]]["line"]
-        else:
-            end_line = len(lines)
+def chunking_budget(
+    target_tokens: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+) -> Optional[dict]:
+    """Resolve the token budgets for size-aware chunking.
+
+    Either budget may be omitted and is then derived from the other.
+
+    Returns:
+        Dict with "target_tokens" and "max_tokens", or None when neither is
+        set (plain heading-level chunking).
+
+    Raises:
+        ValueError: If the budgets are not positive or target exceeds max.
+    """
+    if target_tokens is None and max_tokens is None:
+        return None
+
+    if max_tokens is None:
+        max_tokens = max(DEFAULT_MAX_TOKENS, target_tokens)
+    if target_tokens is None:
+        target_tokens = min(DEFAULT_TARGET_TOKENS, max_tokens)
+
+    if not 0 < target_tokens <= max_tokens:
+        raise ValueError(f"Target tokens ({target_tokens}) must be between 1 and max tokens ({max_tokens})")
+
+    return {"target_tokens": target_tokens, "max_tokens": max_tokens}
+
+
+class _Outline:
+    """Line kinds and headings of markdown lines, for splitting by line range.
+
+    Lines are appended as they are read and dropped once they have been
+    chunked, so only a window of the file is held. Line numbers always
+    count from the start of the file.
+    """
+
+    def __init__(self, lines: Iterable[str] = ()):
+        self.offset = 0  # file line number of lines[0]
+        self.lines: list[str] = []
+        self.kinds: list[str] = []
+        self.headings: dict[int, tuple[int, str]] = {}  # line -> (level, title)
+        self.heading_lines: list[int] = []
+        self.scanner = BlockScanner()
+
+        for line in lines:
+            self.append(line)
+
+    @property
+    def end(self) -> int:
+        return self.offset + len(self.lines)
+
+    def append(self, line: str) -> str:
+        kind = self.scanner.scan(line)
+        if kind == HEADING:
+            self.headings[self.end] = (self.scanner.level, self.scanner.title)
+            self.heading_lines.append(self.end)
+        self.lines.append(line)
+        self.kinds.append(kind)
+        return kind
+
+    def drop_before(self, line: int) -> None:
+        count = line - self.offset
+        if count <= 0:
+            return
+        del self.lines[:count]
+        del self.kinds[:count]
+        dropped = bisect_left(self.heading_lines, line)
+        for i in self.heading_lines[:dropped]:
+            del self.headings[i]
+        del self.heading_lines[:dropped]
+        self.offset = line
+
+    def line(self, i: int) -> str:
+        return self.lines[i - self.offset]
+
+    def kind(self, i: int) -> str:
+        return self.kinds[i - self.offset]
+
+    def text(self, start: int, end: int) -> str:
+        return "\n".join(self.lines[start - self.offset:end - self.offset]).strip()
+
+    def tokens(self, start: int, end: int) -> int:
+        return estimate_tokens(self.text(start, end))
+
+    def headings_between(self, start: int, end: int) -> list[int]:
+        return self.heading_lines[bisect_left(self.heading_lines, start):bisect_left(self.heading_lines, end)]
+
+    def only_headings(self, start: int, end: int) -> bool:
+        return all(kind in (HEADING, BLANK) for kind in self.kinds[start - self.offset:end - self.offset])
+
+
+def _split_section(
+    outline: _Outline,
+    start: int,
+    end: int,
+    title: str,
+    hierarchy: list[str],
+    budget: dict,
+) -> list[tuple]:
+    """Split an oversized line range into pieces of at most max tokens.
+
+    Tries the next heading level present in the range first; without
+    sub-headings, packs paragraphs and code blocks up to the target.
+
+    Returns:
+        List of (start, end, title, hierarchy, whole) pieces, where whole
+        is False for parts of a section that had to be packed
+    """
+    if outline.tokens(start, end) <= budget["max_tokens"]:
+        return [(start, end, title, hierarchy, True)]
+
+    # The range's own heading sits on its first line
+    sub_lines = outline.headings_between(start + 1, end)
+    if sub_lines:
+        sub_level = min(outline.headings[i][0] for i in sub_lines)
+        splits = [i for i in sub_lines if outline.headings[i][0] == sub_level]
+
+        pieces = []
+        if outline.text(start, splits[0]):
+            pieces += _split_section(outline, start, splits[0], title, hierarchy, budget)
+        for i, split in enumerate(splits):
+            sub_end = splits[i + 1] if i + 1 < len(splits) else end
+            sub_title = outline.headings[split][1]
+            pieces += _split_section(outline, split, sub_end, sub_title, hierarchy + [sub_title], budget)
+        return pieces
+
+    return [
+        (piece_start, piece_end, title, hierarchy, False)
+        for piece_start, piece_end in _pack_blocks(outline, start, end, budget)
+    ]
+
+
+def _pack_blocks(outline: _Outline, start: int, end: int, budget: dict) -> list[tuple[int, int]]:
+    """Pack blank-line separated blocks into ranges of about target tokens.
+
+    Blank lines inside code fences and HTML blocks are not boundaries, so
+    a code block is never cut; only a single block above max tokens is
+    split further, at line boundaries.
+    """
+    blocks = []
+    block_start = None
+    for i in range(start, end):
+        if outline.kind(i) == BLANK:
+            if block_start is not None:
+                blocks.append((block_start, i))
+                block_start = None
+        elif block_start is None:
+            block_start = i
+    if block_start is not None:
+        blocks.append((block_start, end))
+
+    ranges = []
+    current_start = None
+    current_end = None
+    current_tokens = 0
+
+    for block_start, block_end in blocks:
+        tokens = outline.tokens(block_start, block_end)
+        if current_start is not None:
+            # Estimates only add up to an upper bound with the blank lines between
+            gap = "\n".join(outline.line(i) for i in range(current_end, block_start))
+            current_tokens += estimate_tokens(f"\n{gap}\n")
+
+        if current_start is not None and current_tokens + tokens > budget["target_tokens"]:
+            ranges.append((current_start, current_end))
+            current_start = None
+
+        if tokens > budget["max_tokens"]:
+            ranges += _pack_lines(outline, block_start, block_end, budget["max_tokens"])
+            continue
+
+        if current_start is None:
+            current_start, current_tokens = block_start, 0
+        current_end = block_end
+        current_tokens += tokens
+
+    if current_start is not None:
+        ranges.append((current_start, current_end))
+
+    return ranges
+
+
+def _pack_lines(outline: _Outline, start: int, end: int, max_tokens: int) -> list[tuple[int, int]]:
+    """Split a range at line boundaries into pieces of at most max tokens."""
+    ranges = []
+    piece_start = start
+    piece_tokens = 0
+
+    for i in range(start, end):
+        # Counting the newline keeps the sum at or above the joined estimate
+        tokens = estimate_tokens(outline.line(i) + "\n")
+        if i > piece_start and piece_tokens + tokens > max_tokens:
+            ranges.append((piece_start, i))
+            piece_start, piece_tokens = i, 0
+        piece_tokens += tokens
+
+    ranges.append((piece_start, end))
+    return ranges
+
+
+def _split_long_text(text: str, max_tokens: int) -> list[str]:
+    """Cut text that is over max tokens even on its own lines.
+
+    Cuts at the last line break, sentence end or whitespace in the second
+    half of each budget's worth of text, and anywhere when there is none.
+    """
+    pieces = []
+    # estimate_tokens counts a token per three UTF-8 bytes, plus one
+    max_bytes = max(3 * (max_tokens - 1), 1)
+
+    while estimate_tokens(text) > max_tokens:
+        head = text.encode()[:max_bytes].decode(errors="ignore") or text[0]
+        cut = len(head)
+        for pattern in LONG_LINE_BREAKS:
+            ends = [match.end() for match in pattern.finditer(head, len(head) // 2)]
+            if ends:
+                cut = ends[-1]
+                break
+        pieces.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+
+    if text:
+        pieces.append(text)
+    return pieces
+
+
+def split_by_tokens(
+    content: str,
+    target_tokens: int = DEFAULT_TARGET_TOKENS,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    split_level: int = 2,
+) -> list[dict]:
+    """Split markdown content into chunks sized by token budget.
+
+    Starts from sections at split_level and above. Sections above
+    max_tokens are split at the next heading level they contain, or
+    failing that at paragraph and code-block boundaries. Adjacent small
+    sections are then merged up to target_tokens, but only whole sections
+    and only with siblings or into their parent, so a chunk never spans
+    unrelated parts of the page.
+
+    Args:
+        content: Markdown content
+        target_tokens: Size to aim for when packing and merging
+        max_tokens: Size above which a section is split
+        split_level: Heading level to split at first (default: 2 for ##)
+
+    Returns:
+        List of chunks with title, content, hierarchy, and metadata.
+    """
+    budget = {"target_tokens": target_tokens, "max_tokens": max_tokens}
+    return list(_iter_token_chunks(content.split("\n"), budget, split_level))
+
+
+def _iter_token_chunks(lines: Iterable[str], budget: dict, split_level: int) -> Iterator[dict]:
+    """Yield the chunks of split_by_tokens, each once it can no longer grow.
+
+    A section is split when the next heading at split_level or above
+    closes it. Only its lines and the last piece, which may still merge
+    with the next one, are held.
+    """
+    outline = _Outline()
+    merger = _PieceMerger(outline, budget)
+
+    # Start from sections at split_level and above, so a new top-level
+    # heading never trails inside the previous section
+    stack: list[tuple[int, str]] = []
+    start = 0
+    title: Optional[str] = None  # of the open section, None while in the intro
+    hierarchy: list[str] = []
+
+    for line in lines:
+        i = outline.end
+        if outline.append(line) != HEADING:
+            continue
+
+        level, heading = outline.headings[i]
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        stack.append((level, heading))
+        if level > split_level:
+            continue
 
-        chunk_content = "\n".join(lines[start_line:end_line]).strip()
-        hierarchy = get_hierarchy(headings, split_idx)
+        if title is None:
+            title, hierarchy = _intro_title(outline, start, i, "Introduction")
+        yield from merger.add(_split_section(outline, start, i, title, hierarchy, budget), i)
+        start, title, hierarchy = i, heading, [t for _, t in stack]
 
-        # Find nested headings within this chunk
-        nested_headings = [
-            f"{'#' * h['level']} {h['title']}"
-            for h in headings
-            if start_line <= h["line"] < end_line
+    if title is None:
+        title, hierarchy = _intro_title(outline, start, outline.end, None)
+    yield from merger.add(_split_section(outline, start, outline.end, title, hierarchy, budget), outline.end)
+    yield from merger.finish()
+
+
+def _intro_title(outline: _Outline, start: int, end: int, default: Optional[str]) -> tuple[str, list[str]]:
+    """Title and hierarchy of the content before the first section.
+
+    Uses the first heading in it, else the default ("Content" with no
+    hierarchy when the file has no sections at all).
+    """
+    intro_lines = outline.headings_between(start, end)
+    if intro_lines:
+        title = outline.headings[intro_lines[0]][1]
+        return title, [title]
+    if default:
+        return default, [default]
+    return "Content", []
+
+
+class _PieceMerger:
+    """Merge split pieces into chunks, holding back only the last piece."""
+
+    def __init__(self, outline: _Outline, budget: dict):
+        self.outline = outline
+        self.target_tokens = budget["target_tokens"]
+        self.max_tokens = budget["max_tokens"]
+        self.last: Optional[tuple] = None
+        self.chunk_index = 0
+
+    def add(self, pieces: list[tuple], end: int) -> Iterator[dict]:
+        """Add the pieces of a section that ends at line end."""
+        outline = self.outline
+        for piece in pieces:
+            start, piece_end, title, hierarchy, whole = piece
+            if not outline.text(start, piece_end):
+                continue
+
+            if self.last:
+                last_start, last_end, last_title, last_hierarchy, last_whole = self.last
+
+                # A heading on its own belongs with the section that follows,
+                # or with as much of its start as fits
+                if outline.only_headings(last_start, last_end):
+                    if outline.tokens(last_start, piece_end) <= self.max_tokens:
+                        self.last = (last_start, piece_end, title, hierarchy, whole)
+                        continue
+                    # Even a first line over max tokens, which is then cut
+                    split = max(_pack_lines(outline, last_start, piece_end, self.max_tokens)[0][1], start + 1)
+                    yield from self._chunks((last_start, split, title, hierarchy, False))
+                    self.last = (split, piece_end, title, hierarchy, False) if outline.text(split, piece_end) else None
+                    continue
+
+                related = hierarchy[:-1] in (last_hierarchy, last_hierarchy[:-1])
+                if (
+                    last_whole and whole and related
+                    and not outline.only_headings(start, piece_end)
+                    and outline.tokens(last_start, piece_end) <= self.target_tokens
+                ):
+                    self.last = (last_start, piece_end, last_title, last_hierarchy, True)
+                    continue
+
+                yield from self._chunks(self.last)
+
+            self.last = piece
+
+        # Lines before the held piece are done with
+        outline.drop_before(self.last[0] if self.last else end)
+
+    def finish(self) -> Iterator[dict]:
+        if self.last:
+            yield from self._chunks(self.last)
+            self.last = None
+
+    def _chunks(self, piece: tuple) -> Iterator[dict]:
+        """Yield the chunk of a piece, or several if it holds a line over max tokens."""
+        start, end, title, hierarchy, _ = piece
+        headings = [
+            f"{'#' * self.outline.headings[i][0]} {self.outline.headings[i][1]}"
+            for i in self.outline.headings_between(start, end)
         ]
+        text = self.outline.text(start, end)
+        texts = [text] if estimate_tokens(text) <= self.max_tokens else _split_long_text(text, self.max_tokens)
 
-        chunks.append({
-            "chunk_index": len(chunks),
-            "title": heading["title"],
-            "hierarchy": hierarchy,
-            "content": chunk_content,
-            "char_count": len(chunk_content),
-            "metadata": {
-                "headings": nested_headings,
-                "has_code": "```" in chunk_content,
-                "has_images": "![" in chunk_content,
-            }
-        })
+        for content in texts:
+            lines = content.split("\n")
+            content_headings = headings if len(texts) == 1 else [h for h in headings if h in lines]
+            yield _make_chunk(self.chunk_index, title, hierarchy, content, content_headings)
+            self.chunk_index += 1
+
+
+def iter_chunks(
+    lines: Iterable[str],
+    target_tokens: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+    split_level: int = 2,
+) -> Iterator[dict]:
+    """Split markdown lines into chunks lazily.
+
+    Each chunk is yielded as soon as its section closes, so memory
+    depends on the size of a section rather than of the file. The chunks
+    are the same as split_by_headings, or split_by_tokens when a token
+    budget is given.
+
+    Args:
+        lines: Markdown lines without their newlines
+        target_tokens: Token budget to aim for (enables size-aware chunking)
+        max_tokens: Token budget above which sections are split (enables
+            size-aware chunking)
+        split_level: Heading level to split at (default: 2 for ##)
+
+    Returns:
+        Iterator of chunks with title, content, hierarchy, and metadata.
+    """
+    # Checked here rather than on first use of the generator
+    budget = chunking_budget(target_tokens, max_tokens)
+    if budget:
+        return _iter_token_chunks(lines, budget, split_level)
+    return _iter_heading_chunks(lines, split_level)
+
+
+def read_lines(f: BinaryIO, sha256=None) -> Iterator[str]:
+    """Read UTF-8 lines from a binary file a block at a time.
+
+    Newlines are translated like read_text does and stripped, so the
+    lines are those of content.split("\n").
+
+    Args:
+        f: File opened in binary mode
+        sha256: Optional hash object, updated with every byte read
+
+    Raises:
+        UnicodeDecodeError: If the file is not valid UTF-8.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    partial: list[str] = []  # pieces of a line that spans blocks
+    carriage_return = False  # a block ended in "\r", maybe half of "\r\n"
+
+    while True:
+        block = f.read(READ_BLOCK_SIZE)
+        if sha256 is not None:
+            sha256.update(block)
+
+        text = decoder.decode(block, final=not block)
+        if carriage_return:
+            text = "\r" + text
+        carriage_return = bool(block) and text.endswith("\r")
+        if carriage_return:
+            text = text[:-1]
+
+        lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        if not block:
+            lines[0] = "".join(partial) + lines[0]
+            yield from lines
+            return
+
+        if len(lines) == 1:
+            partial.append(lines[0])
+            continue
+
+        lines[0] = "".join(partial) + lines[0]
+        partial = [lines.pop()]
+        yield from lines
+
+
+def iter_file_chunks(
+    path: Path,
+    target_tokens: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+    sha256=None,
+) -> Iterator[dict]:
+    """Read a markdown file incrementally and yield its chunks.
+
+    Args:
+        path: Path to the markdown file
+        target_tokens: Token budget to aim for (enables size-aware chunking)
+        max_tokens: Token budget above which sections are split (enables
+            size-aware chunking)
+        sha256: Optional hash object, updated with the file's bytes as
+            they are read
+
+    Returns:
+        Iterator of chunks, see iter_chunks. Blank files have none.
+    """
+    chunking_budget(target_tokens, max_tokens)
+
+    def generate() -> Iterator[dict]:
+        with open(path, "rb") as f:
+            yield from iter_chunks(read_lines(f, sha256), target_tokens, max_tokens)
 
-    return chunks
+    return generate()
 
 
-def chunk_file(path: Path) -> Optional[dict]:
+def chunk_file(
+    path: Path,
+    target_tokens: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+) -> Optional[dict]:
     """Process a single markdown file and return chunk data.
 
+    The file is read incrementally and hashed as it is read, so it is
+    never held in memory whole.
+
     Args:
         path: Path to the markdown file
+        target_tokens: Token budget to aim for (enables size-aware chunking)
+        max_tokens: Token budget above which sections are split (enables
+            size-aware chunking)
 
     Returns:
         Dict with file info and chunks, or None if file is empty/invalid.
@@ -181,16 +732,19 @@ def chunk_file(path: Path) -> Optional[dict]:
     if path.suffix.lower() != ".md":
         return None
 
+    sha256 = hashlib.sha256()
     try:
-        content = path.read_text(encoding="utf-8")
-    except Exception:
+        chunks = list(iter_file_chunks(path, target_tokens, max_tokens, sha256))
+    except (OSError, UnicodeDecodeError):
         return None
 
-    if not content.strip():
-        return None
+    return _chunks_data(path, _format_hash(sha256), chunks)
 
-    file_hash = calculate_file_hash(path)
-    chunks = split_by_headings(content)
+
+def _chunks_data(path: Path, file_hash: str, chunks: list[dict]) -> Optional[dict]:
+    """Wrap a file's chunks with its info, or None if it had no content."""
+    if not chunks:
+        return None
 
     return {
         "file_path": str(path),
@@ -201,15 +755,15 @@ def chunk_file(path: Path) -> Optional[dict]:
     }
 
 
+def _manifest_state(docs_dir: Path) -> JournaledState:
+    return JournaledState(docs_dir / ".chunks" / "manifest.json")
+
+
 def load_manifest(docs_dir: Path) -> dict:
     """Load the chunks manifest file."""
-    manifest_path = docs_dir / ".chunks" / "manifest.json"
-
-    if manifest_path.exists():
-        try:
-            return json.loads(manifest_path.read_text(encoding="utf-8"))
-        except Exception:
-            pass
+    manifest = _manifest_state(docs_dir).load()
+    if manifest:
+        return manifest
 
     return {
         "version": "1.0",
@@ -219,110 +773,295 @@ def load_manifest(docs_dir: Path) -> dict:
 
 
 def save_manifest(docs_dir: Path, manifest: dict) -> None:
-    """Save the chunks manifest file."""
-    chunks_dir = docs_dir / ".chunks"
-    chunks_dir.mkdir(parents=True, exist_ok=True)
-
-    manifest_path = chunks_dir / "manifest.json"
-    manifest_path.write_text(
-        json.dumps(manifest, indent=2),
-        encoding="utf-8",
-    )
+    """Save the whole chunks manifest file."""
+    _manifest_state(docs_dir).save(manifest)
 
 
-def get_chunks_path(md_path: Path) -> Path:
-    """Get the path for the chunks JSON file corresponding to a markdown file."""
-    return md_path.with_suffix(".chunks.json")
+def update_manifest(docs_dir: Path, files: dict[str, Optional[dict]], compact: bool = False, **fields) -> None:
+    """Record changed manifest entries (None removes one) and top-level fields.
 
+    Only the changes are appended to the manifest journal, and they are
+    merged with whatever other processes wrote in the meantime. With
+    compact, the journal is then folded into the snapshot.
+    """
+    _manifest_state(docs_dir).update(files, compact=compact, **fields)
 
-def save_chunks(chunks_data: dict) -> Path:
-    """Save chunks data to a JSON file alongside the markdown file."""
-    md_path = Path(chunks_data["file_path"])
-    chunks_path = get_chunks_path(md_path)
 
-    chunks_path.write_text(
-        json.dumps(chunks_data, indent=2),
-        encoding="utf-8",
-    )
+def manifest_key(docs_dir: Path, md_file: Path) -> str:
+    """Get the path a markdown file is tracked under in the manifest and chunk store."""
+    return str(md_file.relative_to(docs_dir.parent) if docs_dir.parent != md_file.parent else md_file)
+
+
+def remove_legacy_chunks_file(md_file: Path) -> None:
+    """Delete the .chunks.json file older versions wrote next to a markdown file."""
+    md_file.with_suffix(".chunks.json").unlink(missing_ok=True)
+
+
+def _process_markdown_file(
+    md_file: Path,
+    cached_hash: Optional[str],
+    force: bool,
+    dry: bool,
+    budget: Optional[dict] = None,
+) -> Optional[dict]:
+    """Hash a markdown file and chunk it if it changed.
+
+    Runs in a worker process; the parent writes the returned chunks to
+    the chunk store. The file is read once, for both the hash and the
+    chunks, except for large files: those are only hashed here (and
+    validated), and the parent streams their chunks straight into the
+    store, so neither side ever holds them all.
+
+    Returns:
+        Dict with "hash", "unchanged", "stat", and for changed files
+        "chunk_count" and "chunks" (None on a dry run or for a large file
+        the parent streams), or None if the file is empty/invalid.
+    """
+    try:
+        # Stat before reading, so a write during the read shows up next run
+        stat = file_stat(md_file)
+        if md_file.stat().st_size >= STREAM_MIN_BYTES:
+            data = None
+            sha256 = hashlib.sha256()
+            has_content = False
+            with open(md_file, "rb") as f:
+                # Decoding as well, so an invalid file is caught here
+                for line in read_lines(f, sha256):
+                    has_content = has_content or bool(line.strip())
+            current_hash = _format_hash(sha256)
+        else:
+            data = md_file.read_bytes()
+            current_hash = _format_hash(hashlib.sha256(data))
+    except (OSError, UnicodeDecodeError):
+        return None
+
+    if not force and cached_hash == current_hash:
+        return {"hash": current_hash, "unchanged": True, "stat": stat}
+
+    if data is None:
+        if not has_content:
+            return None
+        if dry:
+            try:
+                chunk_count = sum(1 for _ in iter_file_chunks(md_file, **(budget or {})))
+            except (OSError, UnicodeDecodeError):
+                return None
+        else:
+            chunk_count = None  # known once the parent has stored them
+        return {"hash": current_hash, "unchanged": False, "stat": stat, "chunk_count": chunk_count, "chunks": None}
 
-    return chunks_path
+    try:
+        chunks = list(iter_chunks(read_lines(io.BytesIO(data)), **(budget or {})))
+    except UnicodeDecodeError:
+        return None
+    if not chunks:
+        return None
+
+    return {
+        "hash": current_hash,
+        "unchanged": False,
+        "stat": stat,
+        "chunk_count": len(chunks),
+        "chunks": None if dry else chunks,
+    }
+
+
+def _process_markdown_files(tasks: list[tuple]) -> list[Optional[dict]]:
+    """Process a slice of files in one worker call."""
+    return [_process_markdown_file(*task) for task in tasks]
 
 
 def chunk_directory(
     docs_dir: Path,
     force: bool = False,
     dry: bool = False,
+    jobs: Optional[int] = None,
+    target_tokens: Optional[int] = None,
+    max_tokens: Optional[int] = None,
 ) -> dict:
     """Process all markdown files in a directory.
 
+    Files whose size, mtime and inode match the manifest are skipped
+    without being read. The rest are hashed and split by a pool of worker
+    processes; the chunk store, search index and manifest are then
+    updated in sorted path order, so they come out the same regardless of
+    the number of jobs. The token budgets are recorded in the manifest; changing them
+    re-chunks every file.
+
     Args:
         docs_dir: Directory to process
         force: Re-chunk all files regardless of hash
         dry: Preview only, don't write files
+        jobs: Number of worker processes (default: CPU count, 1 to run
+            in-process)
+        target_tokens: Token budget to aim for (enables size-aware chunking)
+        max_tokens: Token budget above which sections are split (enables
+            size-aware chunking)
 
     Returns:
         Summary dict with stats and file list.
     """
+    budget = chunking_budget(target_tokens, max_tokens)
     manifest = load_manifest(docs_dir)
 
-    # Find all markdown files (excluding hidden dirs and .knowledge)
+    budget_changed = manifest.get("chunking") != budget
+    if budget_changed:
+        force = True
+
+    # Find all markdown files, pruning hidden directories (.chunks, .knowledge)
     md_files = []
-    for md_file in docs_dir.rglob("*.md"):
-        # Skip hidden directories and .knowledge
-        parts = md_file.relative_to(docs_dir).parts
-        if any(p.startswith(".") for p in parts):
-            continue
-        md_files.append(md_file)
+    for root, dirs, files in os.walk(docs_dir, followlinks=True):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        md_files += [
+            Path(root, name)
+            for name in files
+            if name.endswith(".md") and not name.startswith(".")
+        ]
 
     stats = {
         "total_files": len(md_files),
         "processed": 0,
         "skipped": 0,
         "chunks_created": 0,
+        "duplicates": {"chunks": 0, "unique": 0, "duplicate_ratio": 0.0},
         "files": [],
     }
 
-    for md_file in sorted(md_files):
-        rel_path = str(md_file.relative_to(docs_dir.parent) if docs_dir.parent != md_file.parent else md_file)
-        current_hash = calculate_file_hash(md_file)
-
-        # Check if file changed
-        cached = manifest["files"].get(rel_path)
-        if not force and cached and cached.get("hash") == current_hash:
-            stats["skipped"] += 1
-            stats["files"].append({
-                "path": rel_path,
-                "status": "unchanged",
-                "chunks": cached.get("chunk_count", 0),
-            })
+    md_files.sort()
+    rel_paths = [manifest_key(docs_dir, md_file) for md_file in md_files]
+
+    stored_hashes = {}
+    store = ChunkStore.open(docs_dir, readonly=True)
+    if store:
+        with store:
+            stored_hashes = store.hashes()
+
+    results: list[Optional[dict]] = [None] * len(md_files)
+    tasks = []
+    task_indices = set()
+    for index, (md_file, rel_path) in enumerate(zip(md_files, rel_paths)):
+        cached = manifest["files"].get(rel_path) or {}
+        # Only trust the manifest for files the chunk store also has
+        cached_hash = cached.get("hash") if stored_hashes.get(rel_path) == cached.get("hash") else None
+        if not force and cached_hash and stat_matches(cached, md_file):
+            results[index] = {"hash": cached_hash, "unchanged": True}
             continue
-
-        # Chunk the file
-        chunks_data = chunk_file(md_file)
-        if not chunks_data:
-            continue
-
+        tasks.append((md_file, cached_hash, force, dry, budget))
+        task_indices.add(index)
+
+    updates = {}
+    changed = []  # (md_file, rel_path, result, stats entry)
+
+    def files_to_store() -> Iterator[tuple]:
+        """Merge results in sorted order, so the manifest is deterministic.
+
+        Yields the chunks of each changed file for the store as its result
+        comes in (nothing on a dry run). Large files are chunked right here
+        as the store consumes them.
+        """
+        for index, (md_file, rel_path) in enumerate(zip(md_files, rel_paths)):
+            result = next(task_results) if index in task_indices else results[index]
+            if not result:
+                continue
+
+            cached = manifest["files"].get(rel_path)
+            if result["unchanged"]:
+                if "stat" in result and not dry:
+                    # Content is the same but the stat moved (touch, checkout)
+                    for key in ("mtime_ns", "size", "inode"):
+                        cached.pop(key, None)
+                    cached.update(result["stat"])
+                    updates[rel_path] = cached
+                stats["skipped"] += 1
+                stats["files"].append({
+                    "path": rel_path,
+                    "status": "unchanged",
+                    "chunks": cached.get("chunk_count", 0),
+                })
+                continue
+
+            entry = {"path": rel_path, "status": "new" if not cached else "updated", "chunks": result["chunk_count"]}
+            stats["files"].append(entry)
+            changed.append((md_file, rel_path, result, entry))
+            if not dry:
+                chunks = result["chunks"]
+                if chunks is None:
+                    chunks = iter_file_chunks(md_file, **(budget or {}))
+                yield rel_path, result["hash"], chunks
+
+    removed = sorted(set(stored_hashes) - set(rel_paths))
+    stored = {}
+    jobs = max(1, jobs or os.cpu_count() or 1)
+    with ExitStack() as stack:
+        if jobs == 1 or len(tasks) < PARALLEL_MIN_FILES:
+            task_results = (_process_markdown_file(*task) for task in tasks)
+        else:
+            # Hand out a few slices per worker to keep IPC overhead low
+            per_slice = max(1, len(tasks) // (jobs * 4))
+            slices = [tasks[i:i + per_slice] for i in range(0, len(tasks), per_slice)]
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=jobs))
+            task_results = (result for part in executor.map(_process_markdown_files, slices) for result in part)
+
+        files = files_to_store()
+        if dry or not (tasks or removed):
+            list(files)
+        else:
+            # Each file is written as it comes, so the changed files are never
+            # all in memory (one that became unreadable is left out). Batches
+            # are committed as they fill, so aidocs watch isn't locked out.
+            with ChunkStore.open(docs_dir) as store:
+                for first in files:
+                    batch = chain([first], islice(files, STORE_BATCH_FILES - 1))
+                    stored.update(store.put_iter(batch, skip_errors=(OSError, UnicodeDecodeError)))
+                store.delete(removed)
+
+    for md_file, rel_path, result, entry in changed:
         if not dry:
-            chunks_path = save_chunks(chunks_data)
+            entry["chunks"] = stored.get(rel_path, 0)
+            if not entry["chunks"]:
+                stats["files"].remove(entry)
+                continue
+
+            remove_legacy_chunks_file(md_file)
 
             # Update manifest
-            manifest["files"][rel_path] = {
-                "hash": current_hash,
-                "chunks_file": str(chunks_path),
-                "chunk_count": chunks_data["total_chunks"],
+            updates[rel_path] = {
+                "hash": result["hash"],
+                **result["stat"],
+                "chunk_count": entry["chunks"],
                 "modified_at": datetime.now(timezone.utc).isoformat(),
             }
 
         stats["processed"] += 1
-        stats["chunks_created"] += chunks_data["total_chunks"]
-        stats["files"].append({
-            "path": rel_path,
-            "status": "new" if not cached else "updated",
-            "chunks": chunks_data["total_chunks"],
-        })
+        stats["chunks_created"] += entry["chunks"]
 
+    # Index just the changed files for search (everything the first time),
+    # reading them back from the store a chunk at a time
+    if not dry:
+        store = ChunkStore.open(docs_dir, readonly=True)
+        try:
+            update_search_index(docs_dir, ((rel_path, store.iter_chunks(rel_path)) for rel_path in stored), removed)
+        finally:
+            if store:
+                store.close()
+
+    # Chunks sharing their content with another chunk, across the tree
+    store = ChunkStore.open(docs_dir, readonly=True)
+    if store:
+        with store:
+            stats["duplicates"] = store.duplicate_stats()
+
+    # Journal only the changed entries; the first run writes the snapshot.
+    # Both go through the lock, so entries another process (aidocs watch)
+    # journaled since the manifest was read are kept.
     if not dry:
-        manifest["last_run"] = datetime.now(timezone.utc).isoformat()
-        save_manifest(docs_dir, manifest)
+        current = set(rel_paths)
+        updates.update((path, None) for path in manifest["files"] if path not in current)
+        first_run = manifest["last_run"] is None
+        fields = {"chunking": budget, "last_run": datetime.now(timezone.utc).isoformat()}
+        if first_run:
+            fields["version"] = manifest["version"]
+        if first_run or updates or budget_changed:
+            update_manifest(docs_dir, updates, compact=first_run, **fields)
 
     return stats
@@ -10,12 +10,14 @@ from typing import Optional
 import typer
 import yaml
 from rich.console import Console
+from rich.markup import escape
 from rich.panel import Panel
 
 from . import __version__
 from .chunker import chunk_directory
 from .coverage import analyze_coverage, save_coverage_report
-from .embeddings import generate_sync_sql, get_openai_api_key
+from .embeddings import DEFAULT_CONCURRENCY, generate_sync_sql, get_embedding_provider
+from .sinks import SINK_FORMATS
 from .installer import check_tools, install_docs_module
 from .pdf_exporter import export_markdown_to_pdf
 from .server import generate_mkdocs_config, validate_docs_directory, write_mkdocs_config
@@ -246,17 +248,41 @@ def rag_chunks(
         "--dry",
         help="Preview what would be chunked without writing files.",
     ),
+    jobs: Optional[int] = typer.Option(
+        None,
+        "--jobs",
+        "-j",
+        min=1,
+        help="Worker processes for chunking (default: number of CPU cores).",
+    ),
+    target_tokens: Optional[int] = typer.Option(
+        None,
+        "--target-tokens",
+        min=1,
+        help="Size-aware chunking: merge small sections up to about this many tokens (default: 512).",
+    ),
+    max_tokens: Optional[int] = typer.Option(
+        None,
+        "--max-tokens",
+        min=1,
+        help="Size-aware chunking: split sections above this many tokens (default: 2048).",
+    ),
 ) -> None:
     """Chunk markdown files for vector DB import.
 
-    Splits markdown files at ## headings and creates .chunks.json files
-    alongside each .md file. Tracks changes via manifest.json.
+    Splits markdown files at ## headings and stores the chunks in
+    .chunks/chunks.db, keeping repeated content once. Tracks changes via
+    manifest.json. With --target-tokens/--max-tokens, oversized sections
+    are split at deeper headings or paragraph boundaries and small ones
+    merged.
 
     Examples:
         aidocs rag-chunks                  # Chunk all files in docs/
         aidocs rag-chunks docs/users       # Chunk specific directory
         aidocs rag-chunks --force          # Re-chunk all files
         aidocs rag-chunks --dry            # Preview only
+        aidocs rag-chunks --jobs 4         # Limit to 4 worker processes
+        aidocs rag-chunks --max-tokens 1000  # Split sections above 1000 tokens
     """
     target_dir = Path(docs_dir)
 
@@ -273,7 +299,14 @@ def rag_chunks(
     console.print()
 
     try:
-        stats = chunk_directory(target_dir, force=force, dry=dry)
+        stats = chunk_directory(
+            target_dir,
+            force=force,
+            dry=dry,
+            jobs=jobs,
+            target_tokens=target_tokens,
+            max_tokens=max_tokens,
+        )
 
         # Display results
         for file_info in stats["files"]:
@@ -305,7 +338,9 @@ def rag_chunks(
                 f"[green]Chunking complete![/green]\n\n"
                 f"Processed: {stats['processed']} files\n"
                 f"Skipped: {stats['skipped']} unchanged files\n"
-                f"Created: {stats['chunks_created']} chunks\n\n"
+                f"Created: {stats['chunks_created']} chunks\n"
+                f"Duplicates: {stats['duplicates']['duplicate_ratio']:.1%} of"
+                f" {stats['duplicates']['chunks']} chunks ({stats['duplicates']['unique']} unique, stored once)\n\n"
                 f"[dim]Manifest saved to {docs_dir}/.chunks/manifest.json[/dim]\n"
                 f"[dim]Run [cyan]aidocs rag-vectors[/cyan] to generate embeddings.[/dim]",
                 title="Success",
@@ -340,19 +375,56 @@ def rag_vectors(
         "-t",
         help="Target table name in PostgreSQL.",
     ),
+    concurrency: int = typer.Option(
+        DEFAULT_CONCURRENCY,
+        "--concurrency",
+        min=1,
+        help="Maximum number of embedding requests in flight.",
+    ),
+    output_format: Optional[str] = typer.Option(
+        None,
+        "--format",
+        help="Output format: sql (INSERT script, default), csv or binary (COPY file plus loader script).",
+    ),
+    database_url: Optional[str] = typer.Option(
+        None,
+        "--database-url",
+        help="Write embeddings straight to this database (postgresql://... or sqlite:///...) instead of a SQL file.",
+    ),
+    provider_name: Optional[str] = typer.Option(
+        None,
+        "--provider",
+        help="Embedding provider: openai (API, default) or local (CPU, needs aidocs[local]).",
+    ),
+    model: Optional[str] = typer.Option(
+        None,
+        "--model",
+        help="Embedding model (default: text-embedding-3-small, or all-MiniLM-L6-v2 for local).",
+    ),
+    local_vectors: bool = typer.Option(
+        False,
+        "--local-vectors",
+        help="Also embed chunks missing from the local vector store for semantic_search (prints how many first).",
+    ),
 ) -> None:
     """Generate embeddings and SQL for vector DB import.
 
-    Reads chunk files, calls OpenAI API to generate embeddings,
-    and creates a SQL file for importing into PostgreSQL with pgvector.
+    Reads chunk files, generates embeddings with the OpenAI API (or a
+    local model with --provider local), and creates a SQL file for
+    importing into PostgreSQL with pgvector.
 
-    Requires OPENAI_API_KEY environment variable.
+    Requires OPENAI_API_KEY environment variable for the openai provider.
 
     Examples:
         aidocs rag-vectors                  # Generate embeddings and SQL
         aidocs rag-vectors --dry            # Preview only
         aidocs rag-vectors --force          # Re-sync all files
         aidocs rag-vectors --table my_docs  # Custom table name
+        aidocs rag-vectors --concurrency 8  # More requests in flight
+        aidocs rag-vectors --format csv     # COPY file for bulk loading
+        aidocs rag-vectors --database-url "$DATABASE_URL"  # Write directly
+        aidocs rag-vectors --provider local # Embed offline on the CPU
+        aidocs rag-vectors --local-vectors  # Fill the local vector store
     """
     target_dir = Path(docs_dir)
 
@@ -360,8 +432,24 @@ def rag_vectors(
         console.print(f"[red]Error: Directory not found: {docs_dir}[/red]")
         raise typer.Exit(1)
 
-    # Check for API key (unless dry run)
-    if not dry and not get_openai_api_key():
+    if output_format and database_url:
+        console.print("[red]Error: --format writes a file; it cannot be combined with --database-url[/red]")
+        raise typer.Exit(1)
+
+    output_format = output_format or "sql"
+    if output_format not in SINK_FORMATS:
+        console.print(f"[red]Error: Unknown format: {output_format} (use {', '.join(SINK_FORMATS)})[/red]")
+        raise typer.Exit(1)
+
+    try:
+        provider = get_embedding_provider(provider_name, model)
+    except ValueError as e:
+        console.print(f"[red]Error: {e}[/red]")
+        raise typer.Exit(1)
+
+    # Check for API key or local model (unless dry run)
+    provider_error = provider.check()
+    if not dry and provider_error and provider.name == "openai":
         console.print(Panel.fit(
             "[red]OPENAI_API_KEY not set[/red]\n\n"
             "Set the environment variable:\n"
@@ -371,6 +459,14 @@ def rag_vectors(
             border_style="red",
         ))
         raise typer.Exit(1)
+    elif not dry and provider_error:
+        console.print(Panel.fit(
+            f"[red]{escape(provider_error)}[/red]\n\n"
+            "Or run with [cyan]--dry[/cyan] to preview.",
+            title="Error",
+            border_style="red",
+        ))
+        raise typer.Exit(1)
 
     mode = "[yellow]DRY RUN[/yellow] - " if dry else ""
     console.print(f"{mode}[blue]Generating embeddings for {docs_dir}...[/blue]")
@@ -391,6 +487,11 @@ def rag_vectors(
             table_name=table,
             on_progress=on_progress if not dry else None,
             on_status=on_status,
+            concurrency=concurrency,
+            output_format=output_format,
+            database_url=database_url,
+            provider=provider,
+            local_vectors=local_vectors,
         )
 
         if not result["success"]:
@@ -406,7 +507,12 @@ def rag_vectors(
                 f"Unchanged: {stats.get('unchanged', 0)} files (would skip)\n"
                 f"To sync: {stats.get('to_sync', 0)} files\n"
                 f"To delete: {stats.get('to_delete', 0)} files\n"
-                f"Total chunks: {stats.get('total_chunks', 0)}\n\n"
+                f"Chunks to embed: {stats.get('total_chunks', 0)}"
+                f" ({stats.get('chunks_added', 0)} new, {stats.get('chunks_updated', 0)} changed)\n"
+                + (f"Duplicates: {stats['chunks_duplicate']} chunks repeat content (embedded once)\n" if stats.get("chunks_duplicate") else "")
+                + f"Chunks to delete: {stats.get('chunks_deleted', 0)}\n"
+                + (f"Resumed: {stats['resumed']} files done by an interrupted run\n" if stats.get("resumed") else "")
+                + "\n"
                 f"Estimated cost: ${stats.get('estimated_cost', 0):.4f}\n\n"
                 f"[dim]Run without --dry to generate embeddings.[/dim]",
                 title="Preview",
@@ -418,15 +524,30 @@ def rag_vectors(
                 title="Up to Date",
                 border_style="green",
             ))
+        elif result.get("database"):
+            console.print(Panel.fit(
+                f"[green]Embeddings generated![/green]\n\n"
+                f"Files synced: {stats.get('to_sync', 0)}\n"
+                f"Files deleted: {stats.get('to_delete', 0)}\n"
+                f"Embeddings: {stats.get('embeddings_generated', 0)}"
+                f" ({stats.get('cache_hits', 0)} from cache)\n"
+                f"Tokens used: ~{stats.get('tokens_used', 0):,}\n\n"
+                f"[bold]Written to:[/bold] {result['database']} table {table}",
+                title="Success",
+                border_style="green",
+            ))
         else:
             sql_file = result.get("sql_file", f"{docs_dir}/.chunks/sync.sql")
             console.print(Panel.fit(
                 f"[green]Embeddings generated![/green]\n\n"
                 f"Files synced: {stats.get('to_sync', 0)}\n"
                 f"Files deleted: {stats.get('to_delete', 0)}\n"
-                f"Embeddings: {stats.get('embeddings_generated', 0)}\n"
+                f"Embeddings: {stats.get('embeddings_generated', 0)}"
+                f" ({stats.get('cache_hits', 0)} from cache)\n"
                 f"Tokens used: ~{stats.get('tokens_used', 0):,}\n\n"
-                f"[bold]SQL file:[/bold] {sql_file}\n\n"
+                f"[bold]SQL file:[/bold] {sql_file}\n"
+                + (f"[bold]Data file:[/bold] {result['data_file']}\n" if result.get("data_file") else "")
+                + "\n"
                 f"[dim]Import to database:[/dim]\n"
                 f"  [cyan]psql $DATABASE_URL -f {sql_file}[/cyan]",
                 title="Success",
@@ -436,8 +557,10 @@ def rag_vectors(
     except typer.Exit:
         raise
     except Exception as e:
-        console.print(f"[red]Error: {e}[/red]")
+        console.print(f"[red]Error: {escape(str(e))}[/red]")
         raise typer.Exit(1)
+    finally:
+        provider.close()
 
 
 @app.command("rag")
@@ -468,6 +591,56 @@ def rag(
         "--skip-vectors",
         help="Only chunk files, skip embedding generation.",
     ),
+    concurrency: int = typer.Option(
+        DEFAULT_CONCURRENCY,
+        "--concurrency",
+        min=1,
+        help="Maximum number of embedding requests in flight.",
+    ),
+    output_format: Optional[str] = typer.Option(
+        None,
+        "--format",
+        help="Output format: sql (INSERT script, default), csv or binary (COPY file plus loader script).",
+    ),
+    database_url: Optional[str] = typer.Option(
+        None,
+        "--database-url",
+        help="Write embeddings straight to this database (postgresql://... or sqlite:///...) instead of a SQL file.",
+    ),
+    provider_name: Optional[str] = typer.Option(
+        None,
+        "--provider",
+        help="Embedding provider: openai (API, default) or local (CPU, needs aidocs[local]).",
+    ),
+    model: Optional[str] = typer.Option(
+        None,
+        "--model",
+        help="Embedding model (default: text-embedding-3-small, or all-MiniLM-L6-v2 for local).",
+    ),
+    local_vectors: bool = typer.Option(
+        False,
+        "--local-vectors",
+        help="Also embed chunks missing from the local vector store for semantic_search (prints how many first).",
+    ),
+    jobs: Optional[int] = typer.Option(
+        None,
+        "--jobs",
+        "-j",
+        min=1,
+        help="Worker processes for chunking (default: number of CPU cores).",
+    ),
+    target_tokens: Optional[int] = typer.Option(
+        None,
+        "--target-tokens",
+        min=1,
+        help="Size-aware chunking: merge small sections up to about this many tokens (default: 512).",
+    ),
+    max_tokens: Optional[int] = typer.Option(
+        None,
+        "--max-tokens",
+        min=1,
+        help="Size-aware chunking: split sections above this many tokens (default: 2048).",
+    ),
 ) -> None:
     """Prepare documentation for RAG: chunk and generate embeddings.
 
@@ -486,6 +659,15 @@ def rag(
         console.print(f"[red]Error: Directory not found: {docs_dir}[/red]")
         raise typer.Exit(1)
 
+    if output_format and database_url:
+        console.print("[red]Error: --format writes a file; it cannot be combined with --database-url[/red]")
+        raise typer.Exit(1)
+
+    output_format = output_format or "sql"
+    if output_format not in SINK_FORMATS:
+        console.print(f"[red]Error: Unknown format: {output_format} (use {', '.join(SINK_FORMATS)})[/red]")
+        raise typer.Exit(1)
+
     mode = "[yellow]DRY RUN[/yellow] - " if dry else ""
 
     # Step 1: Chunk files
@@ -493,7 +675,14 @@ def rag(
     console.print()
 
     try:
-        stats = chunk_directory(target_dir, force=force, dry=dry)
+        stats = chunk_directory(
+            target_dir,
+            force=force,
+            dry=dry,
+            jobs=jobs,
+            target_tokens=target_tokens,
+            max_tokens=max_tokens,
+        )
 
         if dry:
             for f in stats["files"]:
@@ -528,8 +717,23 @@ def rag(
         ))
         return
 
-    # Check for API key
-    if not dry and not get_openai_api_key():
+    try:
+        provider = get_embedding_provider(provider_name, model)
+    except ValueError as e:
+        console.print(f"[red]Error: {e}[/red]")
+        raise typer.Exit(1)
+
+    # Check for API key or local model
+    provider_error = provider.check()
+    if not dry and provider_error and provider.name != "openai":
+        console.print(Panel.fit(
+            f"[yellow]Chunking complete, but {escape(provider_error)}[/yellow]\n\n"
+            f"Chunks created: {stats['chunks_created']}",
+            title="Partial Success",
+            border_style="yellow",
+        ))
+        return
+    elif not dry and provider_error:
         console.print(Panel.fit(
             "[yellow]Chunking complete, but OPENAI_API_KEY not set[/yellow]\n\n"
             f"Chunks created: {stats['chunks_created']}\n\n"
@@ -559,6 +763,11 @@ def rag(
             table_name=table,
             on_progress=on_progress if not dry else None,
             on_status=on_status,
+            concurrency=concurrency,
+            output_format=output_format,
+            database_url=database_url,
+            provider=provider,
+            local_vectors=local_vectors,
         )
 
         if not result["success"]:
@@ -588,13 +797,28 @@ def rag(
                 title="Success",
                 border_style="green",
             ))
+        elif result.get("database"):
+            console.print(Panel.fit(
+                f"[green]RAG preparation complete![/green]\n\n"
+                f"Chunks: {stats['chunks_created']}\n"
+                f"Embeddings: {vec_stats.get('embeddings_generated', 0)}"
+                f" ({vec_stats.get('cache_hits', 0)} from cache)\n"
+                f"Written to: {result['database']} table {table}\n\n"
+                f"[dim]Start MCP server:[/dim]\n"
+                f"  [cyan]aidocs mcp {docs_dir}[/cyan]",
+                title="Success",
+                border_style="green",
+            ))
         else:
             sql_file = result.get("sql_file", f"{docs_dir}/.chunks/sync.sql")
             console.print(Panel.fit(
                 f"[green]RAG preparation complete![/green]\n\n"
                 f"Chunks: {stats['chunks_created']}\n"
-                f"Embeddings: {vec_stats.get('embeddings_generated', 0)}\n"
-                f"SQL file: {sql_file}\n\n"
+                f"Embeddings: {vec_stats.get('embeddings_generated', 0)}"
+                f" ({vec_stats.get('cache_hits', 0)} from cache)\n"
+                f"SQL file: {sql_file}\n"
+                + (f"Data file: {result['data_file']}\n" if result.get("data_file") else "")
+                + "\n"
                 f"[dim]Import to database:[/dim]\n"
                 f"  [cyan]psql $DATABASE_URL -f {sql_file}[/cyan]\n\n"
                 f"[dim]Or start MCP server:[/dim]\n"
@@ -606,8 +830,10 @@ def rag(
     except typer.Exit:
         raise
     except Exception as e:
-        console.print(f"[red]Error generating embeddings: {e}[/red]")
+        console.print(f"[red]Error generating embeddings: {escape(str(e))}[/red]")
         raise typer.Exit(1)
+    finally:
+        provider.close()
 
 
 @app.command("export-pdf")
@@ -811,12 +1037,23 @@ def mcp_command(
         "docs",
         help="Documentation directory to serve",
     ),
+    no_stemming: bool = typer.Option(
+        False,
+        "--no-stemming",
+        help="Match exact word forms in search_docs (no stemming).",
+    ),
+    ann_probes: Optional[int] = typer.Option(
+        None,
+        "--ann-probes",
+        help="Clusters semantic_search scans on large vector stores (default 16). Higher finds more, slower; 0 searches exactly.",
+    ),
 ) -> None:
     """Start MCP server to expose documentation via tools.
 
     Exposes documentation through MCP tools:
     - list_docs: List all documentation files
     - search_docs: Search through documentation by keyword
+    - semantic_search: Search by meaning with the embeddings from aidocs rag
     - read_doc: Read full content of a file or chunk
     - get_doc_structure: Get heading hierarchy
 
@@ -843,7 +1080,7 @@ def mcp_command(
         console.print(f"[red]Error: Not a directory: {docs_dir}[/red]")
         raise typer.Exit(1)
 
-    asyncio.run(run_server(target_dir))
+    asyncio.run(run_server(target_dir, stemming=not no_stemming, ann_probes=ann_probes))
 
 
 @app.command("watch")
@@ -855,7 +1092,7 @@ def watch(
     with_vectors: bool = typer.Option(
         False,
         "--with-vectors",
-        help="Enable embedding generation (requires OPENAI_API_KEY).",
+        help="Enable embedding generation (requires OPENAI_API_KEY, or --provider local).",
     ),
     debounce: float = typer.Option(
         10.0,
@@ -869,13 +1106,33 @@ def watch(
         "-t",
         help="Target table name for embeddings.",
     ),
+    concurrency: int = typer.Option(
+        DEFAULT_CONCURRENCY,
+        "--concurrency",
+        min=1,
+        help="Maximum number of embedding requests in flight.",
+    ),
+    provider_name: Optional[str] = typer.Option(
+        None,
+        "--provider",
+        help="Embedding provider: openai (API, default) or local (CPU, needs aidocs[local]).",
+    ),
+    model: Optional[str] = typer.Option(
+        None,
+        "--model",
+        help="Embedding model (default: text-embedding-3-small, or all-MiniLM-L6-v2 for local).",
+    ),
 ) -> None:
     """Watch documentation directory and auto-sync on changes.
 
     Monitors the docs directory for markdown file changes and automatically:
     - Re-chunks modified files
-    - Generates embeddings (if --with-vectors and OPENAI_API_KEY is set)
-    - Updates manifest and sync state
+    - Generates embeddings (if --with-vectors and the provider is available)
+      into the embedding cache and local vector store
+    - Updates the manifest and search index
+
+    The database is still written by rag-vectors, which reuses the cached
+    embeddings.
 
     Uses debouncing to batch rapid changes (default: 10 seconds).
 
@@ -903,6 +1160,8 @@ def watch(
             with_vectors=with_vectors,
             debounce_seconds=debounce,
             table_name=table,
+            concurrency=concurrency,
+            provider=get_embedding_provider(provider_name, model) if with_vectors else None,
         )
     except Exception as e:
         console.print(f"[red]Error: {e}[/red]")
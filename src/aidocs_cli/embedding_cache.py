@@ -0,0 +1,177 @@
+"""Persistent content-addressed cache for embedding vectors."""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Optional
+
+CACHE_FILENAME = "embedding-cache.db"
+DEFAULT_MAX_ENTRIES = 200_000
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_CHUNK = 500
+
+
+def normalize_content(text: str) -> str:
+    """Normalize chunk content so cosmetic whitespace changes share a key."""
+    lines = text.replace("\r\n", "\n").strip().split("\n")
+    return "\n".join(line.rstrip() for line in lines)
+
+
+def cache_key(text: str, model: str, dimensions: int) -> str:
+    """Get the cache key for a text embedded with a given model."""
+    data = f"{model}\0{dimensions}\0{normalize_content(text)}".encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite-backed embedding cache keyed by (model, dimensions, content).
+
+    Vectors are stored as packed float32. Every hit refreshes the entry's
+    last-used time and the least recently used entries are evicted once the
+    cache grows past max_entries. The entry count is kept up to date by
+    triggers, so checking it costs one row read rather than a table scan.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        model: str,
+        dimensions: int,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.model = model
+        self.dimensions = dimensions
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)"
+        )
+        self.conn.commit()
+        self._create_counter()
+
+    def _create_counter(self) -> None:
+        """Keep the entry count in cache_stats, counting existing entries once."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_stats ("
+                " id INTEGER PRIMARY KEY CHECK (id = 0),"
+                " entries INTEGER NOT NULL)"
+            )
+            self.conn.execute("INSERT OR IGNORE INTO cache_stats (id, entries) SELECT 0, COUNT(*) FROM embeddings")
+            self.conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS embeddings_inserted AFTER INSERT ON embeddings"
+                " BEGIN UPDATE cache_stats SET entries = entries + 1; END"
+            )
+            self.conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS embeddings_deleted AFTER DELETE ON embeddings"
+                " BEGIN UPDATE cache_stats SET entries = entries - 1; END"
+            )
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+    def __enter__(self) -> "EmbeddingCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def key(self, text: str) -> str:
+        """Get the cache key for a text."""
+        return cache_key(text, self.model, self.dimensions)
+
+    def get_many(self, texts: list[str]) -> list[Optional[list[float]]]:
+        """Look up embeddings for texts (None for misses)."""
+        keys = [self.key(text) for text in texts]
+        found: dict[str, list[float]] = {}
+
+        with self.lock:
+            unique_keys = list(dict.fromkeys(keys))
+            for start in range(0, len(unique_keys), _QUERY_CHUNK):
+                batch = unique_keys[start:start + _QUERY_CHUNK]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                )
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+
+            if found:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self.conn.commit()
+
+        results = [found.get(key) for key in keys]
+        hits = sum(1 for r in results if r is not None)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    def put_many(self, texts: list[str], embeddings: list[Optional[list[float]]]) -> None:
+        """Store embeddings for texts, skipping failed (None) ones."""
+        now = time.time()
+        rows = [
+            (self.key(text), array("f", embedding).tobytes(), now)
+            for text, embedding in zip(texts, embeddings)
+            if embedding
+        ]
+        if not rows:
+            return
+
+        with self.lock:
+            # An upsert rather than INSERT OR REPLACE, whose deletes skip the count trigger
+            self.conn.executemany(
+                "INSERT INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET vector = excluded.vector, last_used = excluded.last_used",
+                rows,
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _count(self) -> int:
+        (count,) = self.conn.execute("SELECT entries FROM cache_stats").fetchone()
+        return count
+
+    def _evict(self) -> None:
+        """Drop least recently used entries beyond max_entries."""
+        excess = self._count() - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                " SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self._count()
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self.lock:
+            self.conn.close()
@@ -1,8 +1,16 @@
 """Embedding generation and SQL export for vector DB import."""
 
-import json
+import abc
+import atexit
+import hashlib
+import importlib.util
+import math
 import os
+import random
+import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Optional
@@ -10,11 +18,53 @@ from typing import Optional
 import httpx
 from dotenv import load_dotenv
 
+from .chunk_store import ChunkStore, content_key
+from .embedding_cache import CACHE_FILENAME, EmbeddingCache
+from .journal import JOURNAL_FILENAME, SyncJournal
+from .state import JournaledState
+from .sinks import (  # noqa: F401
+    create_database_sink,
+    create_file_sink,
+    escape_sql_string,
+    format_embedding_for_sql,
+)
+
 OPENAI_API_URL = "https://api.openai.com/v1/embeddings"
 EMBEDDING_MODEL = "text-embedding-3-small"
 EMBEDDING_DIMENSIONS = 1536
-MAX_RETRIES = 3
+EMBEDDING_PROVIDERS = ("openai", "local")
+
+# Native output size of OpenAI models, used unless dimensions are set
+OPENAI_MODEL_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+MAX_RETRIES = 5
 RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+
+# Per-request limits of the /v1/embeddings endpoint
+MAX_BATCH_INPUTS = 2048
+MAX_BATCH_TOKENS = 300_000
+
+# Smallest batch worth splitting into when spreading texts over workers
+MIN_BATCH_INPUTS = 64
+
+# Chunks embedded per round of generate_sync_sql before their files are
+# written out; bounds memory held in embedding vectors
+SYNC_GROUP_CHUNKS = 1024
+
+# Concurrency and starting rate limits; the limiter adapts to the
+# x-ratelimit-* headers returned by the API once requests start flowing
+DEFAULT_CONCURRENCY = 4
+DEFAULT_REQUESTS_PER_MINUTE = 3_000
+DEFAULT_TOKENS_PER_MINUTE = 1_000_000
+
+# Connection pool for the shared HTTP client
+MAX_CONNECTIONS = 32
+KEEPALIVE_EXPIRY = 60.0
 
 
 def get_openai_api_key() -> Optional[str]:
@@ -26,132 +76,596 @@ def get_openai_api_key() -> Optional[str]:
     return os.environ.get("OPENAI_API_KEY")
 
 
-def generate_embedding(text: str, api_key: str) -> Optional[list[float]]:
-    """Generate embedding for a single text using OpenAI API.
+_http_client: Optional[httpx.Client] = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """Get the shared HTTP client used for all embedding requests.
+
+    The client is created once and reused across calls and worker threads,
+    so connections to the API stay alive (over HTTP/2 when the h2 package is
+    installed) instead of paying a new TCP/TLS handshake per request.
+    """
+    global _http_client
+
+    with _http_client_lock:
+        if _http_client is None or _http_client.is_closed:
+            _http_client = httpx.Client(
+                http2=importlib.util.find_spec("h2") is not None,
+                # Workers wait for a free connection rather than time out
+                timeout=httpx.Timeout(60.0, connect=10.0, pool=None),
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_CONNECTIONS,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                ),
+            )
+        return _http_client
+
+
+def close_http_client() -> None:
+    """Close the shared HTTP client and its pooled connections."""
+    global _http_client
+
+    with _http_client_lock:
+        if _http_client is not None:
+            _http_client.close()
+            _http_client = None
+
+
+atexit.register(close_http_client)
+
+
+def parse_reset_duration(value: str) -> Optional[float]:
+    """Parse an x-ratelimit-reset-* header value (e.g. "1s", "6m0s", "20ms")."""
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value or "")
+    if not parts:
+        return None
+
+    scale = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    return sum(float(amount) * scale[unit] for amount, unit in parts)
+
+
+class RateLimiter:
+    """Token-bucket limiter for requests per minute and tokens per minute.
+
+    Shared by all worker threads. Both buckets refill continuously; the
+    capacities and current allowances are corrected from the API's
+    x-ratelimit-* response headers, and a 429 pauses every worker.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = DEFAULT_REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE,
+    ):
+        self.lock = threading.Lock()
+        self.requests_per_minute = float(requests_per_minute)
+        self.tokens_per_minute = float(tokens_per_minute)
+        self.request_allowance = self.requests_per_minute
+        self.token_allowance = self.tokens_per_minute
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        self.request_allowance = min(
+            self.requests_per_minute,
+            self.request_allowance + elapsed * self.requests_per_minute / 60.0,
+        )
+        self.token_allowance = min(
+            self.tokens_per_minute,
+            self.token_allowance + elapsed * self.tokens_per_minute / 60.0,
+        )
+
+    def acquire(self, tokens: int) -> None:
+        """Block until one request of the given token size may be sent."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                # A single request larger than the bucket can never fit otherwise
+                needed = min(float(tokens), self.tokens_per_minute)
+
+                wait = self.paused_until - now
+                if wait <= 0:
+                    if self.request_allowance >= 1 and self.token_allowance >= needed:
+                        self.request_allowance -= 1
+                        self.token_allowance -= needed
+                        return
+
+                    wait = max(
+                        (1 - self.request_allowance) * 60.0 / self.requests_per_minute,
+                        (needed - self.token_allowance) * 60.0 / self.tokens_per_minute,
+                    )
+
+            time.sleep(max(wait, 0.01))
+
+    def pause(self, seconds: float) -> None:
+        """Stop all workers from sending requests for the given time."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers: httpx.Headers) -> None:
+        """Adjust limits and allowances from x-ratelimit-* response headers."""
+        with self.lock:
+            self._refill(time.monotonic())
+
+            for kind in ("requests", "tokens"):
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+
+                try:
+                    if limit:
+                        setattr(self, f"{kind}_per_minute", max(float(limit), 1.0))
+                    if remaining is not None:
+                        allowance = f"{kind[:-1]}_allowance"
+                        setattr(self, allowance, min(getattr(self, allowance), float(remaining)))
+                except ValueError:
+                    continue
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Get the process-wide rate limiter shared by all embedding calls."""
+    global _rate_limiter
+
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter()
+        return _rate_limiter
+
+
+def _retry_delay(response: Optional[httpx.Response], attempt: int) -> float:
+    """Get how long to wait before retrying a failed request."""
+    if response is not None:
+        retry_after_ms = response.headers.get("retry-after-ms")
+        retry_after = response.headers.get("retry-after")
+        try:
+            if retry_after_ms:
+                return float(retry_after_ms) / 1000.0
+            if retry_after:
+                return float(retry_after)
+        except ValueError:
+            pass
+
+        reset = parse_reset_duration(response.headers.get("x-ratelimit-reset-tokens", ""))
+        if reset:
+            return reset
+
+    # Exponential backoff with jitter so workers don't retry in lockstep
+    delay = min(RETRY_DELAY * (2 ** attempt), MAX_RETRY_DELAY)
+    return delay * (0.5 + random.random() / 2)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a text without a tokenizer.
+
+    Uses UTF-8 length / 3, which overestimates English prose (~4 chars per
+    token) and stays close for CJK text, so batches never exceed API limits.
+    """
+    return len(text.encode("utf-8")) // 3 + 1
+
+
+def plan_batches(
+    texts: list[str],
+    max_inputs: int = MAX_BATCH_INPUTS,
+    max_tokens: int = MAX_BATCH_TOKENS,
+) -> list[list[int]]:
+    """Group texts into request-sized batches.
 
     Args:
-        text: Text to embed
+        texts: Texts to embed
+        max_inputs: Maximum number of inputs per request
+        max_tokens: Maximum estimated tokens per request
+
+    Returns:
+        List of batches, each a list of indices into texts (in order)
+    """
+    batches = []
+    current: list[int] = []
+    current_tokens = 0
+
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= max_inputs or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+
+    return batches
+
+
+def _request_embeddings(
+    inputs: list[str],
+    api_key: str,
+    limiter: Optional[RateLimiter] = None,
+    model: str = EMBEDDING_MODEL,
+    api_url: str = OPENAI_API_URL,
+    dimensions: Optional[int] = None,
+) -> Optional[list[list[float]]]:
+    """Embed a list of inputs with a single OpenAI API request.
+
+    Args:
+        inputs: Texts to embed
         api_key: OpenAI API key
+        limiter: Rate limiter to wait on (defaults to the shared one)
+        model: Embedding model name
+        api_url: Embeddings endpoint (any OpenAI-compatible server)
+        dimensions: Requested output size, or None for the model's own
 
     Returns:
-        List of floats (embedding vector) or None on error
+        Embeddings in the same order as inputs, or None on error
     """
+    limiter = limiter or get_rate_limiter()
+    tokens = sum(estimate_tokens(text) for text in inputs)
+
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json",
     }
 
     payload = {
-        "model": EMBEDDING_MODEL,
-        "input": text,
+        "model": model,
+        "input": inputs,
     }
+    if dimensions:
+        payload["dimensions"] = dimensions
 
     for attempt in range(MAX_RETRIES):
-        try:
-            with httpx.Client(timeout=60.0) as client:
-                response = client.post(
-                    OPENAI_API_URL,
-                    headers=headers,
-                    json=payload,
-                )
-
-                if response.status_code == 200:
-                    data = response.json()
-                    return data["data"][0]["embedding"]
-                elif response.status_code == 429:
-                    # Rate limited - wait and retry
-                    time.sleep(RETRY_DELAY * (attempt + 1))
-                    continue
-                else:
-                    return None
+        limiter.acquire(tokens)
 
+        try:
+            response = get_http_client().post(
+                api_url,
+                headers=headers,
+                json=payload,
+            )
         except Exception:
             if attempt < MAX_RETRIES - 1:
-                time.sleep(RETRY_DELAY)
+                time.sleep(_retry_delay(None, attempt))
                 continue
             return None
 
+        limiter.update_from_headers(response.headers)
+
+        if response.status_code == 200:
+            try:
+                data = response.json()
+                # Results carry their input index; don't rely on ordering
+                embeddings: list[Optional[list[float]]] = [None] * len(inputs)
+                for item in data["data"]:
+                    embeddings[item["index"]] = item["embedding"]
+            except Exception:
+                return None
+            if any(e is None for e in embeddings):
+                return None
+            return embeddings
+        elif response.status_code == 429 or response.status_code >= 500:
+            # Rate limited or server error - hold back every worker, then retry
+            limiter.pause(_retry_delay(response, attempt))
+            continue
+        else:
+            return None
+
     return None
 
 
+def generate_embedding(text: str, api_key: str) -> Optional[list[float]]:
+    """Generate embedding for a single text using OpenAI API.
+
+    Args:
+        text: Text to embed
+        api_key: OpenAI API key
+
+    Returns:
+        List of floats (embedding vector) or None on error
+    """
+    embeddings = _request_embeddings([text], api_key)
+    return embeddings[0] if embeddings else None
+
+
+class EmbeddingProvider(abc.ABC):
+    """Base for the backends that turn batches of text into vectors.
+
+    Subclasses set the model and dimensions (which key the embedding
+    cache), the batch limits used to plan requests, and implement embed().
+    A provider with a fixed `workers` count runs that many batches at once
+    regardless of the requested concurrency.
+    """
+
+    name = ""
+    max_batch_inputs = MAX_BATCH_INPUTS
+    max_batch_tokens = MAX_BATCH_TOKENS
+    workers: Optional[int] = None
+
+    def __init__(self, model: str, dimensions: Optional[int] = None):
+        self.model = model
+        self._dimensions = dimensions
+
+    def __enter__(self) -> "EmbeddingProvider":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def dimensions(self) -> int:
+        return self._dimensions
+
+    def check(self) -> Optional[str]:
+        """Get why the provider can't run (missing key or package), or None."""
+        return None
+
+    @abc.abstractmethod
+    def embed(self, inputs: list[str]) -> Optional[list[list[float]]]:
+        """Embed one batch of inputs.
+
+        Returns:
+            Embeddings in the same order as inputs, or None on error
+        """
+
+    def close(self) -> None:
+        """Release any workers or connections held by the provider."""
+
+
+class OpenAIProvider(EmbeddingProvider):
+    """Embeddings from the OpenAI API or any OpenAI-compatible endpoint."""
+
+    name = "openai"
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        model: str = EMBEDDING_MODEL,
+        dimensions: Optional[int] = None,
+        api_url: str = OPENAI_API_URL,
+    ):
+        super().__init__(model, dimensions or OPENAI_MODEL_DIMENSIONS.get(model, EMBEDDING_DIMENSIONS))
+        self.api_key = api_key
+        self.api_url = api_url
+        # Only ask for a reduced size when one was configured explicitly
+        self.requested_dimensions = dimensions
+        self.limiter = get_rate_limiter()
+
+    def check(self) -> Optional[str]:
+        if not self.api_key:
+            return "OPENAI_API_KEY not set"
+        return None
+
+    def embed(self, inputs: list[str]) -> Optional[list[list[float]]]:
+        return _request_embeddings(
+            inputs,
+            self.api_key,
+            self.limiter,
+            model=self.model,
+            api_url=self.api_url,
+            dimensions=self.requested_dimensions,
+        )
+
+
+def get_embedding_provider(
+    name: Optional[str] = None,
+    model: Optional[str] = None,
+    dimensions: Optional[int] = None,
+    api_url: Optional[str] = None,
+) -> EmbeddingProvider:
+    """Create the configured embedding provider.
+
+    Arguments fall back to the AIDOCS_EMBEDDING_PROVIDER, _MODEL,
+    _DIMENSIONS and _URL environment variables (or .env), then to OpenAI's
+    text-embedding-3-small.
+
+    Args:
+        name: "openai" or "local"
+        model: Model name (OpenAI model, or sentence-transformers model)
+        dimensions: Output vector size
+        api_url: Embeddings endpoint for the openai provider
+
+    Returns:
+        Embedding provider
+    """
+    load_dotenv(override=False)
+    name = name or os.environ.get("AIDOCS_EMBEDDING_PROVIDER") or "openai"
+    model = model or os.environ.get("AIDOCS_EMBEDDING_MODEL") or None
+    if dimensions is None and os.environ.get("AIDOCS_EMBEDDING_DIMENSIONS"):
+        dimensions = int(os.environ["AIDOCS_EMBEDDING_DIMENSIONS"])
+
+    if name == "openai":
+        return OpenAIProvider(
+            get_openai_api_key(),
+            model=model or EMBEDDING_MODEL,
+            dimensions=dimensions,
+            api_url=api_url or os.environ.get("AIDOCS_EMBEDDING_URL") or OPENAI_API_URL,
+        )
+    if name == "local":
+        from .local_embeddings import LOCAL_EMBEDDING_MODEL, LocalProvider
+
+        return LocalProvider(model=model or LOCAL_EMBEDDING_MODEL, dimensions=dimensions)
+
+    raise ValueError(f"Unknown embedding provider: {name} (use {', '.join(EMBEDDING_PROVIDERS)})")
+
+
+def open_embedding_cache(docs_dir: Path, provider: Optional[EmbeddingProvider] = None) -> EmbeddingCache:
+    """Open the persistent embedding cache for a docs directory."""
+    return EmbeddingCache(
+        docs_dir / ".chunks" / CACHE_FILENAME,
+        model=provider.model if provider else EMBEDDING_MODEL,
+        dimensions=provider.dimensions if provider else EMBEDDING_DIMENSIONS,
+    )
+
+
 def generate_embeddings_batch(
     texts: list[str],
-    api_key: str,
+    api_key: Optional[str] = None,
     on_progress: Optional[callable] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    cache: Optional[EmbeddingCache] = None,
+    provider: Optional[EmbeddingProvider] = None,
 ) -> list[Optional[list[float]]]:
     """Generate embeddings for multiple texts.
 
+    Texts are packed into as few requests as the provider's input-count and
+    token limits allow, and up to `concurrency` requests are kept in flight
+    (under the shared rate limiter for OpenAI). With a cache, only texts it
+    doesn't already hold are sent, and identical texts are embedded once.
+
     Args:
         texts: List of texts to embed
-        api_key: OpenAI API key
-        on_progress: Optional callback(index, total, text_preview)
+        api_key: OpenAI API key, used when no provider is given
+        on_progress: Optional callback(index, total, text_preview), called
+            from a worker thread as each request starts, with the index of
+            its first text
+        concurrency: Maximum number of requests in flight
+        cache: Optional embedding cache to read from and fill
+        provider: Embedding provider (defaults to OpenAI with api_key)
 
     Returns:
         List of embeddings (or None for failed items)
     """
-    embeddings = []
+    if provider is None:
+        provider = OpenAIProvider(api_key)
+    if provider.workers:
+        concurrency = provider.workers
+
+    embeddings: list[Optional[list[float]]] = [None] * len(texts)
+
+    if cache is not None:
+        embeddings = cache.get_many(texts)
 
+    # Texts still to embed, with repeated content sent only once
+    pending: dict[str, list[int]] = {}
     for i, text in enumerate(texts):
+        if embeddings[i] is None:
+            key = cache.key(text) if cache is not None else text
+            pending.setdefault(key, []).append(i)
+
+    positions = list(pending.values())
+    request_texts = [texts[indices[0]] for indices in positions]
+    results: list[Optional[list[float]]] = [None] * len(request_texts)
+
+    def embed_batch(batch: list[int]) -> None:
         if on_progress:
+            first = positions[batch[0]][0]
+            text = texts[first]
             preview = text[:50] + "..." if len(text) > 50 else text
-            on_progress(i, len(texts), preview)
-
-        embedding = generate_embedding(text, api_key)
-        embeddings.append(embedding)
+            on_progress(first, len(texts), preview)
+
+        batch_results = provider.embed([request_texts[i] for i in batch])
+
+        if batch_results is None and len(batch) > 1:
+            # One bad input fails the whole request - retry individually
+            batch_results = [
+                (provider.embed([request_texts[i]]) or [None])[0]
+                for i in batch
+            ]
+
+        if batch_results:
+            for i, embedding in zip(batch, batch_results):
+                results[i] = embedding
+
+            # Store as each request completes, so an interrupted run keeps
+            # every embedding it paid for
+            if cache is not None:
+                cache.put_many([request_texts[i] for i in batch], batch_results)
+
+    # Split runs across the workers, but never into tiny requests
+    per_request = max(MIN_BATCH_INPUTS, math.ceil(len(request_texts) / max(1, concurrency)))
+    batches = plan_batches(
+        request_texts,
+        max_inputs=min(provider.max_batch_inputs, per_request),
+        max_tokens=provider.max_batch_tokens,
+    )
+    if batches:
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches)))) as executor:
+            for future in [executor.submit(embed_batch, batch) for batch in batches]:
+                future.result()
 
-        # Small delay to avoid rate limits
-        if i < len(texts) - 1:
-            time.sleep(0.1)
+    for indices, embedding in zip(positions, results):
+        for i in indices:
+            embeddings[i] = embedding
 
     return embeddings
 
 
-def format_embedding_for_sql(embedding: list[float]) -> str:
-    """Format embedding vector for PostgreSQL pgvector."""
-    # Format as '[0.001, 0.002, ...]'::vector
-    values = ", ".join(f"{v:.8f}" for v in embedding)
-    return f"'[{values}]'::vector"
+def chunk_content_hash(content: str) -> str:
+    """Calculate the hash used to detect modified chunks."""
+    return f"sha256:{hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]}"
 
 
-def escape_sql_string(s: str) -> str:
-    """Escape a string for SQL insertion."""
-    # Escape single quotes by doubling them
-    return s.replace("'", "''")
+def assign_chunk_ids(chunks: list[dict]) -> list[str]:
+    """Get a stable identity for each chunk of a file.
 
+    The identity is the chunk's heading path, so it survives edits to the
+    section body and sections moving around. Repeated paths are numbered
+    in document order.
+    """
+    seen: dict[str, int] = {}
+    ids = []
 
-def load_manifest(docs_dir: Path) -> Optional[dict]:
-    """Load the chunks manifest file."""
-    manifest_path = docs_dir / ".chunks" / "manifest.json"
+    for chunk in chunks:
+        path = " > ".join(chunk.get("hierarchy") or [chunk.get("title", "")])
+        seen[path] = seen.get(path, 0) + 1
+        ids.append(path if seen[path] == 1 else f"{path} #{seen[path]}")
 
-    if not manifest_path.exists():
-        return None
+    return ids
 
-    try:
-        return json.loads(manifest_path.read_text(encoding="utf-8"))
-    except Exception:
-        return None
 
+def diff_chunks(chunks: list[dict], previous: dict) -> dict:
+    """Compare a file's chunks with the chunk state of its last sync.
 
-def load_chunks_file(chunks_path: Path) -> Optional[dict]:
-    """Load a chunks JSON file."""
-    if not chunks_path.exists():
-        return None
+    Args:
+        chunks: Current chunks of the file
+        previous: Last synced chunk state ({chunk_id: {"hash", "index"}})
 
-    try:
-        return json.loads(chunks_path.read_text(encoding="utf-8"))
-    except Exception:
-        return None
+    Returns:
+        Dict with "added", "modified" and "moved" lists of (chunk_id, chunk),
+        "removed" chunk ids, and "unchanged" count
+    """
+    diff = {"added": [], "modified": [], "moved": [], "removed": [], "unchanged": 0}
+    current_ids = set()
+
+    for chunk_id, chunk in zip(assign_chunk_ids(chunks), chunks):
+        current_ids.add(chunk_id)
+        old = previous.get(chunk_id)
+
+        if old is None:
+            diff["added"].append((chunk_id, chunk))
+        elif old.get("hash") != chunk_content_hash(chunk["content"]):
+            diff["modified"].append((chunk_id, chunk))
+        elif old.get("index") != chunk["chunk_index"]:
+            diff["moved"].append((chunk_id, chunk))
+        else:
+            diff["unchanged"] += 1
+
+    diff["removed"] = [chunk_id for chunk_id in previous if chunk_id not in current_ids]
+    return diff
+
+
+def load_manifest(docs_dir: Path) -> Optional[dict]:
+    """Load the chunks manifest file."""
+    return JournaledState(docs_dir / ".chunks" / "manifest.json").load()
+
+
+def _last_sync_state(docs_dir: Path) -> JournaledState:
+    return JournaledState(docs_dir / ".chunks" / "last-sync.json")
 
 
 def load_last_sync(docs_dir: Path) -> dict:
     """Load the last sync state."""
-    sync_path = docs_dir / ".chunks" / "last-sync.json"
-
-    if sync_path.exists():
-        try:
-            return json.loads(sync_path.read_text(encoding="utf-8"))
-        except Exception:
-            pass
+    sync_state = _last_sync_state(docs_dir).load()
+    if sync_state:
+        return sync_state
 
     return {
         "synced_at": None,
@@ -160,15 +674,54 @@ def load_last_sync(docs_dir: Path) -> dict:
 
 
 def save_last_sync(docs_dir: Path, sync_state: dict) -> None:
-    """Save the last sync state."""
-    chunks_dir = docs_dir / ".chunks"
-    chunks_dir.mkdir(parents=True, exist_ok=True)
-
-    sync_path = chunks_dir / "last-sync.json"
-    sync_path.write_text(
-        json.dumps(sync_state, indent=2),
-        encoding="utf-8",
-    )
+    """Save the whole last sync state."""
+    _last_sync_state(docs_dir).save(sync_state)
+
+
+def update_last_sync(docs_dir: Path, files: dict[str, Optional[dict]], **fields) -> None:
+    """Record changed sync entries (None removes one) and top-level fields."""
+    _last_sync_state(docs_dir).update(files, **fields)
+
+
+def update_local_vectors(
+    docs_dir: Path,
+    provider: EmbeddingProvider,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    on_status: Optional[callable] = None,
+    embed_missing: bool = False,
+) -> Optional[dict]:
+    """Update the local vector store that the MCP server's semantic_search reads.
+
+    Only vectors already in the embedding cache are copied over, so this
+    never pays for embeddings on its own. With embed_missing, the chunks
+    still missing are then embedded, after reporting how many there are.
+
+    Returns:
+        Its stats (see vector_store.update_vector_store), or None when NumPy
+        is not installed (pip install 'aidocs[vectors]')
+    """
+    if importlib.util.find_spec("numpy") is None:
+        return None
+
+    from .vector_store import update_vector_store
+
+    vector_stats = update_vector_store(docs_dir, provider, concurrency, cache_only=True)
+    if embed_missing and vector_stats["missing"]:
+        if on_status:
+            on_status(
+                f"Embedding {vector_stats['missing']:,} chunks (~{vector_stats['missing_tokens']:,} tokens) "
+                "for the local vector store..."
+            )
+        vector_stats = update_vector_store(docs_dir, provider, concurrency)
+
+    if on_status and (vector_stats["updated"] or vector_stats["removed"]):
+        on_status(f"Local vector store: {vector_stats['chunks']} chunks")
+    if on_status and vector_stats["missing"] and not embed_missing:
+        on_status(
+            f"Local vector store: {vector_stats['missing']:,} chunks not embedded yet "
+            "(--local-vectors embeds them)"
+        )
+    return vector_stats
 
 
 def generate_sync_sql(
@@ -178,6 +731,11 @@ def generate_sync_sql(
     table_name: str = "doc_embeddings",
     on_progress: Optional[callable] = None,
     on_status: Optional[callable] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    output_format: str = "sql",
+    database_url: Optional[str] = None,
+    provider: Optional[EmbeddingProvider] = None,
+    local_vectors: bool = False,
 ) -> dict:
     """Generate SQL for syncing documentation to vector DB.
 
@@ -188,15 +746,34 @@ def generate_sync_sql(
         table_name: Name of the target table
         on_progress: Progress callback(current, total, message)
         on_status: Status callback(message)
+        concurrency: Maximum number of embedding requests in flight
+        output_format: "sql" for one INSERT/UPDATE script, or "csv"/"binary"
+            for a COPY data file plus a loader script
+        database_url: Write straight to this database (postgresql:// or
+            sqlite:///) instead of an output file
+        provider: Embedding provider (defaults to get_embedding_provider())
+        local_vectors: Also embed chunks the local vector store is missing
+            (otherwise it only gets the vectors this or earlier runs paid for)
+
+    Switching to another embedding model re-embeds every file. With NumPy
+    installed, the vectors are also kept in a local store for the MCP
+    server's semantic search (see update_local_vectors).
+
+    An interrupted run leaves a journal of the files it finished. The next
+    run with the same output settings skips those files and continues the
+    same output (or database) from the last checkpoint.
 
     Returns:
         Dict with stats and results
     """
-    api_key = get_openai_api_key()
-    if not api_key and not dry:
+    if provider is None:
+        provider = get_embedding_provider()
+
+    error = provider.check()
+    if error and not dry:
         return {
             "success": False,
-            "error": "OPENAI_API_KEY not set",
+            "error": error,
             "stats": {},
         }
 
@@ -208,39 +785,90 @@ def generate_sync_sql(
             "stats": {},
         }
 
+    # Also None for a store written by an older version, which rag-chunks rebuilds
+    store = ChunkStore.open(docs_dir, readonly=True)
+    if store is None:
+        return {
+            "success": False,
+            "error": "No chunk store found. Run 'aidocs rag-chunks' first.",
+            "stats": {},
+        }
+    store.close()
+
     last_sync = load_last_sync(docs_dir)
 
+    # Vectors from another model can't be mixed with new ones
+    if last_sync["files"] and last_sync.get("model", EMBEDDING_MODEL) != provider.model:
+        force = True
+
+    if database_url:
+        sink = create_database_sink(database_url, table_name)
+        target = hashlib.sha256(database_url.encode("utf-8")).hexdigest()[:16]
+    else:
+        sink = create_file_sink(docs_dir / ".chunks", table_name, output_format)
+        target = output_format
+
+    # Pick up the files an interrupted run already finished
+    journal = SyncJournal(docs_dir / ".chunks" / JOURNAL_FILENAME)
+    run = {"table": table_name, "target": target, "model": provider.model}
+    resumed = journal.load(run)
+    if resumed and not sink.resume(resumed["checkpoint"]["sink"]):
+        resumed = None
+
+    resumed_files = resumed["files"] if resumed else {}
+    for rel_path, file_state in resumed_files.items():
+        if file_state is None:
+            last_sync["files"].pop(rel_path, None)
+        else:
+            last_sync["files"][rel_path] = file_state
+
     # Analyze what needs to be synced
     to_sync = []
     to_delete = []
     unchanged = []
+    embed_keys = set()  # distinct contents to embed; repeats are embedded once
 
-    # Check for files to sync or update
-    for rel_path, file_info in manifest["files"].items():
-        file_hash = file_info.get("hash")
-        chunks_file = file_info.get("chunks_file")
+    # Check for files to sync or update. Only the diff summary is kept here;
+    # chunks are loaded again when each file is written, to keep memory flat.
+    with ChunkStore.open(docs_dir, readonly=True) as store:
+        stored_hashes = store.hashes()
 
-        if not chunks_file:
-            continue
+        for rel_path in manifest["files"]:
+            # The stored hash is the one the chunks were made from
+            file_hash = stored_hashes.get(rel_path)
+            if not file_hash:
+                continue
 
-        chunks_path = Path(chunks_file)
-        if not chunks_path.exists():
-            continue
+            # Check if file changed since last sync (a resumed forced run
+            # keeps the files it already rewrote)
+            last_synced = last_sync["files"].get(rel_path, {})
+            forced = force and rel_path not in resumed_files
 
-        # Check if file changed since last sync
-        last_synced = last_sync["files"].get(rel_path, {})
+            if not forced and last_synced.get("hash") == file_hash:
+                unchanged.append(rel_path)
+                continue
 
-        if not force and last_synced.get("hash") == file_hash:
-            unchanged.append(rel_path)
-            continue
+            chunks_data = store.get(rel_path)
+            is_update = rel_path in last_sync["files"]
+            # Files synced before chunk tracking (or forced) are replaced whole
+            replace = is_update and (forced or "chunks" not in last_synced)
+            previous = last_synced.get("chunks", {}) if is_update and not replace else {}
+            diff = diff_chunks(chunks_data["chunks"], previous)
+            embed_keys.update(content_key(chunk["content"]) for _, chunk in diff["added"] + diff["modified"])
 
-        chunks_data = load_chunks_file(chunks_path)
-        if chunks_data:
             to_sync.append({
                 "path": rel_path,
                 "hash": file_hash,
-                "chunks_data": chunks_data,
-                "is_update": rel_path in last_sync["files"],
+                "is_update": is_update,
+                "replace": replace,
+                "previous": previous,
+                "counts": {
+                    "added": len(diff["added"]),
+                    "modified": len(diff["modified"]),
+                    "moved": len(diff["moved"]),
+                    "removed": len(diff["removed"]),
+                    "unchanged": diff["unchanged"],
+                },
             })
 
     # Check for deleted files
@@ -248,16 +876,24 @@ def generate_sync_sql(
         if rel_path not in manifest["files"]:
             to_delete.append(rel_path)
 
-    # Calculate stats
-    total_chunks = sum(len(item["chunks_data"]["chunks"]) for item in to_sync)
+    # Calculate stats - only added and modified chunks need embeddings
+    total_chunks = sum(item["counts"]["added"] + item["counts"]["modified"] for item in to_sync)
+    unique_chunks = len(embed_keys)
 
     stats = {
         "unchanged": len(unchanged),
         "to_sync": len(to_sync),
         "to_delete": len(to_delete),
         "total_chunks": total_chunks,
-        "estimated_tokens": total_chunks * 500,  # rough estimate
-        "estimated_cost": total_chunks * 500 * 0.00002 / 1000,  # $0.02/1M tokens
+        "chunks_added": sum(item["counts"]["added"] for item in to_sync),
+        "chunks_updated": sum(item["counts"]["modified"] for item in to_sync),
+        "chunks_moved": sum(item["counts"]["moved"] for item in to_sync),
+        "chunks_deleted": sum(item["counts"]["removed"] for item in to_sync),
+        "chunks_unchanged": sum(item["counts"]["unchanged"] for item in to_sync),
+        "chunks_duplicate": total_chunks - unique_chunks,
+        "resumed": len(resumed_files),
+        "estimated_tokens": unique_chunks * 500,  # rough estimate
+        "estimated_cost": unique_chunks * 500 * 0.00002 / 1000,  # $0.02/1M tokens
     }
 
     if dry:
@@ -270,7 +906,8 @@ def generate_sync_sql(
             "unchanged": unchanged,
         }
 
-    if not to_sync and not to_delete:
+    if not to_sync and not to_delete and not resumed:
+        stats["local_vectors"] = update_local_vectors(docs_dir, provider, concurrency, on_status, local_vectors)
         return {
             "success": True,
             "stats": stats,
@@ -279,25 +916,13 @@ def generate_sync_sql(
 
     # Generate embeddings and SQL
     if on_status:
+        if resumed:
+            on_status(f"Resuming interrupted sync ({len(resumed_files)} files already done)...")
         on_status("Generating embeddings...")
 
-    sql_statements = []
-    sql_statements.append(f"-- Documentation Sync SQL")
-    sql_statements.append(f"-- Generated by aidocs rag-vectors at {datetime.now(timezone.utc).isoformat()}")
-    sql_statements.append(f"-- Run with: psql $DATABASE_URL -f docs/.chunks/sync.sql")
-    sql_statements.append("")
-    sql_statements.append("BEGIN;")
-    sql_statements.append("")
-
-    # Delete statements for removed files
-    for rel_path in to_delete:
-        sql_statements.append(f"-- Delete removed file: {rel_path}")
-        sql_statements.append(f"DELETE FROM {table_name} WHERE file_path = '{escape_sql_string(rel_path)}';")
-        sql_statements.append("")
-
-    # Process files to sync
     new_sync_state = {
         "synced_at": datetime.now(timezone.utc).isoformat(),
+        "model": provider.model,
         "files": {},
     }
 
@@ -306,90 +931,158 @@ def generate_sync_sql(
         if rel_path in last_sync["files"]:
             new_sync_state["files"][rel_path] = last_sync["files"][rel_path]
 
+    # Group files so each round embeds about SYNC_GROUP_CHUNKS chunks
+    groups: list[list[dict]] = [[]]
+    group_chunks = 0
+    for item in to_sync:
+        size = item["counts"]["added"] + item["counts"]["modified"]
+        if groups[-1] and group_chunks + size > SYNC_GROUP_CHUNKS:
+            groups.append([])
+            group_chunks = 0
+        groups[-1].append(item)
+        group_chunks += size
+
     embeddings_generated = 0
     tokens_used = 0
+    cache_hits = 0
+    progress_offset = 0
+    resumed_embeddings = resumed["checkpoint"].get("embeddings", 0) if resumed else 0
+
+    def finish_file(rel_path: str, file_state: Optional[dict]) -> None:
+        # Journal the file, then checkpoint once the sink has it on disk
+        journal.record(rel_path, file_state)
+        position = sink.end_file()
+        if position is not None:
+            journal.checkpoint({
+                "sink": position,
+                "embeddings": resumed_embeddings + embeddings_generated,
+            })
 
-    for item in to_sync:
-        rel_path = item["path"]
-        file_hash = item["hash"]
-        chunks_data = item["chunks_data"]
-        is_update = item["is_update"]
-
-        if is_update:
-            sql_statements.append(f"-- Update file: {rel_path}")
-            sql_statements.append(f"DELETE FROM {table_name} WHERE file_path = '{escape_sql_string(rel_path)}';")
-        else:
-            sql_statements.append(f"-- New file: {rel_path}")
-
-        for chunk in chunks_data["chunks"]:
-            chunk_index = chunk["chunk_index"]
-            title = chunk.get("title", "")
-            content = chunk["content"]
-            hierarchy = chunk.get("hierarchy", [])
-            metadata = chunk.get("metadata", {})
-
-            # Add hierarchy to metadata
-            metadata["hierarchy"] = hierarchy
-
-            # Generate embedding
-            if on_progress:
-                on_progress(
-                    embeddings_generated,
-                    total_chunks,
-                    f"{rel_path}#{title[:30]}"
-                )
+    with (
+        journal.start(run, resumed),
+        sink,
+        open_embedding_cache(docs_dir, provider) as cache,
+        ChunkStore.open(docs_dir, readonly=True) as store,
+    ):
+        # Delete statements for removed files
+        for rel_path in to_delete:
+            sink.start_file(rel_path, "delete")
+            finish_file(rel_path, None)
+
+        for group in groups:
+            # Embed the group's added and modified chunks in batched requests
+            pending = []
+            for item in group:
+                chunks_data = store.get(item["path"]) or {"chunks": []}
+                diff = diff_chunks(chunks_data["chunks"], item["previous"])
+                pending.append((item, chunks_data, diff))
+
+            chunk_labels = []
+            chunk_texts = []
+            for item, _, diff in pending:
+                for _, chunk in diff["added"] + diff["modified"]:
+                    chunk_labels.append(f"{item['path']}#{chunk.get('title', '')[:30]}")
+                    chunk_texts.append(chunk["content"])
+
+            def on_batch(index: int, total: int, preview: str) -> None:
+                if on_progress:
+                    on_progress(progress_offset + index, total_chunks, chunk_labels[index])
+
+            embeddings = generate_embeddings_batch(
+                chunk_texts,
+                on_progress=on_batch,
+                concurrency=concurrency,
+                cache=cache,
+                provider=provider,
+            )
+            progress_offset += len(chunk_texts)
+            embedding_iter = iter(embeddings)
+
+            for item, chunks_data, diff in pending:
+                rel_path = item["path"]
+
+                if item["replace"]:
+                    sink.start_file(rel_path, "replace")
+                elif item["is_update"]:
+                    sink.start_file(rel_path, "update")
+                else:
+                    sink.start_file(rel_path, "new")
 
-            embedding = generate_embedding(content, api_key)
-
-            if embedding:
-                embeddings_generated += 1
-                tokens_used += len(content.split()) * 1.3  # rough token estimate
-
-                embedding_sql = format_embedding_for_sql(embedding)
-                metadata_sql = escape_sql_string(json.dumps(metadata))
-
-                sql_statements.append(f"""INSERT INTO {table_name} (file_path, content, chunk_index, title, metadata, embedding)
-VALUES (
-  '{escape_sql_string(rel_path)}',
-  '{escape_sql_string(content)}',
-  {chunk_index},
-  '{escape_sql_string(title)}',
-  '{metadata_sql}'::jsonb,
-  {embedding_sql}
-);""")
-            else:
-                sql_statements.append(f"-- ERROR: Failed to generate embedding for chunk {chunk_index}")
-
-        sql_statements.append("")
-
-        # Update sync state
-        new_sync_state["files"][rel_path] = {
-            "hash": file_hash,
-            "chunk_count": len(chunks_data["chunks"]),
-            "synced_at": datetime.now(timezone.utc).isoformat(),
-        }
+                chunk_state = dict(item["previous"])
+                failed = False
 
-    sql_statements.append("COMMIT;")
-    sql_statements.append("")
-    sql_statements.append(f"-- Summary:")
-    sql_statements.append(f"-- Deleted: {len(to_delete)} file(s)")
-    sql_statements.append(f"-- Synced: {len(to_sync)} file(s)")
-    sql_statements.append(f"-- Embeddings: {embeddings_generated}")
+                for chunk_id in diff["removed"]:
+                    sink.delete_chunk(rel_path, chunk_id)
+                    chunk_state.pop(chunk_id, None)
 
-    # Write SQL file
-    sql_content = "\n".join(sql_statements)
-    sql_path = docs_dir / ".chunks" / "sync.sql"
-    sql_path.write_text(sql_content, encoding="utf-8")
+                for chunk_id, chunk in diff["moved"]:
+                    sink.move_chunk(rel_path, chunk_id, chunk["chunk_index"])
+                    chunk_state[chunk_id] = {
+                        "hash": chunk_content_hash(chunk["content"]),
+                        "index": chunk["chunk_index"],
+                    }
 
-    # Save sync state
+                to_write = (
+                    [(chunk_id, chunk, False) for chunk_id, chunk in diff["added"]]
+                    + [(chunk_id, chunk, True) for chunk_id, chunk in diff["modified"]]
+                )
+
+                for chunk_id, chunk, is_modified in to_write:
+                    embedding = next(embedding_iter)
+
+                    if not embedding:
+                        failed = True
+                        sink.chunk_failed(rel_path, chunk)
+                        continue
+
+                    embeddings_generated += 1
+                    tokens_used += len(chunk["content"].split()) * 1.3  # rough token estimate
+
+                    if is_modified:
+                        sink.update_chunk(rel_path, chunk_id, chunk, embedding)
+                    else:
+                        sink.insert_chunk(rel_path, chunk_id, chunk, embedding)
+
+                    chunk_state[chunk_id] = {
+                        "hash": chunk_content_hash(chunk["content"]),
+                        "index": chunk["chunk_index"],
+                    }
+
+                # Update sync state - a file with failed chunks is retried next run
+                new_sync_state["files"][rel_path] = {
+                    "hash": None if failed else item["hash"],
+                    "chunk_count": len(chunks_data["chunks"]),
+                    "synced_at": datetime.now(timezone.utc).isoformat(),
+                    "chunks": chunk_state,
+                }
+                finish_file(rel_path, new_sync_state["files"][rel_path])
+
+        cache_hits = cache.hits
+        resumed_deleted = sum(1 for file_state in resumed_files.values() if file_state is None)
+        sink.commit({
+            "deleted": len(to_delete) + resumed_deleted,
+            "synced": len(to_sync) + len(resumed_files) - resumed_deleted,
+            "embeddings": resumed_embeddings + embeddings_generated,
+        })
+
+    # Save sync state, then drop the journal it supersedes
     save_last_sync(docs_dir, new_sync_state)
+    journal.clear()
 
+    stats["local_vectors"] = update_local_vectors(docs_dir, provider, concurrency, on_status, local_vectors)
     stats["embeddings_generated"] = embeddings_generated
+    stats["cache_hits"] = cache_hits
     stats["tokens_used"] = int(tokens_used)
-    stats["sql_file"] = str(sql_path)
 
-    return {
+    result = {
         "success": True,
         "stats": stats,
-        "sql_file": str(sql_path),
     }
+    if sink.path:
+        stats["sql_file"] = str(sink.path)
+        result["sql_file"] = str(sink.path)
+    if sink.data_path:
+        result["data_file"] = str(sink.data_path)
+    if sink.database:
+        result["database"] = sink.database
+    return result
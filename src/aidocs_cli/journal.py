@@ -0,0 +1,112 @@
+"""Checkpoint journal for resuming interrupted vector syncs."""
+
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+JOURNAL_FILENAME = "sync-journal.jsonl"
+
+
+class SyncJournal:
+    """Append-only journal of files a sync run has finished.
+
+    The first line identifies the run (output format, table, target) so a
+    journal is only resumed by a run with the same settings. Each finished
+    file appends a {"path", "state"} line; once the sink reports that its
+    output is durable, a {"checkpoint"} line follows. On load, only files
+    covered by the last checkpoint count as done.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.file = None
+
+    def __enter__(self) -> "SyncJournal":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def load(self, run: dict) -> Optional[dict]:
+        """Load the state of an interrupted run with the same settings.
+
+        Returns:
+            Dict with "files" ({path: sync state or None if deleted}) and
+            "checkpoint" (sink position), or None if there is nothing to resume
+        """
+        if not self.path.exists():
+            return None
+
+        files: dict[str, Optional[dict]] = {}
+        pending: dict[str, Optional[dict]] = {}
+        checkpoint = None
+
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                header = json.loads(f.readline() or "null")
+                if not header or header.get("run") != run:
+                    return None
+
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn last line from a crash mid-write
+                        break
+                    if "checkpoint" in entry:
+                        files.update(pending)
+                        pending = {}
+                        checkpoint = entry["checkpoint"]
+                    else:
+                        pending[entry["path"]] = entry["state"]
+        except (OSError, ValueError):
+            return None
+
+        if checkpoint is None:
+            return None
+
+        return {"files": files, "checkpoint": checkpoint}
+
+    def start(self, run: dict, resumed: Optional[dict] = None) -> "SyncJournal":
+        """Open the journal for a run, keeping a resumed run's entries."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        if resumed:
+            # Rewrite with only the checkpointed files, dropping anything
+            # recorded after the last checkpoint
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            self.file = open(tmp_path, "w", encoding="utf-8")
+            self._write({"run": run})
+            for path, state in resumed["files"].items():
+                self.record(path, state)
+            self._write({"checkpoint": resumed["checkpoint"]})
+            self.file.close()
+            os.replace(tmp_path, self.path)
+            self.file = open(self.path, "a", encoding="utf-8")
+        else:
+            self.file = open(self.path, "w", encoding="utf-8")
+            self._write({"run": run})
+            self.file.flush()
+        return self
+
+    def _write(self, entry: dict) -> None:
+        self.file.write(json.dumps(entry) + "\n")
+
+    def record(self, path: str, state: Optional[dict]) -> None:
+        """Record a finished file (state None for a deleted file)."""
+        self._write({"path": path, "state": state})
+
+    def checkpoint(self, position: dict) -> None:
+        """Mark every recorded file as durably written by the sink."""
+        self._write({"checkpoint": position})
+        self.file.flush()
+
+    def close(self) -> None:
+        if self.file and not self.file.closed:
+            self.file.close()
+
+    def clear(self) -> None:
+        """Close and remove the journal after a completed run."""
+        self.close()
+        self.path.unlink(missing_ok=True)
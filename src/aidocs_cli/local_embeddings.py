@@ -0,0 +1,141 @@
+"""Local CPU embedding backend using sentence-transformers in a process pool."""
+
+import importlib.util
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from .embeddings import EmbeddingProvider
+
+LOCAL_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Texts per task sent to a worker, and per forward pass inside it
+LOCAL_BATCH_INPUTS = 256
+LOCAL_ENCODE_BATCH = 32
+
+# Output size of common small models, so the pool isn't started just to ask
+LOCAL_MODEL_DIMENSIONS = {
+    "sentence-transformers/all-MiniLM-L6-v2": 384,
+    "sentence-transformers/all-MiniLM-L12-v2": 384,
+    "sentence-transformers/all-mpnet-base-v2": 768,
+    "BAAI/bge-small-en-v1.5": 384,
+    "BAAI/bge-base-en-v1.5": 768,
+}
+
+# Model loaded once per worker process by _init_worker
+_worker_model = None
+
+
+def _init_worker(model_name: str) -> None:
+    """Load the model in a worker process, pinned to one CPU thread."""
+    global _worker_model
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    # One thread per process; the pool provides the parallelism
+    torch.set_num_threads(1)
+    _worker_model = SentenceTransformer(model_name, device="cpu")
+
+
+def _encode(texts: list[str]) -> list[list[float]]:
+    vectors = _worker_model.encode(
+        texts,
+        batch_size=LOCAL_ENCODE_BATCH,
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+    return vectors.tolist()
+
+
+def _model_dimensions() -> int:
+    return _worker_model.get_sentence_embedding_dimension()
+
+
+class LocalProvider(EmbeddingProvider):
+    """Embed on the local CPU with a sentence-transformers model.
+
+    Runs one single-threaded worker process per core, each holding its own
+    copy of the model, so batches are encoded in parallel without network
+    calls or API quotas. Vectors are L2-normalized. Requires the optional
+    sentence-transformers dependency (pip install 'aidocs[local]').
+    """
+
+    name = "local"
+    max_batch_inputs = LOCAL_BATCH_INPUTS
+    max_batch_tokens = LOCAL_BATCH_INPUTS * 512
+
+    def __init__(
+        self,
+        model: str = LOCAL_EMBEDDING_MODEL,
+        dimensions: Optional[int] = None,
+        workers: Optional[int] = None,
+    ):
+        super().__init__(model, dimensions or LOCAL_MODEL_DIMENSIONS.get(model))
+        self.workers = workers or int(os.environ.get("AIDOCS_EMBEDDING_WORKERS") or 0) or os.cpu_count() or 1
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.lock = threading.Lock()
+
+    @property
+    def dimensions(self) -> int:
+        if self._dimensions is None:
+            self._get_pool()
+        return self._dimensions
+
+    def check(self) -> Optional[str]:
+        if importlib.util.find_spec("sentence_transformers") is None:
+            return (
+                "sentence-transformers is required for local embeddings. "
+                "Install it with: pip install 'aidocs[local]'"
+            )
+        return None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Start the worker pool, checking the model's output size once it loaded.
+
+        Raises:
+            RuntimeError: If the model can't be loaded
+            ValueError: If the model's vectors don't have the configured size
+        """
+        with self.lock:
+            if self.pool is None:
+                # spawn: torch is not fork-safe once its thread pools exist
+                pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model,),
+                )
+                try:
+                    dimensions = pool.submit(_model_dimensions).result()
+                except BrokenProcessPool as e:
+                    pool.shutdown()
+                    raise RuntimeError(f"Could not load local embedding model {self.model}: {e}") from e
+                if self._dimensions is not None and dimensions != self._dimensions:
+                    pool.shutdown()
+                    raise ValueError(
+                        f"Local embedding model {self.model} produces {dimensions}-dimensional vectors, "
+                        f"not {self._dimensions}"
+                    )
+                self._dimensions = dimensions
+                self.pool = pool
+            return self.pool
+
+    def embed(self, inputs: list[str]) -> Optional[list[list[float]]]:
+        future = self._get_pool().submit(_encode, inputs)
+        try:
+            return future.result()
+        except (ValueError, TypeError):
+            # An input the model rejects fails its batch; the caller retries
+            # the texts one by one. Pool and model errors propagate.
+            return None
+
+    def close(self) -> None:
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
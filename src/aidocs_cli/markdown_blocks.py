@@ -0,0 +1,153 @@
+"""Lightweight block tokenizer for markdown.
+
+Tracks just enough block structure to tell real headings from lines that
+only look like them: fenced code, YAML/TOML front matter and raw HTML
+blocks. It is a line-at-a-time state machine, far cheaper than a full
+CommonMark parse, and can be fed lines incrementally.
+"""
+
+import re
+from typing import Iterable, Iterator, Optional
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.+)$")
+
+# Opening code fence: up to 3 spaces, then 3+ backticks or tildes
+FENCE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})(.*)$")
+
+# HTML blocks that run until a closing tag or marker (CommonMark types
+# 1-5); the end marker is picked by which group matched
+HTML_UNTIL_RE = re.compile(
+    r"^ {0,3}<(?:(script|pre|style|textarea)(?=[\s>]|$)|(!--)|(\?)|(![A-Za-z])|(!\[CDATA\[))",
+    re.IGNORECASE,
+)
+HTML_END_MARKERS = {2: "-->", 3: "?>", 4: ">", 5: "]]>"}
+
+# Block-level HTML tags that run until a blank line (CommonMark type 6)
+HTML_BLOCK_TAGS = (
+    "address|article|aside|base|basefont|blockquote|body|caption|center|col|colgroup|"
+    "dd|details|dialog|dir|div|dl|dt|fieldset|figcaption|figure|footer|form|frame|"
+    "frameset|h[1-6]|head|header|hr|html|iframe|legend|li|link|main|menu|menuitem|"
+    "nav|noframes|ol|optgroup|option|p|param|search|section|summary|table|tbody|td|"
+    "tfoot|th|thead|title|tr|track|ul"
+)
+HTML_BLOCK_RE = re.compile(rf"^ {{0,3}}</?(?:{HTML_BLOCK_TAGS})(?:\s|/?>|$)", re.IGNORECASE)
+
+# Line kinds returned by BlockScanner.scan
+BLANK = "blank"
+TEXT = "text"
+HEADING = "heading"
+CODE = "code"
+FRONT_MATTER = "front_matter"
+HTML = "html"
+
+
+class BlockScanner:
+    """Classify markdown lines one at a time.
+
+    Call scan() with each line in order (without its newline). Fence
+    lines and everything between them are CODE, so a `# comment` in a
+    shell snippet is never a HEADING. After a HEADING, `level` and
+    `title` hold the parsed heading.
+    """
+
+    def __init__(self):
+        self.line_number = 0
+        self.fence: Optional[str] = None  # closing fence prefix while in code
+        self.front_matter: Optional[str] = None  # closing delimiter while in front matter
+        self.html_end: Optional[str] = None  # end marker, or "" for blank-line end
+        self.level = 0
+        self.title = ""
+
+    def scan(self, line: str) -> str:
+        """Classify the next line."""
+        first = self.line_number == 0
+        self.line_number += 1
+
+        if self.fence is not None:
+            stripped = line.strip()
+            if stripped.startswith(self.fence) and not stripped.strip(self.fence[0]) and len(line) - len(line.lstrip(" ")) < 4:
+                self.fence = None
+            return CODE
+
+        if self.front_matter is not None:
+            closing = line.rstrip()
+            # YAML may also end with "...", TOML only with "+++"
+            if closing == self.front_matter or (self.front_matter == "---" and closing == "..."):
+                self.front_matter = None
+            return FRONT_MATTER
+
+        if self.html_end is not None:
+            if self.html_end == "":
+                if not line or line.isspace():
+                    self.html_end = None
+                    return BLANK
+            elif self.html_end in line.lower():
+                self.html_end = None
+            return HTML
+
+        if not line or line.isspace():
+            return BLANK
+
+        head = line[0]
+
+        if head == "#":
+            match = HEADING_RE.match(line)
+            if match:
+                self.level = len(match.group(1))
+                self.title = match.group(2).strip()
+                return HEADING
+            return TEXT
+
+        if first and line.rstrip() in ("---", "+++"):
+            self.front_matter = line.rstrip()
+            return FRONT_MATTER
+
+        if head in " `~":
+            match = FENCE_RE.match(line)
+            # A backtick fence's info string may not contain backticks
+            if match and not (match.group(1)[0] == "`" and "`" in match.group(2)):
+                self.fence = match.group(1)
+                return CODE
+
+        if head in " <":
+            return self._scan_html(line)
+
+        return TEXT
+
+    def _scan_html(self, line: str) -> str:
+        match = HTML_UNTIL_RE.match(line)
+        if match:
+            if match.lastindex == 1:
+                end = f"</{match.group(1).lower()}>"
+            else:
+                end = HTML_END_MARKERS[match.lastindex]
+            # The block may close on its opening line
+            if end not in line[match.end():].lower():
+                self.html_end = end
+            return HTML
+
+        if HTML_BLOCK_RE.match(line):
+            self.html_end = ""
+            return HTML
+
+        return TEXT
+
+
+def scan_lines(lines: Iterable[str]) -> Iterator[tuple[int, str, BlockScanner]]:
+    """Classify each line, yielding (index, kind, scanner)."""
+    scanner = BlockScanner()
+    for i, line in enumerate(lines):
+        yield i, scanner.scan(line), scanner
+
+
+def find_headings(lines: Iterable[str]) -> list[tuple[int, int, str]]:
+    """Find the real headings in markdown lines.
+
+    Returns:
+        List of (line index, level, title)
+    """
+    return [
+        (i, scanner.level, scanner.title)
+        for i, kind, scanner in scan_lines(lines)
+        if kind == HEADING
+    ]
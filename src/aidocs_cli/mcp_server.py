@@ -1,27 +1,128 @@
 """MCP server for exposing documentation via tools."""
 
+import importlib.util
 import json
 import re
+import time
+from functools import partial
 from pathlib import Path
 
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import TextContent, Tool
 
-from .chunker import chunk_file, parse_markdown_headings
+from .chunk_store import ChunkStore, get_chunk_store_path
+from .chunker import (
+    calculate_file_hash,
+    chunk_file,
+    load_manifest,
+    manifest_key,
+    parse_markdown_headings,
+    stat_matches,
+)
+from .embeddings import EmbeddingProvider, get_embedding_provider
+from .search_index import (
+    INDEX_MANIFEST_FILENAME,
+    PREVIEW_CHARS,
+    SearchIndex,
+    get_search_index_dir,
+    open_search_index,
+)
+
+# Seconds between looking for markdown files added or edited without
+# being chunked; the chunk store and index are checked on every query
+DOCS_RESCAN_SECONDS = 2.0
+
+# Search index of each docs directory, with the chunk store and index state
+# it was opened at, the chunk store it loads results from, and the stat of
+# the markdown files with when it was last taken
+_search_indexes: dict[Path, tuple[tuple, SearchIndex, ChunkStore | None, tuple, float]] = {}
+
+# Local vector store of each docs directory (see vector_store), with the
+# index state it was opened at; and the providers that embed queries for them
+_vector_stores: dict[Path, tuple] = {}
+_query_providers: dict[tuple[str, str, int], EmbeddingProvider] = {}
+
+
+def load_all_chunks(docs_dir: Path) -> list[tuple[Path, list[dict]]]:
+    """Load the chunks of every markdown file.
+
+    Chunks come from the chunk store in one scan; files missing from it,
+    or changed since they were stored, are chunked on-the-fly.
+
+    Returns:
+        List of (markdown path, chunks), with no chunks for empty/invalid
+        files
+    """
+    stored = {}
+    changed = set()
+    store = ChunkStore.open(docs_dir, readonly=True)
+    if store:
+        with store:
+            changed = set(find_changed_files(docs_dir, store)[0])
+            stored = {path: list(chunks) for path, chunks in store.iter_files()}
+
+    files = []
+    for md_file in find_markdown_files(docs_dir):
+        chunks = None if md_file in changed else stored.get(manifest_key(docs_dir, md_file))
+        if chunks is None:
+            chunks = _chunk_on_the_fly(md_file)
+        files.append((md_file, chunks))
+    return files
+
+
+def _chunk_on_the_fly(md_file: Path) -> list[dict]:
+    """Chunk a markdown file without storing its chunks."""
+    chunks_data = chunk_file(md_file)
+    return chunks_data["chunks"] if chunks_data else []
+
 
+def find_changed_files(docs_dir: Path, store: ChunkStore) -> tuple[list[Path], list[str]]:
+    """Compare the markdown files with what the chunk store has of them.
 
-def load_chunks_for_file(md_path: Path) -> dict | None:
-    """Load chunks for a markdown file (from .chunks.json or generate on-the-fly)."""
-    chunks_path = md_path.with_suffix(".chunks.json")
+    Files whose stat still matches their manifest entry are taken as
+    stored; only the others are hashed.
 
-    if chunks_path.exists():
+    Returns:
+        (markdown files missing from the store or changed since they were
+        stored, store paths of files that no longer exist)
+    """
+    stored_hashes = store.hashes()
+    manifest_files = load_manifest(docs_dir)["files"]
+
+    changed = []
+    current = set()
+    for md_file in find_markdown_files(docs_dir):
+        key = manifest_key(docs_dir, md_file)
+        current.add(key)
+        stored_hash = stored_hashes.get(key)
+        if stored_hash is None:
+            changed.append(md_file)
+            continue
+        entry = manifest_files.get(key) or {}
+        if entry.get("hash") == stored_hash and stat_matches(entry, md_file):
+            continue
         try:
-            return json.loads(chunks_path.read_text(encoding="utf-8"))
-        except Exception:
+            if calculate_file_hash(md_file) != stored_hash:
+                changed.append(md_file)
+        except OSError:
             pass
+    return changed, [key for key in stored_hashes if key not in current]
 
-    return chunk_file(md_path)
+
+def load_chunk(docs_dir: Path, md_path: Path, chunk_index: int) -> dict | None:
+    """Load a single chunk, reading only that chunk from the store when possible."""
+    store = ChunkStore.open(docs_dir, readonly=True)
+    if store:
+        with store:
+            chunk = store.get_chunk(manifest_key(docs_dir, md_path), chunk_index)
+        if chunk:
+            return chunk
+
+    chunks_data = chunk_file(md_path)
+    if not chunks_data or not 0 <= chunk_index < len(chunks_data["chunks"]):
+        return None
+    return chunks_data["chunks"][chunk_index]
 
 
 def find_markdown_files(docs_dir: Path) -> list[Path]:
@@ -35,44 +136,191 @@ def find_markdown_files(docs_dir: Path) -> list[Path]:
     return sorted(md_files)
 
 
-def search_chunks(docs_dir: Path, query: str, limit: int = 10) -> list[dict]:
-    """Search through all chunks for matching content."""
-    query_lower = query.lower()
-    query_terms = query_lower.split()
-    results = []
-
-    for md_file in find_markdown_files(docs_dir):
-        chunks_data = load_chunks_for_file(md_file)
-        if not chunks_data:
-            continue
-
-        rel_path = str(md_file.relative_to(docs_dir))
-
-        for chunk in chunks_data.get("chunks", []):
-            content_lower = chunk.get("content", "").lower()
-            title_lower = chunk.get("title", "").lower()
-
-            score = 0
-            for term in query_terms:
-                title_matches = title_lower.count(term)
-                content_matches = content_lower.count(term)
-                score += (title_matches * 3) + content_matches
+def _store_signature(docs_dir: Path) -> tuple:
+    """Stat of the chunk store and search index files, which change whenever chunks are written."""
+    signature = []
+    store_path = get_chunk_store_path(docs_dir)
+    index_path = get_search_index_dir(docs_dir) / INDEX_MANIFEST_FILENAME
+    for path in (store_path, store_path.with_name(store_path.name + "-wal"), index_path):
+        try:
+            st = path.stat()
+            signature.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
 
-            if score > 0:
-                content = chunk.get("content", "")
-                preview = content[:300] + "..." if len(content) > 300 else content
 
-                results.append({
-                    "file_path": rel_path,
-                    "chunk_index": chunk.get("chunk_index", 0),
-                    "title": chunk.get("title", "Untitled"),
-                    "hierarchy": chunk.get("hierarchy", []),
-                    "content_preview": preview,
-                    "score": score,
-                })
+def _docs_signature(docs_dir: Path) -> tuple:
+    """Stat of every markdown file, which changes whenever one is added, edited or removed."""
+    signature = []
+    for md_file in find_markdown_files(docs_dir):
+        try:
+            st = md_file.stat()
+            signature.append((md_file, st.st_mtime_ns, st.st_size, st.st_ino))
+        except OSError:
+            pass
+    return tuple(signature)
+
+
+def _load_stored_chunks(store: ChunkStore, hits: list[tuple[str, int]]) -> list[dict | None]:
+    """Load the chunks of search hits from the chunk store."""
+    return [store.get_chunk(path, chunk_index) for path, chunk_index in hits]
+
+
+def get_search_index(docs_dir: Path, stemming: bool = True) -> SearchIndex:
+    """Get the search index of a docs directory.
+
+    Opens the index rag-chunks and aidocs watch keep under .chunks/search/
+    (mapping its files, without reading them); without one, builds it in
+    memory from all chunks. Files not chunked yet, or edited since, are
+    chunked on-the-fly and indexed in memory, so search never lags the
+    docs. Reopened only after the chunk store, the index or a markdown
+    file changed; markdown files are only looked at again once
+    DOCS_RESCAN_SECONDS passed, or the chunk store or index changed.
+    """
+    signature = (_store_signature(docs_dir), stemming)
+    now = time.monotonic()
+    cached = _search_indexes.get(docs_dir)
+    if cached and cached[0] == signature:
+        if now - cached[4] < DOCS_RESCAN_SECONDS:
+            return cached[1]
+        docs_signature = _docs_signature(docs_dir)
+        if docs_signature == cached[3]:
+            _search_indexes[docs_dir] = (*cached[:4], now)
+            return cached[1]
+    else:
+        docs_signature = _docs_signature(docs_dir)
+    if cached and cached[2]:
+        cached[2].close()
+
+    index = None
+    store = ChunkStore.open(docs_dir, readonly=True)
+    if store:
+        changed, removed = find_changed_files(docs_dir, store)
+        index = open_search_index(
+            docs_dir,
+            partial(_load_stored_chunks, store),
+            stemming,
+            changed=((manifest_key(docs_dir, md_file), _chunk_on_the_fly(md_file)) for md_file in changed),
+            removed=removed,
+        )
+        if index is None:
+            store.close()
+            store = None
+    if index is None:
+        index = SearchIndex.build(
+            ((manifest_key(docs_dir, md_file), chunks) for md_file, chunks in load_all_chunks(docs_dir)),
+            stemming,
+        )
+    _search_indexes[docs_dir] = (signature, index, store, docs_signature, now)
+    return index
+
+
+def _docs_path(docs_dir: Path, key: str) -> str:
+    """Turn a chunk store path into a path relative to docs_dir."""
+    try:
+        return str((docs_dir.parent / key).relative_to(docs_dir))
+    except ValueError:
+        return key
+
+
+def search_chunks(docs_dir: Path, query: str, limit: int = 10, stemming: bool = True) -> list[dict]:
+    """Search through all chunks for matching content, ranked with BM25F."""
+    results = get_search_index(docs_dir, stemming).search(query, limit)
+    for result in results:
+        # The index tracks files by chunk store path; show them relative to docs_dir
+        result["file_path"] = _docs_path(docs_dir, result["file_path"])
+    return results
+
+
+def get_vector_store(docs_dir: Path):
+    """Get the local vector store of a docs directory (None without one).
+
+    Reopened only after `aidocs rag` changed it.
+    """
+    from .vector_store import INDEX_FILENAME, VectorStore, get_vector_store_dir
+
+    try:
+        st = (get_vector_store_dir(docs_dir) / INDEX_FILENAME).stat()
+        signature = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        signature = None
+
+    cached = _vector_stores.get(docs_dir)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    vectors = VectorStore.open(docs_dir) if signature else None
+    _vector_stores[docs_dir] = (signature, vectors)
+    return vectors
+
+
+def get_query_provider(name: str, model: str, dimensions: int) -> EmbeddingProvider:
+    """Get a provider that embeds queries like the stored vectors were embedded."""
+    key = (name, model, dimensions)
+    provider = _query_providers.get(key)
+    if provider is None:
+        provider = get_embedding_provider(name, model)
+        if provider.dimensions != dimensions:
+            provider.close()
+            provider = get_embedding_provider(name, model, dimensions)
+        _query_providers[key] = provider
+    return provider
+
+
+def semantic_search(docs_dir: Path, query: str, limit: int = 10, probes: int | None = None) -> list[dict] | dict:
+    """Search chunks by meaning, with the embeddings `aidocs rag` stored locally.
+
+    The query is embedded with the model of the stored vectors and chunks
+    are ranked by cosine similarity to it.
+
+    Args:
+        docs_dir: Documentation directory
+        query: Search query
+        limit: Maximum number of results
+        probes: Clusters to scan when the vectors have an ANN index (0 for
+            exact search; default: vector_store.DEFAULT_PROBES)
+
+    Returns:
+        Results shaped like search_chunks' (the score is the cosine
+        similarity), or a dict with an "error"
+    """
+    if importlib.util.find_spec("numpy") is None:
+        return {"error": "NumPy is required for semantic search. Install it with: pip install 'aidocs[vectors]'"}
+
+    vectors = get_vector_store(docs_dir)
+    if vectors is None or not len(vectors):
+        return {"error": "No local embeddings found. Run 'aidocs rag' first."}
+
+    provider = get_query_provider(vectors.provider, vectors.model, vectors.dimensions)
+    error = provider.check()
+    if error:
+        return {"error": f"Cannot embed the query: {error}"}
+    embeddings = provider.embed([query])
+    if not embeddings or not embeddings[0]:
+        return {"error": "Cannot embed the query: embedding request failed"}
+
+    hits = vectors.search(embeddings[0], limit) if probes is None else vectors.search(embeddings[0], limit, probes)
+    store = ChunkStore.open(docs_dir, readonly=True)
+    if store is None:
+        return {"error": "No chunk store found. Run 'aidocs rag-chunks' first."}
+    with store:
+        chunks = _load_stored_chunks(store, [(path, chunk_index) for path, chunk_index, _ in hits])
 
-    results.sort(key=lambda x: x["score"], reverse=True)
-    return results[:limit]
+    results = []
+    for (path, chunk_index, score), chunk in zip(hits, chunks):
+        if chunk is None:
+            continue
+        content = chunk.get("content", "")
+        results.append({
+            "file_path": _docs_path(docs_dir, path),
+            "chunk_index": chunk_index,
+            "title": chunk.get("title", "Untitled"),
+            "hierarchy": chunk.get("hierarchy", []),
+            "content_preview": content[:PREVIEW_CHARS] + "..." if len(content) > PREVIEW_CHARS else content,
+            "score": round(score, 4),
+        })
+    return results
 
 
 def get_doc_structure(docs_dir: Path, file_path: str | None = None) -> dict:
@@ -113,10 +361,20 @@ def get_doc_structure(docs_dir: Path, file_path: str | None = None) -> dict:
     return structure
 
 
-def create_server(docs_dir: Path) -> Server:
-    """Create and configure the MCP server."""
+def create_server(docs_dir: Path, stemming: bool = True, ann_probes: int | None = None) -> Server:
+    """Create and configure the MCP server.
+
+    Args:
+        docs_dir: Documentation directory to serve
+        stemming: Match word forms in search_docs ("webhooks" finds "webhook")
+        ann_probes: Clusters semantic_search scans when the local vectors
+            have an ANN index (0 for exact search)
+    """
     server = Server("aidocs")
 
+    # Build the search index up front rather than on the first query
+    get_search_index(docs_dir, stemming)
+
     @server.list_tools()
     async def list_tools() -> list[Tool]:
         return [
@@ -148,6 +406,29 @@ def create_server(docs_dir: Path) -> Server:
                     "required": ["query"],
                 },
             ),
+            Tool(
+                name="semantic_search",
+                description=(
+                    "Search documentation chunks by meaning, using the embeddings from 'aidocs rag'. "
+                    "Finds related sections even when they use other words than the query. "
+                    "Returns matching sections with cosine similarity scores."
+                ),
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "query": {
+                            "type": "string",
+                            "description": "What to look for, in natural language",
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "description": "Maximum number of results (default: 10)",
+                            "default": 10,
+                        },
+                    },
+                    "required": ["query"],
+                },
+            ),
             Tool(
                 name="read_doc",
                 description="Read the full content of a documentation file or a specific chunk",
@@ -186,22 +467,17 @@ def create_server(docs_dir: Path) -> Server:
     async def call_tool(name: str, arguments: dict) -> list[TextContent]:
         if name == "list_docs":
             files = []
-            for md_file in find_markdown_files(docs_dir):
+            for md_file, chunks in load_all_chunks(docs_dir):
                 rel_path = str(md_file.relative_to(docs_dir))
-                chunks_data = load_chunks_for_file(md_file)
 
                 title = rel_path
-                chunk_count = 0
-                if chunks_data:
-                    chunks = chunks_data.get("chunks", [])
-                    chunk_count = len(chunks)
-                    if chunks:
-                        title = chunks[0].get("title", rel_path)
+                if chunks:
+                    title = chunks[0].get("title", rel_path)
 
                 files.append({
                     "file_path": rel_path,
                     "title": title,
-                    "chunk_count": chunk_count,
+                    "chunk_count": len(chunks),
                 })
 
             return [TextContent(type="text", text=json.dumps(files, indent=2))]
@@ -213,7 +489,17 @@ def create_server(docs_dir: Path) -> Server:
             if not query:
                 return [TextContent(type="text", text=json.dumps({"error": "Query is required"}))]
 
-            results = search_chunks(docs_dir, query, limit)
+            results = search_chunks(docs_dir, query, limit, stemming)
+            return [TextContent(type="text", text=json.dumps(results, indent=2))]
+
+        elif name == "semantic_search":
+            query = arguments.get("query", "")
+            limit = arguments.get("limit", 10)
+
+            if not query:
+                return [TextContent(type="text", text=json.dumps({"error": "Query is required"}))]
+
+            results = semantic_search(docs_dir, query, limit, ann_probes)
             return [TextContent(type="text", text=json.dumps(results, indent=2))]
 
         elif name == "read_doc":
@@ -228,15 +514,10 @@ def create_server(docs_dir: Path) -> Server:
                 return [TextContent(type="text", text=json.dumps({"error": f"File not found: {file_path}"}))]
 
             if chunk_index is not None:
-                chunks_data = load_chunks_for_file(md_path)
-                if not chunks_data:
-                    return [TextContent(type="text", text=json.dumps({"error": "Could not load chunks"}))]
-
-                chunks = chunks_data.get("chunks", [])
-                if chunk_index < 0 or chunk_index >= len(chunks):
+                chunk = load_chunk(docs_dir, md_path, chunk_index)
+                if not chunk:
                     return [TextContent(type="text", text=json.dumps({"error": f"Invalid chunk_index: {chunk_index}"}))]
 
-                chunk = chunks[chunk_index]
                 return [TextContent(type="text", text=json.dumps({
                     "file_path": file_path,
                     "chunk_index": chunk_index,
@@ -258,9 +539,9 @@ def create_server(docs_dir: Path) -> Server:
     return server
 
 
-async def run_server(docs_dir: Path) -> None:
+async def run_server(docs_dir: Path, stemming: bool = True, ann_probes: int | None = None) -> None:
     """Run the MCP server with stdio transport."""
-    server = create_server(docs_dir)
+    server = create_server(docs_dir, stemming, ann_probes)
 
     async with stdio_server() as (read_stream, write_stream):
         await server.run(
@@ -6,23 +6,22 @@ import tempfile
 from pathlib import Path
 from typing import Callable, Optional
 
+from .markdown_blocks import find_headings
+
 
 def extract_headings(markdown_content: str) -> list[dict]:
-    """Extract H1 and H2 headings from markdown for TOC."""
+    """Extract H1 and H2 headings from markdown for TOC.
+
+    Lines inside code fences, front matter and HTML blocks are skipped.
+    """
     headings = []
-    lines = markdown_content.split("\n")
 
-    for line in lines:
-        if line.startswith("# "):
-            text = line[2:].strip()
-            anchor = text.lower().replace(" ", "-").replace(".", "").replace(",", "")
-            anchor = re.sub(r"[^a-z0-9-]", "", anchor)
-            headings.append({"level": 1, "text": text, "anchor": anchor})
-        elif line.startswith("## "):
-            text = line[3:].strip()
-            anchor = text.lower().replace(" ", "-").replace(".", "").replace(",", "")
-            anchor = re.sub(r"[^a-z0-9-]", "", anchor)
-            headings.append({"level": 2, "text": text, "anchor": anchor})
+    for _, level, text in find_headings(markdown_content.split("\n")):
+        if level > 2:
+            continue
+        anchor = text.lower().replace(" ", "-").replace(".", "").replace(",", "")
+        anchor = re.sub(r"[^a-z0-9-]", "", anchor)
+        headings.append({"level": level, "text": text, "anchor": anchor})
 
     return headings
 
@@ -0,0 +1,857 @@
+"""Inverted index for keyword search over documentation chunks.
+
+Chunks are ranked with BM25F: term frequencies in a chunk's title,
+parent headings and body are weighted per field and normalised by the
+field's length against its average, then saturated and scaled by how
+rare the term is across all chunks.
+
+The index is kept under .chunks/search/ as segments: immutable files,
+each indexing the chunks of some files, read in place through mmap.
+Changed files go into a new segment and are marked deleted in the older
+one; small segments are merged as they pile up. index.json lists the
+segments and is replaced atomically, so readers never see a half-written
+index.
+"""
+
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from functools import lru_cache, partial
+from itertools import compress
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+
+from .chunk_store import ChunkStore
+from .state import atomic_write_text, file_lock
+
+SEARCH_INDEX_DIRNAME = "search"
+INDEX_MANIFEST_FILENAME = "index.json"
+LOCK_FILENAME = "index.lock"
+FORMAT_VERSION = 1
+
+TOKEN_RE = re.compile(r"\w+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i if in into is it its "
+    "may of on or should so than that the their then there these they this those to was "
+    "we were what when where which while who will with you your".split()
+)
+
+# BM25F parameters, per field: title, parent headings, body
+FIELD_WEIGHTS = (3.0, 2.0, 1.0)
+FIELD_B = (0.3, 0.3, 0.75)
+K1 = 1.2
+
+PREVIEW_CHARS = 300
+
+# Chunks whose score is looked up by binary search for the cost of
+# reading one posting; past that, a term's postings are read through
+PROBE_COST = 8
+
+# Merge the newest segment into the one before while that one holds at
+# most this many times its live chunks, so segment sizes grow
+# geometrically and a tree keeps O(log n) segments
+MERGE_RATIO = 1
+
+# Rewrite the whole index into one segment once deleted chunks make up
+# more than this share of its chunks, or once the average field lengths
+# a segment's impacts were computed with are this far (relative) from
+# the live averages, so scores stay close to BM25F over the live chunks
+MAX_DELETED_RATIO = 0.25
+MAX_AVERAGE_DRIFT = 0.1
+
+# Segment file layout: header, then these arrays (8-byte aligned). Per
+# file, per chunk and per term arrays are indexed by file number, chunk
+# id and term number; postings are grouped by term, sorted by chunk id.
+_SECTIONS = (
+    ("file_offsets", "I"),  # start of each path in file_blob, plus the end
+    ("file_first", "I"),  # first chunk id of each file, plus the chunk count
+    ("file_order", "I"),  # file numbers sorted by path
+    ("chunk_index", "I"),
+    ("title_lengths", "I"),
+    ("parent_lengths", "I"),
+    ("body_lengths", "I"),
+    ("term_offsets", "I"),  # start of each term in term_blob, plus the end
+    ("term_starts", "I"),  # first posting of each term, plus the posting count
+    ("term_max", "f"),  # best impact of each term
+    ("ids", "I"),
+    ("title_tf", "I"),
+    ("parent_tf", "I"),
+    ("body_tf", "I"),
+    ("impacts", "f"),  # BM25F score of the term in the chunk, without idf
+    ("ranked", "I"),  # chunk ids of each term's postings, best first
+    ("file_blob", "B"),  # UTF-8 paths, in file number order
+    ("term_blob", "B"),  # UTF-8 terms, sorted
+)
+_MAGIC = b"AIDX"
+# magic, version, flags, chunk count, total length of each field, then
+# the offset and size of each section
+_HEADER = struct.Struct("<4sHHI3Q" + "2Q" * len(_SECTIONS))
+_FLAG_STEMMING = 1
+_FLAG_BIG_ENDIAN = 2
+
+
+def _letter_kinds(word: str) -> str:
+    """Consonant/vowel pattern of a word, e.g. "cvcvc" for "token"."""
+    kinds = ""
+    for ch in word:
+        vowel = ch in "aeiou" or (ch == "y" and kinds.endswith("c"))
+        kinds += "v" if vowel else "c"
+    return kinds
+
+
+def _measure(word: str) -> int:
+    return _letter_kinds(word).count("vc")
+
+
+def _has_vowel(word: str) -> bool:
+    return "v" in _letter_kinds(word)
+
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """Strip inflectional suffixes (plurals, -ed, -ing) from a word.
+
+    Step 1 of the Porter stemmer, so "webhooks", "creating" and "created"
+    match "webhook" and "create". Words that aren't plain ASCII letters
+    are left alone.
+    """
+    if len(word) <= 2 or not word.isascii() or not word.isalpha():
+        return word
+
+    if word.endswith(("sses", "ies")):
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith("ss"):
+        word = word[:-1]
+
+    if word.endswith("eed"):
+        if _measure(word[:-3]) > 0:
+            word = word[:-1]
+    else:
+        for suffix in ("ed", "ing"):
+            if word.endswith(suffix) and _has_vowel(word[:-len(suffix)]):
+                word = word[:-len(suffix)]
+                if word.endswith(("at", "bl", "iz")):
+                    word += "e"
+                elif len(word) >= 2 and word[-1] == word[-2] and word[-1] not in "lsz":
+                    word = word[:-1]
+                elif _measure(word) == 1 and _letter_kinds(word).endswith("cvc") and word[-1] not in "wxy":
+                    word += "e"
+                break
+
+    if word.endswith("y") and _has_vowel(word[:-1]):
+        word = word[:-1] + "i"
+
+    return word
+
+
+def tokenize(text: str, stemming: bool = True) -> list[str]:
+    """Split text into search terms: lowercase words without stopwords, stemmed."""
+    return [
+        stem(word) if stemming else word
+        for word in TOKEN_RE.findall(text.lower())
+        if word not in STOPWORDS
+    ]
+
+
+def term_counts(text: str, stemming: bool = True) -> dict[str, int]:
+    """Count the search terms of a text (see tokenize)."""
+    counts = {}
+    for word, count in Counter(TOKEN_RE.findall(text.lower())).items():
+        if word not in STOPWORDS:
+            term = stem(word) if stemming else word
+            counts[term] = counts.get(term, 0) + count
+    return counts
+
+
+def idf(chunk_count: int, df: int) -> float:
+    """How rare a term found in df of chunk_count chunks is (BM25 inverse document frequency)."""
+    return math.log(1 + (chunk_count - df + 0.5) / (df + 0.5))
+
+
+class _Strings:
+    """UTF-8 strings packed in a blob, as a sequence of bytes for bisect."""
+
+    def __init__(self, offsets, blob, order=None):
+        self.offsets = offsets
+        self.blob = blob
+        self.order = order  # positions in sorted order, if not stored sorted
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        if self.order is not None:
+            i = self.order[i]
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]])
+
+    def find(self, value: str) -> Optional[int]:
+        """Position of a string (in storage order), or None."""
+        key = value.encode("utf-8")
+        i = bisect_left(self, key)
+        if i == len(self) or self[i] != key:
+            return None
+        return self.order[i] if self.order is not None else i
+
+
+class Segment:
+    """An index of the chunks of some files, read in place from a buffer.
+
+    Chunk ids are local to the segment: SearchIndex places segments one
+    after another by their base.
+    """
+
+    def __init__(self, buffer):
+        fields = _HEADER.unpack_from(buffer)
+        magic, version, flags, self.chunk_count, *rest = fields
+        if magic != _MAGIC or version != FORMAT_VERSION:
+            raise ValueError("Not a search index segment of this version")
+        if bool(flags & _FLAG_BIG_ENDIAN) != (sys.byteorder == "big"):
+            raise ValueError("Search index segment has another byte order")
+
+        self.stemming = bool(flags & _FLAG_STEMMING)
+        self.field_totals = tuple(rest[:3])
+        self.base = 0
+
+        self._buffer = buffer  # keeps an mmap open
+        view = memoryview(buffer)
+        sections = rest[3:]
+        for n, (name, typecode) in enumerate(_SECTIONS):
+            offset, size = sections[2 * n], sections[2 * n + 1]
+            setattr(self, name, view[offset:offset + size].cast(typecode))
+
+        self.files = _Strings(self.file_offsets, self.file_blob)
+        self.sorted_files = _Strings(self.file_offsets, self.file_blob, self.file_order)
+        self.terms = _Strings(self.term_offsets, self.term_blob)
+
+    @classmethod
+    def open(cls, path: Path) -> "Segment":
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def file_path(self, file_no: int) -> str:
+        return self.files[file_no].decode("utf-8")
+
+    def file_chunks(self, file_no: int) -> range:
+        return range(self.file_first[file_no], self.file_first[file_no + 1])
+
+    def chunk_file(self, chunk_id: int) -> int:
+        return bisect_right(self.file_first, chunk_id) - 1
+
+    def postings(self, term: str) -> Optional[tuple]:
+        """The term's postings: (chunk ids, impacts, ranked chunk ids, best impact)."""
+        term_no = self.terms.find(term)
+        if term_no is None:
+            return None
+        start, end = self.term_starts[term_no], self.term_starts[term_no + 1]
+        return self.ids[start:end], self.impacts[start:end], self.ranked[start:end], self.term_max[term_no]
+
+
+class IndexBuilder:
+    """Collects the chunks of files and writes them out as a segment."""
+
+    def __init__(self, stemming: bool = True):
+        self.stemming = stemming
+        self.files: list[str] = []
+        self.file_first = array("I", [0])
+        self.chunk_index = array("I")
+        self.lengths = tuple(array("I") for _ in FIELD_WEIGHTS)
+        # term -> postings, as (chunk id, title, parent and body frequency) runs
+        self.postings: defaultdict[str, array] = defaultdict(partial(array, "I"))
+
+    def __len__(self) -> int:
+        return len(self.chunk_index)
+
+    def add_file(self, file_path: str, chunks: list[dict]) -> None:
+        """Index the chunks of a file."""
+        postings = self.postings
+        for chunk in chunks:
+            chunk_id = len(self.chunk_index)
+            self.chunk_index.append(chunk.get("chunk_index", 0))
+
+            title = chunk.get("title", "")
+            hierarchy = chunk.get("hierarchy", [])
+            parents = hierarchy[:-1] if hierarchy and hierarchy[-1] == title else hierarchy
+            fields = [term_counts(text, self.stemming) for text in (title, " ".join(parents), chunk.get("content", ""))]
+            for lengths, counts in zip(self.lengths, fields):
+                lengths.append(sum(counts.values()))
+
+            title_counts, parent_counts, body_counts = fields
+            for term, count in body_counts.items():
+                postings[term].extend((chunk_id, title_counts.get(term, 0), parent_counts.get(term, 0), count))
+            for term in (title_counts.keys() | parent_counts.keys()) - body_counts.keys():
+                postings[term].extend((chunk_id, title_counts.get(term, 0), parent_counts.get(term, 0), 0))
+
+        self.files.append(file_path)
+        self.file_first.append(len(self.chunk_index))
+
+    def add_segment(self, segment: Segment, deleted: set[str]) -> None:
+        """Copy the files of a segment, except deleted ones, without re-reading their text."""
+        new_ids = array("i", [-1]) * segment.chunk_count
+        for file_no in range(len(segment.files)):
+            file_path = segment.file_path(file_no)
+            if file_path in deleted:
+                continue
+            for chunk_id in segment.file_chunks(file_no):
+                new_ids[chunk_id] = len(self.chunk_index)
+                self.chunk_index.append(segment.chunk_index[chunk_id])
+                for lengths, source in zip(self.lengths, (segment.title_lengths, segment.parent_lengths, segment.body_lengths)):
+                    lengths.append(source[chunk_id])
+            self.files.append(file_path)
+            self.file_first.append(len(self.chunk_index))
+
+        for term_no in range(len(segment.terms)):
+            start, end = segment.term_starts[term_no], segment.term_starts[term_no + 1]
+            columns = [
+                array("i", map(new_ids.__getitem__, segment.ids[start:end])),
+                segment.title_tf[start:end],
+                segment.parent_tf[start:end],
+                segment.body_tf[start:end],
+            ]
+            if deleted:
+                keep = [new_id >= 0 for new_id in columns[0]]
+                columns = [array("I", compress(column, keep)) for column in columns]
+            if not len(columns[0]):
+                continue
+
+            runs = array("I", [0]) * (4 * len(columns[0]))
+            for field, column in enumerate(columns):
+                runs[field::4] = array("I", column)
+            self.postings[segment.terms[term_no].decode("utf-8")].extend(runs)
+
+    def to_bytes(self, others: tuple[int, tuple[int, ...]] = (0, (0, 0, 0))) -> bytes:
+        """Write the collected chunks as a segment.
+
+        Args:
+            others: Chunk count and total field lengths of the other
+                segments of the index, for the average field lengths
+
+        Returns:
+            The segment file's content
+        """
+        chunk_count = others[0] + len(self.chunk_index)
+        field_totals = tuple(sum(lengths) for lengths in self.lengths)
+        norms = []
+        for b, lengths, total, other_total in zip(FIELD_B, self.lengths, field_totals, others[1]):
+            average = (total + other_total) / chunk_count if chunk_count else 0.0
+            norms.append([1 - b + b * length / average if average else 1.0 for length in lengths])
+        (w_title, w_parents, w_body), (n_title, n_parents, n_body) = FIELD_WEIGHTS, norms
+
+        arrays = {name: array(typecode) for name, typecode in _SECTIONS}
+        arrays["term_offsets"].append(0)
+        arrays["term_starts"].append(0)
+        term_blob = bytearray()
+        for term in sorted(self.postings):
+            runs = self.postings[term]
+            ids, title_tf, parent_tf, body_tf = runs[0::4], runs[1::4], runs[2::4], runs[3::4]
+            impacts = array("f")
+            for chunk_id, title, parents, body in zip(ids, title_tf, parent_tf, body_tf):
+                tf = w_title * title / n_title[chunk_id] + w_parents * parents / n_parents[chunk_id] + w_body * body / n_body[chunk_id]
+                impacts.append(tf / (K1 + tf))
+            # Stable, so equal scores stay in chunk order
+            order = sorted(range(len(impacts)), key=impacts.__getitem__, reverse=True)
+
+            term_blob += term.encode("utf-8")
+            arrays["term_offsets"].append(len(term_blob))
+            arrays["term_starts"].append(arrays["term_starts"][-1] + len(ids))
+            arrays["term_max"].append(impacts[order[0]])
+            arrays["ids"].extend(ids)
+            arrays["title_tf"].extend(title_tf)
+            arrays["parent_tf"].extend(parent_tf)
+            arrays["body_tf"].extend(body_tf)
+            arrays["impacts"].extend(impacts)
+            arrays["ranked"].extend(ids[i] for i in order)
+
+        file_blob = bytearray()
+        arrays["file_offsets"].append(0)
+        for file_path in self.files:
+            file_blob += file_path.encode("utf-8")
+            arrays["file_offsets"].append(len(file_blob))
+        arrays["file_first"] = self.file_first
+        arrays["file_order"].extend(sorted(range(len(self.files)), key=self.files.__getitem__))
+        arrays["chunk_index"] = self.chunk_index
+        arrays["title_lengths"], arrays["parent_lengths"], arrays["body_lengths"] = self.lengths
+        arrays["file_blob"] = file_blob
+        arrays["term_blob"] = term_blob
+
+        flags = (_FLAG_STEMMING if self.stemming else 0) | (_FLAG_BIG_ENDIAN if sys.byteorder == "big" else 0)
+        sections = []
+        body = bytearray()
+        for name, _ in _SECTIONS:
+            body += b"\0" * (-(_HEADER.size + len(body)) % 8)
+            data = bytes(arrays[name])
+            sections += [_HEADER.size + len(body), len(data)]
+            body += data
+
+        header = _HEADER.pack(_MAGIC, FORMAT_VERSION, flags, len(self.chunk_index), *field_totals, *sections)
+        return header + bytes(body)
+
+
+class SearchIndex:
+    """Keyword search over the segments of an index.
+
+    Each term maps to its postings: the chunks it occurs in, with the
+    term's BM25F score there precomputed from the field length statistics.
+    A query only reads the postings of its own terms, and once the best
+    results found so far can't be overtaken by a chunk missing from them,
+    the postings of the remaining terms are only probed for those results.
+    """
+
+    def __init__(
+        self,
+        segments: list[Segment],
+        resolve: Callable[[list[tuple[str, int]]], list[Optional[dict]]],
+        deleted: Optional[list[set[str]]] = None,
+        stemming: bool = True,
+    ):
+        """Open an index over segments.
+
+        Args:
+            segments: Segments, oldest first
+            resolve: Loads the chunks of (file path, chunk index) pairs,
+                None for chunks that are gone
+            deleted: Per segment, the files whose chunks it no longer serves
+            stemming: Whether the segments were built with stemming
+        """
+        self.segments = segments
+        self.resolve = resolve
+        self.stemming = segments[0].stemming if segments else stemming
+
+        self.bases = []
+        self.chunk_count = 0
+        for segment in segments:
+            segment.base = self.chunk_count
+            self.bases.append(segment.base)
+            self.chunk_count += segment.chunk_count
+
+        # Deleted chunks, and per segment their local chunk id ranges,
+        # which don't count toward the chunk count or document frequencies
+        self.deleted: set[int] = set()
+        self.deleted_ranges: list[list[range]] = [[] for _ in segments]
+        for segment, ranges, files in zip(segments, self.deleted_ranges, deleted or []):
+            for file_path in files:
+                file_no = segment.sorted_files.find(file_path)
+                if file_no is not None:
+                    chunks = segment.file_chunks(file_no)
+                    ranges.append(chunks)
+                    self.deleted.update(segment.base + chunk_id for chunk_id in chunks)
+        self.live_count = self.chunk_count - len(self.deleted)
+
+    @classmethod
+    def build(cls, files: Iterable[tuple[str, list[dict]]], stemming: bool = True) -> "SearchIndex":
+        """Index the chunks of (file path, chunks) pairs in memory."""
+        builder = IndexBuilder(stemming)
+        chunks_by_key = {}
+        for file_path, chunks in files:
+            builder.add_file(file_path, chunks)
+            chunks_by_key.update(((file_path, chunk.get("chunk_index", 0)), chunk) for chunk in chunks)
+
+        return cls([Segment(builder.to_bytes())], lambda hits: [chunks_by_key.get(hit) for hit in hits], stemming=stemming)
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        """Find the chunks best matching a query.
+
+        Returns:
+            Up to limit results, best first (equal scores in index order),
+            with the chunk's file path, index, title, hierarchy, content
+            preview and score
+        """
+        # (most it can add, idf, postings per segment) of each term
+        terms = []
+        for term in set(tokenize(query, self.stemming)):
+            parts = []
+            df = 0
+            for segment, ranges in zip(self.segments, self.deleted_ranges):
+                postings = segment.postings(term)
+                if postings:
+                    parts.append((segment.base, segment.base + segment.chunk_count, postings))
+                    df += len(postings[0]) - self._deleted_postings(postings[0], ranges)
+            if df:
+                weight = idf(self.live_count, df)
+                terms.append((weight * max(postings[3] for _, _, postings in parts), weight, parts, df))
+
+        # Terms that can add the most go first
+        terms.sort(key=lambda term: (-term[0], term[3]))
+        if not terms or limit <= 0:
+            return []
+
+        if len(terms) == 1:
+            _, weight, parts, _ = terms[0]
+            scores = {}
+            for base, _, (ids, impacts, ranked, _) in parts:
+                taken = 0
+                for chunk_id in ranked:
+                    if base + chunk_id in self.deleted:
+                        continue
+                    scores[base + chunk_id] = weight * impacts[bisect_left(ids, chunk_id)]
+                    taken += 1
+                    if taken == limit:
+                        break
+            return self._results(scores, limit)
+
+        # Most that the terms from each position on can still add
+        remaining = [0.0] * (len(terms) + 1)
+        for n in range(len(terms) - 1, -1, -1):
+            remaining[n] = remaining[n + 1] + terms[n][0]
+
+        scores: dict[int, float] = {}
+        for n, (_, weight, parts, df) in enumerate(terms):
+            kth = heapq.nlargest(limit, scores.values())[-1] if len(scores) >= limit else None
+
+            if kth is not None and kth > remaining[n]:
+                # A chunk not scored yet can't make the results; only
+                # finish scoring the chunks that still can
+                candidates = [chunk_id for chunk_id, score in scores.items() if score + remaining[n] >= kth]
+                if len(candidates) * PROBE_COST < df:
+                    for chunk_id in candidates:
+                        scores[chunk_id] += weight * self._impact(parts, chunk_id)
+                else:
+                    for contributions in self._contributions(parts, weight):
+                        for chunk_id in contributions.keys() & candidates:
+                            scores[chunk_id] += contributions[chunk_id]
+                continue
+
+            for contributions in self._contributions(parts, weight):
+                for chunk_id in contributions.keys() & scores.keys():
+                    contributions[chunk_id] += scores[chunk_id]
+                scores.update(contributions)
+            for chunk_id in self.deleted:
+                scores.pop(chunk_id, None)
+
+        return self._results(scores, limit)
+
+    @staticmethod
+    def _deleted_postings(ids, ranges: list[range]) -> int:
+        """How many of a term's postings are for deleted chunks."""
+        return sum(bisect_left(ids, chunks.stop) - bisect_left(ids, chunks.start) for chunks in ranges)
+
+    @staticmethod
+    def _contributions(parts: list[tuple], weight: float) -> Iterator[dict[int, float]]:
+        """Per segment, the scores a term adds to its chunks (built without a Python-level loop)."""
+        for base, _, (ids, impacts, _, _) in parts:
+            yield dict(zip(map(base.__add__, ids), map(weight.__mul__, impacts)))
+
+    @staticmethod
+    def _impact(parts: list[tuple], chunk_id: int) -> float:
+        for base, end, (ids, impacts, _, _) in parts:
+            if base <= chunk_id < end:
+                i = bisect_left(ids, chunk_id - base)
+                if i < len(ids) and ids[i] == chunk_id - base:
+                    return impacts[i]
+        return 0.0
+
+    def _results(self, scores: dict[int, float], limit: int) -> list[dict]:
+        """Turn the best chunk scores into results."""
+        if not scores:
+            return []
+        kth = heapq.nlargest(limit, scores.values())[-1]
+        best = sorted((-score, chunk_id) for chunk_id, score in scores.items() if score >= kth)[:limit]
+
+        hits = []
+        for _, chunk_id in best:
+            segment = self.segments[bisect_right(self.bases, chunk_id) - 1]
+            local_id = chunk_id - segment.base
+            hits.append((segment.file_path(segment.chunk_file(local_id)), segment.chunk_index[local_id]))
+
+        results = []
+        for (score, _), (file_path, chunk_index), chunk in zip(best, hits, self.resolve(hits)):
+            if chunk is None:
+                continue
+            content = chunk.get("content", "")
+            results.append({
+                "file_path": file_path,
+                "chunk_index": chunk_index,
+                "title": chunk.get("title", "Untitled"),
+                "hierarchy": chunk.get("hierarchy", []),
+                "content_preview": content[:PREVIEW_CHARS] + "..." if len(content) > PREVIEW_CHARS else content,
+                "score": round(-score, 4),
+            })
+        return results
+
+
+def get_search_index_dir(docs_dir: Path) -> Path:
+    """Get the directory of the persisted search index of a docs directory."""
+    return docs_dir / ".chunks" / SEARCH_INDEX_DIRNAME
+
+
+def _load_index_manifest(search_dir: Path, stemming: bool) -> Optional[dict]:
+    """Read index.json, or None if missing, unreadable or not matching."""
+    try:
+        manifest = json.loads((search_dir / INDEX_MANIFEST_FILENAME).read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+    if manifest.get("version") != FORMAT_VERSION or manifest.get("stemming") != stemming:
+        return None
+    return manifest
+
+
+def _open_segments(search_dir: Path, manifest: dict) -> Optional[list[Segment]]:
+    try:
+        return [Segment.open(search_dir / entry["name"]) for entry in manifest["segments"]]
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def open_search_index(
+    docs_dir: Path,
+    resolve: Callable[[list[tuple[str, int]]], list[Optional[dict]]],
+    stemming: bool = True,
+    changed: Iterable[tuple[str, list[dict]]] = (),
+    removed: Iterable[str] = (),
+) -> Optional[SearchIndex]:
+    """Open the search index kept by chunk_directory and aidocs watch.
+
+    Only maps the segment files and reads their headers; postings are
+    read from the page cache as queries touch them. Files changed since
+    they were indexed are indexed in memory, in place of their indexed
+    chunks.
+
+    Args:
+        docs_dir: Documentation directory
+        resolve: Loads the chunks of (chunk store path, chunk index) pairs
+        stemming: Whether queries are stemmed; an index built otherwise is
+            not used
+        changed: (chunk store path, chunks) of files new or changed since
+            the index was updated
+        removed: Chunk store paths of indexed files that no longer exist
+
+    Returns:
+        The index, or None if there is none of this version and stemming
+    """
+    search_dir = get_search_index_dir(docs_dir)
+    manifest = _load_index_manifest(search_dir, stemming)
+    if manifest is None:
+        return None
+
+    segments = _open_segments(search_dir, manifest)
+    if segments is None:
+        return None
+
+    builder = IndexBuilder(stemming)
+    changed_chunks = {}
+    for file_path, chunks in changed:
+        builder.add_file(file_path, chunks)
+        changed_chunks.update(((file_path, chunk.get("chunk_index", 0)), chunk) for chunk in chunks)
+
+    stale = set(builder.files) | set(removed)
+    deleted = [set(entry.get("deleted", [])) | stale for entry in manifest["segments"]]
+    if len(builder):
+        segments.append(Segment(builder.to_bytes(_totals(segments, deleted))))
+        deleted.append(set())
+        resolve = partial(_resolve_changed, changed_chunks, resolve)
+    return SearchIndex(segments, resolve, deleted, stemming)
+
+
+def _resolve_changed(
+    changed_chunks: dict[tuple[str, int], dict],
+    resolve: Callable[[list[tuple[str, int]]], list[Optional[dict]]],
+    hits: list[tuple[str, int]],
+) -> list[Optional[dict]]:
+    """Load hits from the chunks indexed in memory, and the rest with resolve."""
+    stored = iter(resolve([hit for hit in hits if hit not in changed_chunks]))
+    return [changed_chunks[hit] if hit in changed_chunks else next(stored) for hit in hits]
+
+
+def _totals(segments: list[Segment], deleted: list[set[str]]) -> tuple[int, tuple[int, ...]]:
+    """Chunk count and total field lengths of segments, leaving out deleted files.
+
+    Args:
+        deleted: Per segment, the files whose chunks it no longer serves
+    """
+    chunk_count = 0
+    field_totals = [0] * len(FIELD_WEIGHTS)
+    for segment, files in zip(segments, deleted):
+        chunk_count += segment.chunk_count
+        field_totals = [a + b for a, b in zip(field_totals, segment.field_totals)]
+        for file_path in files:
+            file_no = segment.sorted_files.find(file_path)
+            if file_no is None:
+                continue
+            chunks = segment.file_chunks(file_no)
+            chunk_count -= len(chunks)
+            for n, lengths in enumerate((segment.title_lengths, segment.parent_lengths, segment.body_lengths)):
+                field_totals[n] -= sum(lengths[chunks.start:chunks.stop])
+    return chunk_count, tuple(field_totals)
+
+
+def _averages(totals: tuple[int, tuple[int, ...]]) -> list[float]:
+    """Average field lengths of chunk count and total field lengths."""
+    chunk_count, field_totals = totals
+    return [total / chunk_count if chunk_count else 0.0 for total in field_totals]
+
+
+def _write_segment(
+    search_dir: Path,
+    manifest: dict,
+    builder: IndexBuilder,
+    others: tuple[int, tuple[int, ...]] = (0, (0, 0, 0)),
+) -> dict:
+    """Write a segment file under a new name, returning its manifest entry.
+
+    Args:
+        others: Live chunk count and total field lengths of the index's
+            other segments, for the field length averages
+
+    Returns:
+        The entry, with the average field lengths the impacts were
+        computed with
+    """
+    name = f"{manifest['next_segment']:08d}.seg"
+    manifest["next_segment"] += 1
+
+    path = search_dir / name
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(builder.to_bytes(others))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    totals = (others[0] + len(builder), tuple(a + sum(b) for a, b in zip(others[1], builder.lengths)))
+    return {"name": name, "chunks": len(builder), "deleted": [], "averages": _averages(totals)}
+
+
+def update_search_index(
+    docs_dir: Path,
+    files: Iterable[tuple[str, list[dict]]],
+    removed: Iterable[str] = (),
+    stemming: bool = True,
+) -> dict:
+    """Bring the persisted search index up to date with changed files.
+
+    The changed files go into a new segment and are marked deleted in the
+    segment that had them. Without a usable index (first run, other
+    version), everything in the chunk store is indexed instead, so the
+    changed files must already be stored.
+
+    Args:
+        docs_dir: Documentation directory
+        files: (chunk store path, chunks) of new and changed files
+        removed: Chunk store paths of files that no longer exist
+        stemming: Whether to stem terms
+
+    Returns:
+        Dict with the number of "segments" and "chunks" indexed
+    """
+    search_dir = get_search_index_dir(docs_dir)
+    search_dir.mkdir(parents=True, exist_ok=True)
+
+    with file_lock(search_dir / LOCK_FILENAME):
+        manifest = _load_index_manifest(search_dir, stemming)
+        segments = _open_segments(search_dir, manifest) if manifest else None
+
+        if segments is None:
+            # Number past any leftover segment files, which readers may still map
+            numbers = [int(path.stem) for path in search_dir.glob("*.seg") if path.stem.isdigit()]
+            manifest = {"version": FORMAT_VERSION, "stemming": stemming, "next_segment": max(numbers, default=0) + 1, "segments": []}
+            segments = []
+            builder = IndexBuilder(stemming)
+            store = ChunkStore.open(docs_dir, readonly=True)
+            if store:
+                with store:
+                    for file_path, chunks in store.iter_files():
+                        builder.add_file(file_path, chunks)
+            if len(builder):
+                manifest["segments"].append(_write_segment(search_dir, manifest, builder))
+        else:
+            builder = IndexBuilder(stemming)
+            for file_path, chunks in files:
+                builder.add_file(file_path, chunks)
+
+            changed = set(builder.files) | set(removed)
+            for segment, entry in zip(segments, manifest["segments"]):
+                deleted = set(entry["deleted"])
+                for file_path in changed - deleted:
+                    file_no = segment.sorted_files.find(file_path)
+                    if file_no is not None:
+                        entry["deleted"].append(file_path)
+                        entry["chunks"] -= len(segment.file_chunks(file_no))
+
+            if len(builder):
+                others = _totals(segments, [set(entry["deleted"]) for entry in manifest["segments"]])
+                manifest["segments"].append(_write_segment(search_dir, manifest, builder, others))
+                segments.append(None)
+
+            _merge_segments(search_dir, manifest, segments)
+
+        atomic_write_text(search_dir / INDEX_MANIFEST_FILENAME, json.dumps(manifest, indent=2))
+
+        # Drop segment files no longer listed; readers that still map one
+        # keep it until they reopen (where deleting fails, the next update retries)
+        live = {entry["name"] for entry in manifest["segments"]}
+        for path in search_dir.glob("*.seg"):
+            if path.name not in live:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    return {
+        "segments": len(manifest["segments"]),
+        "chunks": sum(entry["chunks"] for entry in manifest["segments"]),
+    }
+
+
+def _merge_segments(search_dir: Path, manifest: dict, segments: list[Optional[Segment]]) -> None:
+    """Drop emptied segments and merge the newest ones as they pile up.
+
+    Merged segments get their impacts recomputed from the live field
+    lengths. The whole index is rewritten instead once too many of its
+    chunks are deleted or its averages drifted (see MAX_DELETED_RATIO).
+
+    Args:
+        segments: Open segments parallel to the manifest entries (None for
+            ones written by this update)
+    """
+    entries = manifest["segments"]
+    for i in range(len(entries) - 1, -1, -1):
+        if entries[i]["chunks"] == 0:
+            del entries[i], segments[i]
+    segments[:] = [segment or Segment.open(search_dir / entry["name"]) for segment, entry in zip(segments, entries)]
+
+    if _needs_rewrite(entries, segments):
+        merged = _merge_all(search_dir, manifest, segments, 0)
+        del entries[:], segments[:]
+        entries.append(merged)
+        segments.append(Segment.open(search_dir / merged["name"]))
+        return
+
+    while len(entries) >= 2 and entries[-2]["chunks"] <= MERGE_RATIO * entries[-1]["chunks"]:
+        merged = _merge_all(search_dir, manifest, segments, len(entries) - 2)
+        del entries[-2:], segments[-2:]
+        entries.append(merged)
+        segments.append(Segment.open(search_dir / merged["name"]))
+
+
+def _merge_all(search_dir: Path, manifest: dict, segments: list[Segment], start: int) -> dict:
+    """Write the live chunks of the segments from start on as one segment, returning its entry."""
+    entries = manifest["segments"]
+    builder = IndexBuilder(manifest["stemming"])
+    for segment, entry in zip(segments[start:], entries[start:]):
+        builder.add_segment(segment, set(entry["deleted"]))
+    others = _totals(segments[:start], [set(entry["deleted"]) for entry in entries[:start]])
+    return _write_segment(search_dir, manifest, builder, others)
+
+
+def _needs_rewrite(entries: list[dict], segments: list[Segment]) -> bool:
+    """Whether deleted chunks or drifted averages call for rewriting the whole index."""
+    total = sum(segment.chunk_count for segment in segments)
+    live = sum(entry["chunks"] for entry in entries)
+    if total and (total - live) > MAX_DELETED_RATIO * total:
+        return True
+
+    averages = _averages(_totals(segments, [set(entry["deleted"]) for entry in entries]))
+    for entry in entries:
+        # Entries written before averages were recorded count as drifted
+        recorded = entry.get("averages")
+        if recorded is None or any(abs(a - b) > MAX_AVERAGE_DRIFT * b for a, b in zip(recorded, averages)):
+            return True
+    return False
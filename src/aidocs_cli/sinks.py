@@ -0,0 +1,667 @@
+"""Output sinks for syncing chunk embeddings to a vector DB."""
+
+import abc
+import csv
+import json
+import os
+import sqlite3
+import struct
+from array import array
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Optional, TextIO
+
+SINK_FORMATS = ("sql", "csv", "binary")
+
+COPY_COLUMNS = ("file_path", "content", "chunk_index", "title", "metadata", "embedding")
+
+# Rows written per database transaction by the direct database sinks
+DEFAULT_DB_BATCH_SIZE = 500
+DB_POOL_SIZE = 4
+
+# PGCOPY binary file signature, flags and header extension length
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+PGCOPY_TRAILER = struct.pack("!h", -1)
+
+
+def format_embedding_for_sql(embedding: list[float]) -> str:
+    """Format embedding vector for PostgreSQL pgvector."""
+    # Format as '[0.001, 0.002, ...]'::vector
+    values = ", ".join(f"{v:.8f}" for v in embedding)
+    return f"'[{values}]'::vector"
+
+
+def escape_sql_string(s: str) -> str:
+    """Escape a string for SQL insertion."""
+    # Escape single quotes by doubling them
+    return s.replace("'", "''")
+
+
+def format_vector_text(embedding: list[float]) -> str:
+    """Format embedding vector as pgvector's text input ('[0.1,0.2,...]')."""
+    # 8 significant digits round-trip the float4 values pgvector stores
+    return "[" + ",".join(f"{v:.8g}" for v in embedding) + "]"
+
+
+def pack_copy_row(values: tuple) -> bytes:
+    """Encode one chunk row as a PGCOPY binary tuple.
+
+    Field encodings match the column types of the rag-init table:
+    text/varchar, int4, jsonb (version 1) and pgvector's vector.
+    """
+    file_path, content, chunk_index, title, metadata, embedding = values
+    fields = [
+        file_path.encode("utf-8"),
+        content.encode("utf-8"),
+        struct.pack("!i", chunk_index),
+        title.encode("utf-8"),
+        b"\x01" + json.dumps(metadata).encode("utf-8"),
+        struct.pack(f"!hh{len(embedding)}f", len(embedding), 0, *embedding),
+    ]
+
+    parts = [struct.pack("!h", len(fields))]
+    for field in fields:
+        parts.append(struct.pack("!i", len(field)))
+        parts.append(field)
+    return b"".join(parts)
+
+
+def chunk_metadata(chunk: dict, chunk_id: str) -> dict:
+    """Get the metadata stored with a chunk row."""
+    metadata = dict(chunk.get("metadata", {}))
+    metadata["hierarchy"] = chunk.get("hierarchy", [])
+    metadata["chunk_id"] = chunk_id
+    return metadata
+
+
+def chunk_where_sql(rel_path: str, chunk_id: str) -> str:
+    """Get the WHERE clause matching one chunk row."""
+    return (
+        f"file_path = '{escape_sql_string(rel_path)}'"
+        f" AND metadata->>'chunk_id' = '{escape_sql_string(chunk_id)}'"
+    )
+
+
+class SqlFileSink:
+    """Stream sync statements to a SQL file for psql.
+
+    Statements are written to a temporary file next to the target and
+    flushed after every source file, so memory stays flat and finished work
+    is on disk as it completes. The temporary file only replaces the target
+    (atomically) on commit; an aborted run leaves it behind as *.tmp, and a
+    resumed run truncates it to its last checkpoint and carries on.
+    """
+
+    def __init__(self, path: Path, table_name: str):
+        self.path = path
+        self.tmp_path = path.with_name(path.name + ".tmp")
+        self.data_path: Optional[Path] = None
+        self.database: Optional[str] = None
+        self.table_name = table_name
+        self.file: Optional[TextIO] = None
+        self.resume_from: Optional[dict] = None
+
+    def __enter__(self) -> "SqlFileSink":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.abort()
+
+    def _write(self, text: str) -> None:
+        self.file.write(text)
+        self.file.write("\n")
+
+    def resume(self, checkpoint: dict) -> bool:
+        """Continue an interrupted run's temporary file from a checkpoint.
+
+        Returns:
+            False if the file is missing or shorter than the checkpoint
+        """
+        offset = checkpoint.get("offset")
+        if offset is None or not self.tmp_path.exists() or self.tmp_path.stat().st_size < offset:
+            return False
+        self.resume_from = checkpoint
+        return True
+
+    def open(self) -> None:
+        """Open the temporary file and write the header."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        if self.resume_from:
+            self.file = open(self.tmp_path, "r+", encoding="utf-8")
+            self.file.truncate(self.resume_from["offset"])
+            self.file.seek(self.resume_from["offset"])
+            return
+
+        self.file = open(self.tmp_path, "w", encoding="utf-8")
+        self._write("-- Documentation Sync SQL")
+        self._write(f"-- Generated by aidocs rag-vectors at {datetime.now(timezone.utc).isoformat()}")
+        self._write(f"-- Run with: psql $DATABASE_URL -f {self.path}")
+        self._write("")
+        self._write("BEGIN;")
+        self._write("")
+
+    def start_file(self, rel_path: str, status: str) -> None:
+        """Start the statements for a source file ("new", "update", "replace", "delete")."""
+        labels = {
+            "new": "New file",
+            "update": "Update file",
+            "replace": "Replace file",
+            "delete": "Delete removed file",
+        }
+        self._write(f"-- {labels[status]}: {rel_path}")
+        if status in ("replace", "delete"):
+            self._write(f"DELETE FROM {self.table_name} WHERE file_path = '{escape_sql_string(rel_path)}';")
+
+    def delete_chunk(self, rel_path: str, chunk_id: str) -> None:
+        """Delete a removed chunk."""
+        self._write(f"DELETE FROM {self.table_name} WHERE {chunk_where_sql(rel_path, chunk_id)};")
+
+    def move_chunk(self, rel_path: str, chunk_id: str, chunk_index: int) -> None:
+        """Update the position of an unchanged chunk."""
+        self._write(
+            f"UPDATE {self.table_name} SET chunk_index = {chunk_index}"
+            f" WHERE {chunk_where_sql(rel_path, chunk_id)};"
+        )
+
+    def _row_values(self, rel_path: str, chunk_id: str, chunk: dict, embedding: list[float]) -> dict:
+        metadata = escape_sql_string(json.dumps(chunk_metadata(chunk, chunk_id)))
+        return {
+            "file_path": f"'{escape_sql_string(rel_path)}'",
+            "content": f"'{escape_sql_string(chunk['content'])}'",
+            "chunk_index": str(chunk["chunk_index"]),
+            "title": f"'{escape_sql_string(chunk.get('title', ''))}'",
+            "metadata": f"'{metadata}'::jsonb",
+            "embedding": format_embedding_for_sql(embedding),
+        }
+
+    def insert_chunk(self, rel_path: str, chunk_id: str, chunk: dict, embedding: list[float]) -> None:
+        """Insert a new chunk row."""
+        values = self._row_values(rel_path, chunk_id, chunk, embedding)
+        self._write(f"""INSERT INTO {self.table_name} (file_path, content, chunk_index, title, metadata, embedding)
+VALUES (
+  {values["file_path"]},
+  {values["content"]},
+  {values["chunk_index"]},
+  {values["title"]},
+  {values["metadata"]},
+  {values["embedding"]}
+);""")
+
+    def update_chunk(self, rel_path: str, chunk_id: str, chunk: dict, embedding: list[float]) -> None:
+        """Update a modified chunk row in place."""
+        values = self._row_values(rel_path, chunk_id, chunk, embedding)
+        assignments = ",\n  ".join(
+            f"{column} = {value}"
+            for column, value in values.items()
+            if column != "file_path"
+        )
+        self._write(f"""UPDATE {self.table_name} SET
+  {assignments}
+WHERE {chunk_where_sql(rel_path, chunk_id)};""")
+
+    def chunk_failed(self, rel_path: str, chunk: dict) -> None:
+        """Record a chunk whose embedding could not be generated."""
+        self._write(f"-- ERROR: Failed to generate embedding for chunk {chunk['chunk_index']}")
+
+    def end_file(self) -> Optional[dict]:
+        """Finish a source file and flush its statements to disk.
+
+        Returns:
+            Checkpoint to resume from after this file
+        """
+        self._write("")
+        self.file.flush()
+        return {"offset": self.file.tell()}
+
+    def commit(self, summary: dict) -> None:
+        """Finish the transaction and move the file into place."""
+        self._write("COMMIT;")
+        self._write("")
+        self._write("-- Summary:")
+        self._write(f"-- Deleted: {summary['deleted']} file(s)")
+        self._write(f"-- Synced: {summary['synced']} file(s)")
+        self._write(f"-- Embeddings: {summary['embeddings']}")
+
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self) -> None:
+        """Close the temporary file without replacing the target."""
+        if self.file and not self.file.closed:
+            self.file.close()
+
+
+class CopyFileSink:
+    """Write sync data as a PostgreSQL COPY file plus a psql loader script.
+
+    New and modified chunk rows go to a CSV or PGCOPY binary data file that
+    the loader bulk-loads with a single \\copy. Modified rows are deleted
+    first, so the load is insert-only; deletes and moves stay as statements
+    in the loader. Both files are streamed through *.tmp files and renamed
+    into place on commit, and can be resumed from a checkpoint like
+    SqlFileSink.
+    """
+
+    def __init__(self, loader_path: Path, data_path: Path, table_name: str, binary: bool = False):
+        self.path = loader_path
+        self.data_path = data_path
+        self.database: Optional[str] = None
+        self.tmp_path = loader_path.with_name(loader_path.name + ".tmp")
+        self.data_tmp_path = self.data_path.with_name(self.data_path.name + ".tmp")
+        self.table_name = table_name
+        self.binary = binary
+        self.file: Optional[TextIO] = None
+        self.data_file: Optional[BinaryIO | TextIO] = None
+        self.writer = None
+        self.rows = 0
+        self.resume_from: Optional[dict] = None
+
+    def __enter__(self) -> "CopyFileSink":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.abort()
+
+    def _write(self, text: str) -> None:
+        self.file.write(text)
+        self.file.write("\n")
+
+    def resume(self, checkpoint: dict) -> bool:
+        """Continue an interrupted run's temporary files from a checkpoint.
+
+        Returns:
+            False if either file is missing or shorter than the checkpoint
+        """
+        for path, key in ((self.tmp_path, "offset"), (self.data_tmp_path, "data_offset")):
+            offset = checkpoint.get(key)
+            if offset is None or not path.exists() or path.stat().st_size < offset:
+                return False
+        self.resume_from = checkpoint
+        return True
+
+    def open(self) -> None:
+        """Open the temporary files and write the headers."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        if self.resume_from:
+            self.file = open(self.tmp_path, "r+", encoding="utf-8")
+            if self.binary:
+                self.data_file = open(self.data_tmp_path, "r+b")
+            else:
+                self.data_file = open(self.data_tmp_path, "r+", encoding="utf-8", newline="")
+                self.writer = csv.writer(self.data_file, lineterminator="\n")
+            for handle, key in ((self.file, "offset"), (self.data_file, "data_offset")):
+                handle.truncate(self.resume_from[key])
+                handle.seek(self.resume_from[key])
+            self.rows = self.resume_from.get("rows", 0)
+            return
+
+        self.file = open(self.tmp_path, "w", encoding="utf-8")
+        self._write("-- Documentation Sync SQL (bulk load)")
+        self._write(f"-- Generated by aidocs rag-vectors at {datetime.now(timezone.utc).isoformat()}")
+        self._write(f"-- Run with: psql $DATABASE_URL -f {self.path}")
+        self._write(f"-- Loads rows from: {self.data_path}")
+        self._write("")
+        self._write("BEGIN;")
+        self._write("")
+
+        if self.binary:
+            self.data_file = open(self.data_tmp_path, "wb")
+            self.data_file.write(PGCOPY_HEADER)
+        else:
+            self.data_file = open(self.data_tmp_path, "w", encoding="utf-8", newline="")
+            self.writer = csv.writer(self.data_file, lineterminator="\n")
+
+    def start_file(self, rel_path: str, status: str) -> None:
+        """Start the statements for a source file ("new", "update", "replace", "delete")."""
+        if status in ("replace", "delete"):
+            self._write(f"DELETE FROM {self.table_name} WHERE file_path = '{escape_sql_string(rel_path)}';")
+
+    def delete_chunk(self, rel_path: str, chunk_id: str) -> None:
+        """Delete a removed chunk."""
+        self._write(f"DELETE FROM {self.table_name} WHERE {chunk_where_sql(rel_path, chunk_id)};")
+
+    def move_chunk(self, rel_path: str, chunk_id: str, chunk_index: int) -> None:
+        """Update the position of an unchanged chunk."""
+        self._write(
+            f"UPDATE {self.table_name} SET chunk_index = {chunk_index}"
+            f" WHERE {chunk_where_sql(rel_path, chunk_id)};"
+        )
+
+    def insert_chunk(self, rel_path: str, chunk_id: str, chunk: dict, embedding: list[float]) -> None:
+        """Add a chunk row to the data file."""
+        values = (
+            rel_path,
+            chunk["content"],
+            chunk["chunk_index"],
+            chunk.get("title", ""),
+            chunk_metadata(chunk, chunk_id),
+            embedding,
+        )
+
+        if self.binary:
+            self.data_file.write(pack_copy_row(values))
+        else:
+            self.writer.writerow([
+                *values[:4],
+                json.dumps(values[4]),
+                format_vector_text(embedding),
+            ])
+        self.rows += 1
+
+    def update_chunk(self, rel_path: str, chunk_id: str, chunk: dict, embedding: list[float]) -> None:
+        """Replace a modified chunk row (delete now, reload from the data file)."""
+        self.delete_chunk(rel_path, chunk_id)
+        self.insert_chunk(rel_path, chunk_id, chunk, embedding)
+
+    def chunk_failed(self, rel_path: str, chunk: dict) -> None:
+        """Record a chunk whose embedding could not be generated."""
+        self._write(f"-- ERROR: Failed to generate embedding for {rel_path} chunk {chunk['chunk_index']}")
+
+    def end_file(self) -> Optional[dict]:
+        """Finish a source file and flush both files to disk.
+
+        Returns:
+            Checkpoint to resume from after this file
+        """
+        self.file.flush()
+        self.data_file.flush()
+        return {"offset": self.file.tell(), "data_offset": self.data_file.tell(), "rows": self.rows}
+
+    def commit(self, summary: dict) -> None:
+        """Finish the loader script and move both files into place."""
+        if self.binary:
+            self.data_file.write(PGCOPY_TRAILER)
+
+        copy_format = "binary" if self.binary else "csv"
+        self._write("")
+        self._write(
+            f"\\copy {self.table_name} ({', '.join(COPY_COLUMNS)})"
+            f" FROM '{escape_sql_string(str(self.data_path))}' WITH (FORMAT {copy_format})"
+        )
+        self._write("")
+        self._write("COMMIT;")
+        self._write("")
+        self._write("-- Summary:")
+        self._write(f"-- Deleted: {summary['deleted']} file(s)")
+        self._write(f"-- Synced: {summary['synced']} file(s)")
+        self._write(f"-- Embeddings: {summary['embeddings']}")
+        self._write(f"-- Rows loaded: {self.rows}")
+
+        for handle in (self.data_file, self.file):
+            handle.flush()
+            os.fsync(handle.fileno())
+            handle.close()
+
+        # Data first, so the loader never points at a missing data file
+        os.replace(self.data_tmp_path, self.data_path)
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self) -> None:
+        """Close the temporary files without replacing the targets."""
+        for handle in (self.data_file, self.file):
+            if handle and not handle.closed:
+                handle.close()
+
+
+class DatabaseSink(abc.ABC):
+    """Base for sinks that write straight to a database.
+
+    Operations are buffered and applied in order, one transaction per batch
+    of about batch_size rows. A batch always holds whole source files, and
+    inserts delete any existing row for the chunk first, so re-running an
+    interrupted sync is safe. Every committed batch is a checkpoint.
+    Subclasses provide the connection and the SQL dialect.
+    """
+
+    placeholder = "%s"
+    chunk_id_sql = "metadata->>'chunk_id'"
+    insert_values_sql = "(%s, %s, %s, %s, %s, %s)"
+
+    def __init__(self, table_name: str, batch_size: int = DEFAULT_DB_BATCH_SIZE):
+        self.path: Optional[Path] = None
+        self.data_path: Optional[Path] = None
+        self.database: Optional[str] = None
+        self.table_name = table_name
+        self.batch_size = batch_size
+        self.ops: list[tuple[str, tuple]] = []
+        self.pending_rows = 0
+        self.rows = 0
+
+    def __enter__(self) -> "DatabaseSink":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.abort()
+
+    def resume(self, checkpoint: dict) -> bool:
+        """Continue an interrupted run (committed batches are already in the database)."""
+        return True
+
+    @abc.abstractmethod
+    def open(self) -> None:
+        """Connect to the database."""
+
+    @abc.abstractmethod
+    def close(self) -> None:
+        """Close the connection (buffered operations are not written)."""
+
+    @abc.abstractmethod
+    def _execute(self, ops: list[tuple[str, tuple]]) -> None:
+        """Apply operations in order inside one transaction."""
+
+    @abc.abstractmethod
+    def _encode_row(self, rel_path: str, chunk_id: str, chunk: dict, embedding: list[float]) -> tuple:
+        """Get the insert parameters for a chunk in the dialect's column types."""
+
+    def _where_chunk(self) -> str:
+        return f"file_path = {self.placeholder} AND {self.chunk_id_sql} = {self.placeholder}"
+
+    def start_file(self, rel_path: str, status: str) -> None:
+        """Start the operations for a source file ("new", "update", "replace", "delete")."""
+        if status in ("replace", "delete"):
+            self.ops.append((f"DELETE FROM {self.table_name} WHERE file_path = {self.placeholder}", (rel_path,)))
+
+    def delete_chunk(self, rel_path: str, chunk_id: str) -> None:
+        """Delete a removed chunk."""
+        self.ops.append((f"DELETE FROM {self.table_name} WHERE {self._where_chunk()}", (rel_path, chunk_id)))
+
+    def move_chunk(self, rel_path: str, chunk_id: str, chunk_index: int) -> None:
+        """Update the position of an unchanged chunk."""
+        self.ops.append((
+            f"UPDATE {self.table_name} SET chunk_index = {self.placeholder} WHERE {self._where_chunk()}",
+            (chunk_index, rel_path, chunk_id),
+        ))
+
+    def insert_chunk(self, rel_path: str, chunk_id: str, chunk: dict, embedding: list[float]) -> None:
+        """Upsert a chunk row."""
+        self.delete_chunk(rel_path, chunk_id)
+        self.ops.append((
+            f"INSERT INTO {self.table_name} ({', '.join(COPY_COLUMNS)}) VALUES {self.insert_values_sql}",
+            self._encode_row(rel_path, chunk_id, chunk, embedding),
+        ))
+        self.pending_rows += 1
+        self.rows += 1
+
+    def update_chunk(self, rel_path: str, chunk_id: str, chunk: dict, embedding: list[float]) -> None:
+        """Upsert a modified chunk row."""
+        self.insert_chunk(rel_path, chunk_id, chunk, embedding)
+
+    def chunk_failed(self, rel_path: str, chunk: dict) -> None:
+        """Skip a chunk whose embedding could not be generated."""
+
+    def end_file(self) -> Optional[dict]:
+        """Finish a source file, writing a batch once it is big enough.
+
+        Returns:
+            Checkpoint if the batch was committed, else None
+        """
+        if self.pending_rows >= self.batch_size:
+            self.flush()
+            return {}
+        return None
+
+    def flush(self) -> None:
+        """Write all buffered operations in one transaction."""
+        if self.ops:
+            self._execute(self.ops)
+        self.ops = []
+        self.pending_rows = 0
+
+    def commit(self, summary: dict) -> None:
+        """Write the remaining operations and close the connection."""
+        try:
+            self.flush()
+        finally:
+            self.close()
+
+    def abort(self) -> None:
+        """Drop buffered operations and close the connection."""
+        self.ops = []
+        self.pending_rows = 0
+        self.close()
+
+    @staticmethod
+    def _group(ops: list[tuple[str, tuple]]):
+        """Group consecutive operations with the same statement for executemany."""
+        group_sql, group_params = None, []
+        for sql, params in ops:
+            if sql != group_sql and group_params:
+                yield group_sql, group_params
+                group_params = []
+            group_sql = sql
+            group_params.append(params)
+        if group_params:
+            yield group_sql, group_params
+
+
+class PostgresSink(DatabaseSink):
+    """Write chunk rows to PostgreSQL/pgvector through a connection pool.
+
+    Requires the optional psycopg dependencies (pip install 'aidocs[postgres]').
+    """
+
+    insert_values_sql = "(%s, %s, %s, %s, %s::jsonb, %s::vector)"
+
+    def __init__(self, database_url: str, table_name: str, batch_size: int = DEFAULT_DB_BATCH_SIZE):
+        super().__init__(table_name, batch_size)
+        self.database_url = database_url
+        self.database = "postgresql"
+        self.pool = None
+
+    def open(self) -> None:
+        try:
+            from psycopg_pool import ConnectionPool
+        except ImportError:
+            raise RuntimeError(
+                "psycopg is required to write to PostgreSQL. "
+                "Install it with: pip install 'aidocs[postgres]'"
+            )
+
+        self.pool = ConnectionPool(self.database_url, min_size=1, max_size=DB_POOL_SIZE, open=True)
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    def _encode_row(self, rel_path: str, chunk_id: str, chunk: dict, embedding: list[float]) -> tuple:
+        return (
+            rel_path,
+            chunk["content"],
+            chunk["chunk_index"],
+            chunk.get("title", ""),
+            json.dumps(chunk_metadata(chunk, chunk_id)),
+            format_vector_text(embedding),
+        )
+
+    def _execute(self, ops: list[tuple[str, tuple]]) -> None:
+        with self.pool.connection() as conn:
+            with conn.transaction():
+                with conn.cursor() as cur:
+                    for sql, params in self._group(ops):
+                        cur.executemany(sql, params)
+
+
+class SqliteSink(DatabaseSink):
+    """Write chunk rows to a local SQLite database.
+
+    A stand-in for PostgreSQL in tests and local experiments: same table
+    columns, with metadata stored as JSON text and embeddings as float32 blobs.
+    """
+
+    placeholder = "?"
+    chunk_id_sql = "json_extract(metadata, '$.chunk_id')"
+    insert_values_sql = "(?, ?, ?, ?, ?, ?)"
+
+    def __init__(self, path: Path, table_name: str, batch_size: int = DEFAULT_DB_BATCH_SIZE):
+        super().__init__(table_name, batch_size)
+        self.db_path = path
+        self.database = "sqlite"
+        self.conn: Optional[sqlite3.Connection] = None
+
+    def open(self) -> None:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table_name} ("
+            " file_path TEXT NOT NULL,"
+            " content TEXT NOT NULL,"
+            " chunk_index INTEGER DEFAULT 0,"
+            " title TEXT,"
+            " metadata TEXT,"
+            " embedding BLOB)"
+        )
+        self.conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{self.table_name}_file_path ON {self.table_name}(file_path)"
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _encode_row(self, rel_path: str, chunk_id: str, chunk: dict, embedding: list[float]) -> tuple:
+        return (
+            rel_path,
+            chunk["content"],
+            chunk["chunk_index"],
+            chunk.get("title", ""),
+            json.dumps(chunk_metadata(chunk, chunk_id)),
+            array("f", embedding).tobytes(),
+        )
+
+    def _execute(self, ops: list[tuple[str, tuple]]) -> None:
+        with self.conn:
+            for sql, params in self._group(ops):
+                self.conn.executemany(sql, params)
+
+
+def create_database_sink(database_url: str, table_name: str, batch_size: int = DEFAULT_DB_BATCH_SIZE) -> DatabaseSink:
+    """Create a direct database sink from a postgresql:// or sqlite:/// URL."""
+    if database_url.startswith(("postgresql://", "postgres://")):
+        return PostgresSink(database_url, table_name, batch_size)
+    if database_url.startswith("sqlite:///"):
+        return SqliteSink(Path(database_url[len("sqlite:///"):]), table_name, batch_size)
+    raise ValueError(f"Unsupported database URL: {database_url} (use postgresql:// or sqlite:///)")
+
+
+def create_file_sink(chunks_dir: Path, table_name: str, output_format: str = "sql"):
+    """Create the file sink for an output format ("sql", "csv" or "binary")."""
+    if output_format == "sql":
+        return SqlFileSink(chunks_dir / "sync.sql", table_name)
+    if output_format == "csv":
+        return CopyFileSink(chunks_dir / "sync.load.sql", chunks_dir / "sync.copy.csv", table_name)
+    if output_format == "binary":
+        return CopyFileSink(chunks_dir / "sync.load.sql", chunks_dir / "sync.copy.bin", table_name, binary=True)
+    raise ValueError(f"Unknown output format: {output_format}")
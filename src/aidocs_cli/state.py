@@ -0,0 +1,168 @@
+"""Crash-safe persistence for the JSON state files under .chunks/."""
+
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_FILENAME = "state.lock"
+
+# Fold the journal into the snapshot once it outgrows both of these
+COMPACT_MIN_BYTES = 64 * 1024
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    """Write a file so readers see either the old or the new content.
+
+    The text goes to a temporary file in the same directory, is flushed to
+    disk, then renamed over the target.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive advisory lock on a lock file, waiting for it.
+
+    Works across processes, so `aidocs watch` and a manual `aidocs rag` take
+    turns instead of interleaving their writes.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after 10 seconds; keep waiting
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class JournaledState:
+    """A JSON state file with a "files" map, updated through a journal.
+
+    The state is a snapshot (e.g. manifest.json) plus an append-only
+    journal next to it (manifest.journal.jsonl). Each update appends one
+    line with the changed file entries and top-level fields, so changing
+    one file doesn't rewrite the whole state. Once the journal outgrows
+    the snapshot it is folded back in with an atomic rewrite. All writes
+    hold the lock file of the .chunks directory.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.journal_path = path.with_name(f"{path.stem}.journal.jsonl")
+        self.lock_path = path.parent / LOCK_FILENAME
+
+    def load(self) -> Optional[dict]:
+        """Load the snapshot with the journal applied.
+
+        Holds the lock, so a compaction can't fold the journal into the
+        snapshot between reading the two.
+
+        Returns:
+            The state, or None if neither file exists.
+        """
+        if not self.path.exists() and not self.journal_path.exists():
+            return None
+        with file_lock(self.lock_path):
+            return self._read()
+
+    def _read(self) -> Optional[dict]:
+        state = None
+        if self.path.exists():
+            try:
+                state = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                state = None
+
+        if not self.journal_path.exists():
+            return state
+
+        state = state or {"files": {}}
+        state.setdefault("files", {})
+        try:
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn line from a crash mid-write; later lines are whole
+                        continue
+                    _apply(state, entry)
+        except OSError:
+            pass
+        return state
+
+    def update(self, files: Optional[dict[str, Optional[dict]]] = None, compact: bool = False, **fields) -> None:
+        """Record changed file entries (None removes one) and top-level fields.
+
+        With compact, the journal is folded into the snapshot right away.
+        """
+        entry = {"files": files or {}, "fields": fields}
+        line = (json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8")
+
+        with file_lock(self.lock_path):
+            with open(self.journal_path, "a+b") as f:
+                # Start on a fresh line if a crash left a partial one
+                if f.tell() and _last_byte(f) != b"\n":
+                    line = b"\n" + line
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+                journal_size = f.tell()
+
+            snapshot_size = self.path.stat().st_size if self.path.exists() else 0
+            if compact or journal_size > max(COMPACT_MIN_BYTES, snapshot_size):
+                self._write_snapshot(self._read() or {"files": {}})
+
+    def save(self, state: dict) -> None:
+        """Replace the whole state."""
+        with file_lock(self.lock_path):
+            self._write_snapshot(state)
+
+    def _write_snapshot(self, state: dict) -> None:
+        atomic_write_text(self.path, json.dumps(state, indent=2))
+        self.journal_path.unlink(missing_ok=True)
+
+
+def _apply(state: dict, entry: dict) -> None:
+    for path, file_entry in entry.get("files", {}).items():
+        if file_entry is None:
+            state["files"].pop(path, None)
+        else:
+            state["files"][path] = file_entry
+    state.update(entry.get("fields", {}))
+
+
+def _last_byte(f) -> bytes:
+    f.seek(-1, os.SEEK_END)
+    return f.read(1)
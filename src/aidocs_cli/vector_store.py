@@ -0,0 +1,591 @@
+"""Local store of chunk embeddings for semantic search.
+
+`aidocs rag` keeps the embedding of every chunk under .chunks/vectors/, so
+the MCP server can search by meaning without a database:
+
+    index.json              provider, model, row count and each file's rows
+    vectors-<gen>.npy       float32 matrix, one L2-normalized row per chunk
+    rows-<gen>.npy          chunk index, content key and cluster of each row
+    centroids-<gen>.npy     cluster centroids of the ANN index, if any
+
+The matrix is a plain .npy file that readers memory-map; a search is one
+matrix-vector product over the mapped rows (cosine similarity, since rows
+are normalized) and a partial sort for the top k.
+
+Past ANN_MIN_CHUNKS rows, searches are approximate (an IVF index): the
+rows are clustered with k-means, each row is tagged with its nearest
+centroid, and a query only scans the clusters of its `probes` nearest
+centroids. More probes give better recall at higher latency.
+
+Rows are only appended. A changed file gets new rows after the last one
+(tagged with their nearest existing centroid) and its old rows are left
+unreferenced, so readers of the previous index.json keep a consistent
+view. Once the matrix is full, or unreferenced rows outnumber the live
+ones, the live rows are copied into the files of a new generation; the
+clusters are trained again only if vectors were added since they were.
+
+Requires NumPy (pip install 'aidocs[vectors]').
+"""
+
+import json
+import math
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from .chunk_store import ChunkStore, content_key
+from .embedding_cache import EmbeddingCache
+from .embeddings import (
+    DEFAULT_CONCURRENCY,
+    EmbeddingProvider,
+    estimate_tokens,
+    generate_embeddings_batch,
+    open_embedding_cache,
+)
+from .state import atomic_write_text, file_lock
+
+VECTOR_STORE_DIRNAME = "vectors"
+INDEX_FILENAME = "index.json"
+LOCK_FILENAME = "index.lock"
+
+# Bumped when the file layout changes; a store of another version is rebuilt
+FORMAT_VERSION = 2
+
+# Rows allocated for a new matrix; it doubles from there
+MIN_CAPACITY = 1024
+
+# Chunks embedded per round of an update; bounds the vectors held in memory
+UPDATE_GROUP_CHUNKS = 1000
+
+# Rows from which an ANN index is built (AIDOCS_ANN_MIN_CHUNKS overrides it)
+ANN_MIN_CHUNKS = 50_000
+
+# Clusters scanned per query by default; 0 searches exactly
+DEFAULT_PROBES = 16
+
+# k-means training: rounds, and rows sampled per cluster to train on
+KMEANS_ITERATIONS = 8
+KMEANS_SAMPLE_PER_LIST = 32
+
+# Rows scored against the centroids at once while assigning clusters
+ASSIGN_BATCH = 8192
+
+ROW_DTYPE = np.dtype([("chunk_index", "<u4"), ("key", "V16"), ("list", "<i4")])
+
+
+def get_vector_store_dir(docs_dir: Path) -> Path:
+    """Get the directory holding the vector store of a docs directory."""
+    return docs_dir / ".chunks" / VECTOR_STORE_DIRNAME
+
+
+def _load_index(vector_dir: Path) -> Optional[dict]:
+    """Load index.json, or None if missing, unreadable or of another version."""
+    try:
+        index = json.loads((vector_dir / INDEX_FILENAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(index, dict) or index.get("version") != FORMAT_VERSION:
+        return None
+    return index
+
+
+def _matrix_paths(vector_dir: Path, generation: int) -> tuple[Path, Path]:
+    return vector_dir / f"vectors-{generation:08d}.npy", vector_dir / f"rows-{generation:08d}.npy"
+
+
+def _centroids_path(vector_dir: Path, generation: int) -> Path:
+    return vector_dir / f"centroids-{generation:08d}.npy"
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length (all-zero rows stay zero)."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def default_lists(rows: int) -> int:
+    """Number of clusters for an ANN index of rows (about their square root)."""
+    return max(1, round(math.sqrt(rows)))
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Get the nearest centroid of each of normalized vectors, in batches."""
+    lists = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BATCH):
+        lists[start:start + ASSIGN_BATCH] = np.argmax(vectors[start:start + ASSIGN_BATCH] @ centroids.T, axis=1)
+    return lists
+
+
+def train_centroids(vectors: np.ndarray, lists: int, seed: int = 0) -> np.ndarray:
+    """Cluster normalized vectors with spherical k-means on a sample of them.
+
+    Returns:
+        Normalized centroids, one row per cluster
+    """
+    rng = np.random.default_rng(seed)
+    lists = min(lists, len(vectors))
+    sample_size = min(len(vectors), lists * KMEANS_SAMPLE_PER_LIST)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(sample_size, lists, replace=False)]
+
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = assign_lists(sample, centroids)
+        counts = np.bincount(assignment, minlength=lists)
+        filled = counts > 0
+        # Sum each cluster's members in one pass over the sample sorted by cluster;
+        # an emptied cluster keeps its centroid
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        sums = np.add.reduceat(sample[np.argsort(assignment, kind="stable")], starts[filled], axis=0)
+        centroids[filled] = normalize(sums)
+
+    return centroids
+
+
+class VectorStore:
+    """Memory-mapped chunk embeddings of a docs directory.
+
+    Rows belong to the file whose range in index.json holds them; the
+    others are left over from earlier versions of a file and never match.
+    """
+
+    def __init__(self, vector_dir: Path, index: dict):
+        self.provider = index["provider"]
+        self.model = index["model"]
+        self.dimensions = index["dimensions"]
+
+        count = index["rows"]
+        rows = np.zeros(0, dtype=ROW_DTYPE)
+        self.vectors = np.zeros((0, self.dimensions), dtype=np.float32)
+        if count:
+            vectors_path, rows_path = _matrix_paths(vector_dir, index["generation"])
+            self.vectors = np.load(vectors_path, mmap_mode="r")[:count]
+            rows = np.load(rows_path, mmap_mode="r")[:count]
+            if self.vectors.shape[1] != self.dimensions or len(self.vectors) < count or len(rows) < count:
+                raise ValueError(f"Vector matrix does not match {INDEX_FILENAME}")
+        self.chunk_indexes = rows["chunk_index"]
+
+        # Files in row order, to map a row back to its file
+        files = sorted(index["files"].items(), key=lambda item: item[1]["start"])
+        self.paths = [path for path, _ in files]
+        self.starts = np.array([entry["start"] for _, entry in files], dtype=np.int64)
+
+        self.live = np.zeros(count, dtype=bool)
+        for _, entry in files:
+            self.live[entry["start"]:entry["end"]] = True
+        self.live_count = int(self.live.sum())
+
+        # Live rows grouped by cluster: list l holds list_rows[list_bounds[l + 1]:list_bounds[l + 2]],
+        # and rows added before there were clusters come first
+        self.centroids = None
+        if index.get("lists") and count:
+            self.centroids = np.load(_centroids_path(vector_dir, index["generation"]))
+            live_rows = np.flatnonzero(self.live)
+            row_lists = rows["list"][live_rows]
+            order = np.argsort(row_lists, kind="stable")
+            self.list_rows = live_rows[order]
+            self.list_bounds = np.searchsorted(row_lists[order], np.arange(-1, len(self.centroids) + 1))
+
+    @classmethod
+    def open(cls, docs_dir: Path) -> Optional["VectorStore"]:
+        """Open the vector store of a docs directory.
+
+        Returns:
+            The store, or None if there is none (or it is unreadable or of
+            another version)
+        """
+        vector_dir = get_vector_store_dir(docs_dir)
+        index = _load_index(vector_dir)
+        if index is None:
+            return None
+        try:
+            return cls(vector_dir, index)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def __len__(self) -> int:
+        return self.live_count
+
+    def search(self, vector: list[float], limit: int = 10, probes: int = DEFAULT_PROBES) -> list[tuple[str, int, float]]:
+        """Find the chunks most similar to a query embedding.
+
+        Args:
+            vector: Query embedding
+            limit: Maximum number of results
+            probes: Clusters to scan when the store has an ANN index; more
+                raise recall and latency, 0 scans every row
+
+        Returns:
+            (chunk store path, chunk index, cosine similarity) of up to
+            limit chunks, best first (ties in row order)
+        """
+        query = normalize(np.asarray(vector, dtype=np.float32))
+        if self.centroids is not None and 0 < probes < len(self.centroids):
+            nearest = np.argpartition(self.centroids @ query, -probes)[-probes:]
+            bounds = self.list_bounds
+            candidates = np.concatenate(
+                [self.list_rows[bounds[0]:bounds[1]]]
+                + [self.list_rows[bounds[l + 1]:bounds[l + 2]] for l in nearest]  # noqa: E741
+            )
+            candidates.sort()
+            return self._top(candidates, self.vectors[candidates] @ query, limit)
+
+        scores = self.vectors @ query
+        if self.live_count < len(scores):
+            scores[~self.live] = -np.inf
+        return self._top(None, scores, limit)
+
+    def _top(self, candidates: Optional[np.ndarray], scores: np.ndarray, limit: int) -> list[tuple[str, int, float]]:
+        """Pick the best scores, of candidate rows (or of every row when None)."""
+        k = min(limit, self.live_count, len(scores))
+        if k <= 0:
+            return []
+
+        # Everything tied with the kth best is kept, so ties go by row order
+        kth = np.partition(scores, -k)[-k]
+        top = np.flatnonzero(scores >= kth)
+        top = top[np.lexsort((top, -scores[top]))][:k]
+        rows = candidates[top] if candidates is not None else top
+
+        files = np.searchsorted(self.starts, rows, side="right") - 1
+        return [
+            (self.paths[file_no], int(self.chunk_indexes[row]), float(score))
+            for row, file_no, score in zip(rows, files, scores[top])
+        ]
+
+
+class _Writer:
+    """Appends rows to the current generation of a store, growing it as needed.
+
+    Args:
+        ann_min_chunks: Live rows from which an ANN index is kept
+        ann_lists: Clusters of the ANN index (default: default_lists)
+    """
+
+    def __init__(self, vector_dir: Path, index: dict, ann_min_chunks: int, ann_lists: Optional[int]):
+        self.vector_dir = vector_dir
+        self.index = index
+        self.ann_min_chunks = ann_min_chunks
+        self.ann_lists = ann_lists
+        self.vectors = None
+        self.rows = None
+        self.centroids = None
+        # Files whose rows were written, and vectors added since the ANN
+        # index was trained (rows copied from a file's old ones don't count)
+        self.updated = 0
+        self.added = 0
+        if index["capacity"]:
+            vectors_path, rows_path = _matrix_paths(vector_dir, index["generation"])
+            self.vectors = np.lib.format.open_memmap(vectors_path, mode="r+")
+            self.rows = np.lib.format.open_memmap(rows_path, mode="r+")
+        if index["lists"]:
+            self.centroids = np.load(_centroids_path(vector_dir, index["generation"]))
+
+    def live_rows(self) -> int:
+        return sum(entry["end"] - entry["start"] for entry in self.index["files"].values())
+
+    def previous_vectors(self, path: str) -> dict[bytes, np.ndarray]:
+        """Get the stored vectors of a file's chunks by content key."""
+        entry = self.index["files"].get(path)
+        if entry is None or entry["start"] == entry["end"]:
+            return {}
+        start, end = entry["start"], entry["end"]
+        vectors = np.array(self.vectors[start:end])
+        return {bytes(key): vector for key, vector in zip(self.rows["key"][start:end], vectors)}
+
+    def has_rows(self, path: str, file_hash: Optional[str], chunk_indexes: list[int], keys: list[bytes]) -> bool:
+        """Whether a file's stored rows already are these."""
+        entry = self.index["files"].get(path)
+        if entry is None or entry["hash"] != file_hash or entry["end"] - entry["start"] != len(keys):
+            return False
+        if not keys:
+            return True
+        rows = self.rows[entry["start"]:entry["end"]]
+        return rows["chunk_index"].tolist() == chunk_indexes and [bytes(key) for key in rows["key"]] == keys
+
+    def append(self, path: str, file_hash: Optional[str], chunk_indexes: list[int], keys: list[bytes], vectors: np.ndarray) -> None:
+        """Store the rows of a file, replacing its previous ones."""
+        index = self.index
+        self.updated += 1
+        if index["rows"] + len(keys) > index["capacity"]:
+            self.rewrite(len(keys))
+
+        start = index["rows"]
+        end = start + len(keys)
+        if len(keys):
+            self.vectors[start:end] = vectors
+            self.rows["chunk_index"][start:end] = chunk_indexes
+            self.rows["key"][start:end] = np.frombuffer(b"".join(keys), dtype="V16")
+            self.rows["list"][start:end] = assign_lists(vectors, self.centroids) if self.centroids is not None else -1
+        index["files"][path] = {"hash": file_hash, "start": start, "end": end}
+        index["rows"] = end
+
+    def rewrite(self, extra: int = 0) -> None:
+        """Copy the live rows into a new generation with room for extra more.
+
+        The ANN index is trained again on the copied rows only when vectors
+        were added since it was trained, or it doesn't match the settings;
+        otherwise the rows keep their clusters. It is dropped while there
+        are fewer than ann_min_chunks rows.
+        """
+        index = self.index
+        live = self.live_rows()
+        capacity = max(MIN_CAPACITY, 2 * (live + extra))
+        generation = index["generation"] + 1
+
+        vectors_path, rows_path = _matrix_paths(self.vector_dir, generation)
+        vectors = np.lib.format.open_memmap(vectors_path, mode="w+", dtype=np.float32, shape=(capacity, index["dimensions"]))
+        rows = np.lib.format.open_memmap(rows_path, mode="w+", dtype=ROW_DTYPE, shape=(capacity,))
+
+        position = 0
+        for entry in sorted(index["files"].values(), key=lambda entry: entry["start"]):
+            start, end = entry["start"], entry["end"]
+            count = end - start
+            if count:
+                vectors[position:position + count] = self.vectors[start:end]
+                rows[position:position + count] = self.rows[start:end]
+            entry["start"], entry["end"] = position, position + count
+            position += count
+
+        self.vectors, self.rows = vectors, rows
+        lists = 0
+        if position and position >= self.ann_min_chunks:
+            if self.centroids is None or self.added or _ann_outdated(index, position, self.ann_min_chunks, self.ann_lists):
+                self.centroids = train_centroids(vectors[:position], self.ann_lists or default_lists(position))
+                rows["list"][:position] = assign_lists(vectors[:position], self.centroids)
+                self.added = 0
+            np.save(_centroids_path(self.vector_dir, generation), self.centroids)
+            lists = len(self.centroids)
+        else:
+            self.centroids = None
+            rows["list"][:position] = -1
+
+        index.update({"generation": generation, "capacity": capacity, "rows": position, "lists": lists})
+
+    def flush(self) -> None:
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.rows.flush()
+
+
+def _ann_outdated(index: dict, live: int, ann_min_chunks: int, ann_lists: Optional[int]) -> bool:
+    """Whether the ANN index is missing, or has another number of clusters than asked for."""
+    if live < ann_min_chunks:
+        return False
+    return not index["lists"] or (ann_lists is not None and min(ann_lists, live) != index["lists"])
+
+
+def update_vector_store(
+    docs_dir: Path,
+    provider: EmbeddingProvider,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    ann_min_chunks: Optional[int] = None,
+    ann_lists: Optional[int] = None,
+    cache_only: bool = False,
+) -> dict:
+    """Bring the vector store up to date with the chunk store.
+
+    Files whose chunks changed since their rows were written get new rows.
+    Vectors of chunk contents the file already had are reused; the rest
+    come from the embedding cache (so chunks `aidocs rag` just embedded
+    cost nothing), or are embedded when missing from it. A store made with
+    another provider, model or size is started over.
+
+    With cache_only, nothing is embedded: chunks missing from the cache
+    get no row, and their file is retried on the next update.
+
+    Args:
+        docs_dir: Documentation directory
+        provider: Embedding provider the vectors come from
+        concurrency: Maximum number of embedding requests in flight
+        ann_min_chunks: Chunks from which an ANN index is kept (default:
+            AIDOCS_ANN_MIN_CHUNKS, or ANN_MIN_CHUNKS)
+        ann_lists: Clusters of the ANN index; more make each probe scan
+            fewer rows (default: AIDOCS_ANN_LISTS, or about the square
+            root of the chunk count)
+        cache_only: Only use vectors already stored or cached
+
+    Returns:
+        Dict with the "chunks" stored, the "updated" and "removed" file
+        counts, the ANN index's "lists" (0 without one), and the distinct
+        chunk contents left "missing" a vector with their estimated
+        "missing_tokens"
+    """
+    if ann_min_chunks is None:
+        ann_min_chunks = int(os.environ.get("AIDOCS_ANN_MIN_CHUNKS") or ANN_MIN_CHUNKS)
+    if ann_lists is None and os.environ.get("AIDOCS_ANN_LISTS"):
+        ann_lists = int(os.environ["AIDOCS_ANN_LISTS"])
+
+    vector_dir = get_vector_store_dir(docs_dir)
+    vector_dir.mkdir(parents=True, exist_ok=True)
+
+    with file_lock(vector_dir / LOCK_FILENAME):
+        index = _load_index(vector_dir)
+        fresh = index is None or (index["provider"], index["model"], index["dimensions"]) != (
+            provider.name, provider.model, provider.dimensions,
+        )
+        if fresh:
+            # Number past any leftover matrix files, which readers may still map
+            generations = [int(path.stem[len("vectors-"):]) for path in vector_dir.glob("vectors-*.npy")
+                           if path.stem[len("vectors-"):].isdigit()]
+            index = {
+                "version": FORMAT_VERSION,
+                "provider": provider.name,
+                "model": provider.model,
+                "dimensions": provider.dimensions,
+                "generation": max(generations, default=0),
+                "capacity": 0,
+                "rows": 0,
+                "lists": 0,
+                "files": {},
+            }
+
+        hashes = {}
+        missing: dict[bytes, int] = {}
+        updated = 0
+        store = ChunkStore.open(docs_dir, readonly=True)
+        if store:
+            with store:
+                hashes = store.hashes()
+                removed = [path for path in index["files"] if path not in hashes]
+                changed = [path for path in sorted(hashes) if index["files"].get(path, {}).get("hash") != hashes[path]]
+                live = sum(entry["end"] - entry["start"] for entry in index["files"].values())
+                retrain = _ann_outdated(index, live, ann_min_chunks, ann_lists)
+                if changed or removed or retrain:
+                    writer = _Writer(vector_dir, index, ann_min_chunks, ann_lists)
+                    missing = _update_files(
+                        docs_dir, writer, store, hashes, changed, removed, provider, concurrency, cache_only,
+                    )
+                    updated = writer.updated
+        else:
+            removed = list(index["files"])
+            retrain = False
+            index["files"].clear()
+
+        if fresh or updated or removed or retrain:
+            atomic_write_text(vector_dir / INDEX_FILENAME, json.dumps(index))
+
+            # Drop matrix files of older generations; readers that still map
+            # one keep it until they reopen (where deleting fails, the next update retries)
+            current = {*_matrix_paths(vector_dir, index["generation"]), _centroids_path(vector_dir, index["generation"])}
+            for path in vector_dir.glob("*.npy"):
+                if path not in current:
+                    try:
+                        path.unlink()
+                    except OSError:
+                        pass
+
+    return {
+        "chunks": sum(entry["end"] - entry["start"] for entry in index["files"].values()),
+        "updated": updated,
+        "removed": len(removed),
+        "lists": index["lists"],
+        "missing": len(missing),
+        "missing_tokens": sum(missing.values()),
+    }
+
+
+def _update_files(
+    docs_dir: Path,
+    writer: _Writer,
+    store: ChunkStore,
+    hashes: dict[str, str],
+    changed: list[str],
+    removed: list[str],
+    provider: EmbeddingProvider,
+    concurrency: int,
+    cache_only: bool,
+) -> dict[bytes, int]:
+    """Write new rows for changed files and drop removed ones (see update_vector_store).
+
+    Returns:
+        The estimated tokens of each chunk content left without a vector,
+        by content key
+    """
+    index = writer.index
+    for path in removed:
+        del index["files"][path]
+
+    missing: dict[bytes, int] = {}
+    with open_embedding_cache(docs_dir, provider) as cache:
+        group: list[tuple[str, list[dict]]] = []
+        group_chunks = 0
+        for path in changed:
+            chunks_data = store.get(path)
+            group.append((path, chunks_data["chunks"] if chunks_data else []))
+            group_chunks += len(group[-1][1])
+            if group_chunks >= UPDATE_GROUP_CHUNKS:
+                _write_group(writer, group, hashes, cache, provider, concurrency, cache_only, missing)
+                group, group_chunks = [], 0
+        if group:
+            _write_group(writer, group, hashes, cache, provider, concurrency, cache_only, missing)
+
+    live = writer.live_rows()
+    stale = index["rows"] - live > max(live, MIN_CAPACITY)
+    if stale or _ann_outdated(index, live, writer.ann_min_chunks, writer.ann_lists):
+        # Retrains only if vectors were added (or the settings changed)
+        writer.rewrite()
+    writer.flush()
+    return missing
+
+
+def _write_group(
+    writer: _Writer,
+    group: list[tuple[str, list[dict]]],
+    hashes: dict[str, str],
+    cache: EmbeddingCache,
+    provider: EmbeddingProvider,
+    concurrency: int,
+    cache_only: bool,
+    missing: dict[bytes, int],
+) -> None:
+    """Embed the new chunk contents of a group of files and append their rows.
+
+    Chunks left without a vector (not cached with cache_only, or failed)
+    are recorded in missing.
+    """
+    dimensions = writer.index["dimensions"]
+    files = []
+    texts = []
+    for path, chunks in group:
+        previous = writer.previous_vectors(path)
+        keys = [content_key(chunk["content"]) for chunk in chunks]
+        vectors = [previous.get(key) for key in keys]
+        texts += [chunk["content"] for chunk, vector in zip(chunks, vectors) if vector is None]
+        files.append((path, chunks, keys, vectors))
+
+    if cache_only:
+        embeddings = iter(cache.get_many(texts))
+    else:
+        embeddings = iter(generate_embeddings_batch(texts, concurrency=concurrency, cache=cache, provider=provider))
+
+    for path, chunks, keys, vectors in files:
+        rows = []
+        added = 0
+        failed = False
+        for chunk, key, vector in zip(chunks, keys, vectors):
+            if vector is None:
+                embedding = next(embeddings)
+                if not embedding or len(embedding) != dimensions:
+                    missing[key] = estimate_tokens(chunk["content"])
+                    failed = True
+                    continue
+                vector = normalize(np.asarray(embedding, dtype=np.float32))
+                added += 1
+            rows.append((chunk["chunk_index"], key, vector))
+
+        # A file with failed chunks keeps no hash, so the next update retries it
+        file_hash = None if failed else hashes[path]
+        chunk_indexes = [chunk_index for chunk_index, _, _ in rows]
+        row_keys = [key for _, key, _ in rows]
+        if not added and writer.has_rows(path, file_hash, chunk_indexes, row_keys):
+            continue
+        writer.added += added
+        writer.append(
+            path,
+            file_hash,
+            chunk_indexes,
+            row_keys,
+            np.array([vector for _, _, vector in rows], dtype=np.float32).reshape(len(rows), dimensions),
+        )
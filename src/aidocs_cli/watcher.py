@@ -13,15 +13,26 @@ from rich.text import Text
 from watchdog.events import FileSystemEvent, FileSystemEventHandler
 from watchdog.observers import Observer
 
+from .chunk_store import ChunkStore
 from .chunker import (
     calculate_file_hash,
-    chunk_file,
-    get_chunks_path,
+    file_stat,
+    iter_file_chunks,
     load_manifest,
-    save_chunks,
-    save_manifest,
+    manifest_key,
+    remove_legacy_chunks_file,
+    update_manifest,
 )
-from .embeddings import generate_embedding, get_openai_api_key, load_last_sync, save_last_sync
+from .embeddings import (
+    DEFAULT_CONCURRENCY,
+    EmbeddingProvider,
+    close_http_client,
+    generate_embeddings_batch,
+    get_embedding_provider,
+    open_embedding_cache,
+    update_local_vectors,
+)
+from .search_index import update_search_index
 
 console = Console()
 
@@ -38,7 +49,7 @@ class WatchState:
         self.total_chunks = 0
         self.total_embeddings = 0
         self.recent_files: list[tuple[str, int, str]] = []  # (path, chunks, status)
-        self.api_key: Optional[str] = None
+        self.provider: Optional[EmbeddingProvider] = None
         self.embeddings_enabled = False
 
 
@@ -127,6 +138,7 @@ def process_pending_files(
     with_vectors: bool,
     table_name: str,
     on_update: Optional[callable] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
 ) -> None:
     """Process all pending files."""
     with state.lock:
@@ -136,74 +148,86 @@ def process_pending_files(
     if not files_to_process:
         return
 
-    # Load manifest
+    # Load manifest for the chunking budgets
     manifest = load_manifest(state.docs_dir)
-    last_sync = load_last_sync(state.docs_dir) if state.embeddings_enabled else None
 
     processed_count = 0
     chunks_count = 0
     embeddings_count = 0
     recent = []
+    to_embed = []  # (rel_path, chunk texts, recent index)
+    manifest_updates = {}
+    hashed = {}  # rel_path -> (file_path, file_hash, stat)
+
+    def files_to_store():
+        for file_path in files_to_process:
+            try:
+                # Stat before reading, so a write during the read shows up next run
+                stat = file_stat(file_path)
+                file_hash = calculate_file_hash(file_path)
+            except OSError:
+                continue
+            rel_path = manifest_key(state.docs_dir, file_path)
+            hashed[rel_path] = (file_path, file_hash, stat)
+            # Chunk the file with the budgets rag-chunks last used
+            yield rel_path, file_hash, iter_file_chunks(file_path, **(manifest.get("chunking") or {}))
+
+    # Each file's chunks go to the store as they are produced, so a large
+    # file is never held in memory whole
+    with ChunkStore.open(state.docs_dir) as store:
+        stored = store.put_iter(files_to_store(), skip_errors=(OSError, UnicodeDecodeError))
+
+        for rel_path, file_chunks in stored.items():
+            file_path, file_hash, stat = hashed[rel_path]
+            processed_count += 1
+            chunks_count += file_chunks
+            remove_legacy_chunks_file(file_path)
+
+            manifest_updates[rel_path] = {
+                "hash": file_hash,
+                **stat,
+                "chunk_count": file_chunks,
+                "modified_at": datetime.now().isoformat(),
+            }
+
+            # Track recent file
+            try:
+                display_path = str(file_path.relative_to(state.docs_dir))
+            except ValueError:
+                display_path = file_path.name
+            recent.append((display_path, file_chunks, "chunked"))
+
+            # Only the chunk texts are kept for embedding
+            if state.embeddings_enabled and with_vectors and state.provider:
+                texts = [chunk["content"] for chunk in store.iter_chunks(rel_path)]
+                to_embed.append((rel_path, texts, len(recent) - 1))
+
+        # Index the chunked files for search, reading them back a chunk at a time
+        update_search_index(state.docs_dir, ((rel_path, store.iter_chunks(rel_path)) for rel_path in stored))
+
+    # Generate embeddings for all changed files in one concurrent pass
+    if to_embed:
+        texts = [text for _, file_texts, _ in to_embed for text in file_texts]
+        with open_embedding_cache(state.docs_dir, state.provider) as cache:
+            embeddings = generate_embeddings_batch(
+                texts,
+                concurrency=concurrency,
+                cache=cache,
+                provider=state.provider,
+            )
+        embeddings_count = sum(1 for e in embeddings if e)
 
-    for file_path in files_to_process:
-        if not file_path.exists():
-            continue
-
-        # Chunk the file
-        chunks_data = chunk_file(file_path)
-        if not chunks_data:
-            continue
-
-        # Save chunks
-        chunks_path = save_chunks(chunks_data)
-        processed_count += 1
-        file_chunks = chunks_data["total_chunks"]
-        chunks_count += file_chunks
-
-        # Update manifest
-        rel_path = str(file_path.relative_to(state.docs_dir.parent) if state.docs_dir.parent != file_path.parent else file_path)
-        file_hash = calculate_file_hash(file_path)
-
-        manifest["files"][rel_path] = {
-            "hash": file_hash,
-            "chunks_file": str(chunks_path),
-            "chunk_count": file_chunks,
-            "modified_at": datetime.now().isoformat(),
-        }
-
-        status = "chunked"
-
-        # Generate embeddings if enabled
-        if state.embeddings_enabled and with_vectors and state.api_key:
-            for chunk in chunks_data["chunks"]:
-                embedding = generate_embedding(chunk["content"], state.api_key)
-                if embedding:
-                    embeddings_count += 1
-
-            # Update sync state
-            if last_sync:
-                last_sync["files"][rel_path] = {
-                    "hash": file_hash,
-                    "chunk_count": file_chunks,
-                    "synced_at": datetime.now().isoformat(),
-                }
-            status = "synced"
-
-        # Track recent file
-        try:
-            display_path = str(file_path.relative_to(state.docs_dir))
-        except ValueError:
-            display_path = file_path.name
-        recent.append((display_path, file_chunks, status))
+        # The vectors are in the cache now, so this only copies them over
+        update_local_vectors(state.docs_dir, state.provider, concurrency)
 
-    # Save manifest
-    manifest["last_run"] = datetime.now().isoformat()
-    save_manifest(state.docs_dir, manifest)
+        # The sync state is left to rag-vectors, which writes the database
+        # (and finds these embeddings in the cache)
+        for _, _, recent_index in to_embed:
+            display_path, file_chunks, _ = recent[recent_index]
+            recent[recent_index] = (display_path, file_chunks, "embedded")
 
-    # Save sync state if embeddings were generated
-    if last_sync and embeddings_count > 0:
-        last_sync["synced_at"] = datetime.now().isoformat()
-        save_last_sync(state.docs_dir, last_sync)
+    # Journal just the changed manifest entries
+    update_manifest(state.docs_dir, manifest_updates, last_run=datetime.now().isoformat())
 
     # Update state
     with state.lock:
@@ -248,14 +272,14 @@ def create_status_panel(state: WatchState, with_vectors: bool) -> Panel:
     elif state.embeddings_enabled:
         lines.append("[green]Embeddings: enabled[/green]")
     else:
-        lines.append("[yellow]Embeddings: disabled (no API key)[/yellow]")
+        lines.append("[yellow]Embeddings: disabled (provider not available)[/yellow]")
     lines.append("")
 
     # Recent files
     if state.recent_files:
         lines.append("[bold]Recent:[/bold]")
         for path, chunks, status in state.recent_files:
-            if status == "synced":
+            if status == "embedded":
                 icon = "[green]✓[/green]"
             else:
                 icon = "[blue]○[/blue]"
@@ -279,6 +303,8 @@ def watch_docs(
     with_vectors: bool = False,
     debounce_seconds: float = 2.0,
     table_name: str = "doc_embeddings",
+    concurrency: int = DEFAULT_CONCURRENCY,
+    provider: Optional[EmbeddingProvider] = None,
 ) -> None:
     """Watch a documentation directory for changes and auto-sync.
 
@@ -287,14 +313,17 @@ def watch_docs(
         with_vectors: Enable embedding generation
         debounce_seconds: Wait time after last change before processing
         table_name: PostgreSQL table name for embeddings
+        concurrency: Maximum number of embedding requests in flight
+        provider: Embedding provider (defaults to get_embedding_provider())
     """
     state = WatchState(docs_dir)
 
-    # Check for API key
-    api_key = get_openai_api_key()
-    if api_key and with_vectors:
-        state.api_key = api_key
-        state.embeddings_enabled = True
+    # Check the embedding provider can run (API key or local model)
+    if with_vectors:
+        provider = provider or get_embedding_provider()
+        if not provider.check():
+            state.provider = provider
+            state.embeddings_enabled = True
 
     # Count existing files and chunks
     manifest = load_manifest(docs_dir)
@@ -310,7 +339,7 @@ def watch_docs(
         live_update_event.set()
 
     def do_process():
-        process_pending_files(state, with_vectors, table_name, on_update)
+        process_pending_files(state, with_vectors, table_name, on_update, concurrency)
 
     # Set up file watcher
     event_handler = MarkdownEventHandler(state, debounce_seconds, do_process)
@@ -337,5 +366,8 @@ def watch_docs(
     finally:
         observer.stop()
         observer.join()
+        if provider:
+            provider.close()
+        close_http_client()
 
     console.print("[green]Watcher stopped.[/green]")
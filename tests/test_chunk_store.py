@@ -0,0 +1,110 @@
+"""Tests for chunk_store module."""
+
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from aidocs_cli.chunk_store import ChunkStore, get_chunk_store_path
+from aidocs_cli.chunker import split_by_headings
+
+
+def chunks_data(content: str, file_hash: str = "sha256:1") -> dict:
+    chunks = split_by_headings(content)
+    return {
+        "file_path": "docs/a.md",
+        "file_hash": file_hash,
+        "chunked_at": "2024-01-01T00:00:00+00:00",
+        "total_chunks": len(chunks),
+        "chunks": chunks,
+    }
+
+
+class TestChunkStore:
+    def test_round_trip(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.chdir(tmp_path)
+        data = chunks_data("# Café\n\nIntro ☕.\n\n## B\n\n```py\nx = 1\n```\n\n## C\n\nÜber.\n")
+
+        with ChunkStore.open(Path("docs")) as store:
+            store.put("docs/a.md", data)
+
+        with ChunkStore.open(Path("docs"), readonly=True) as store:
+            loaded = store.get("docs/a.md")
+            assert loaded["chunks"] == data["chunks"]
+            assert loaded["file_hash"] == "sha256:1"
+            assert store.get_chunk("docs/a.md", 1) == data["chunks"][1]
+            assert store.get_chunk("docs/a.md", 2) == data["chunks"][2]
+            assert store.get_chunk("docs/a.md", 3) is None
+            assert store.get("docs/missing.md") is None
+
+    def test_put_replaces_and_delete_removes(self, tmp_path: Path):
+        with ChunkStore.open(tmp_path) as store:
+            store.put_many([
+                ("docs/a.md", chunks_data("## One\n\n## Two\n")),
+                ("docs/b.md", chunks_data("## Three\n")),
+            ])
+            store.put("docs/a.md", chunks_data("## Only\n", "sha256:2"))
+            store.delete(["docs/b.md"])
+
+            assert store.hashes() == {"docs/a.md": "sha256:2"}
+            assert [(path, [c["title"] for c in chunks]) for path, chunks in store.iter_files()] == [("docs/a.md", ["Only"])]
+
+    def test_put_iter_writes_chunks_as_they_come(self, tmp_path: Path):
+        with ChunkStore.open(tmp_path) as store:
+            def chunks():
+                for i in range(1000):
+                    # Earlier contents are already written, not held in a list
+                    if i == 500:
+                        assert store.conn.execute("SELECT COUNT(*) FROM contents").fetchone()[0] >= 400
+                    yield {"chunk_index": i, "title": f"Part {i}", "hierarchy": [], "content": f"Text {i}."}
+
+            assert store.put_iter([("docs/big.md", "sha256:1", chunks())]) == {"docs/big.md": 1000}
+            assert [c["content"] for c in store.iter_chunks("docs/big.md")] == [f"Text {i}." for i in range(1000)]
+            assert store.get("docs/big.md")["total_chunks"] == 1000
+
+    def test_put_iter_skips_a_file_that_fails(self, tmp_path: Path):
+        def unreadable():
+            yield {"chunk_index": 0, "title": "A", "hierarchy": [], "content": "Partial."}
+            raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid start byte")
+
+        with ChunkStore.open(tmp_path) as store:
+            store.put("docs/a.md", chunks_data("## A\n\nOld.\n"))
+            stored = store.put_iter(
+                [("docs/a.md", "sha256:2", unreadable()), ("docs/b.md", "sha256:3", chunks_data("## B\n")["chunks"])],
+                skip_errors=(UnicodeDecodeError,),
+            )
+
+            assert stored == {"docs/b.md": 1}
+            assert store.hashes() == {"docs/a.md": "sha256:1", "docs/b.md": "sha256:3"}
+            assert store.duplicate_stats()["unique"] == 2
+
+    def test_readonly_open_without_store(self, tmp_path: Path):
+        assert ChunkStore.open(tmp_path, readonly=True) is None
+        assert not (tmp_path / ".chunks").exists()
+
+    def test_repeated_content_is_stored_once(self, tmp_path: Path):
+        footer = "## Support\n\nMail us.\n"
+        with ChunkStore.open(tmp_path) as store:
+            store.put_many([
+                ("docs/a.md", chunks_data("## A\n\nOne.\n" + footer)),
+                ("docs/b.md", chunks_data("## B\n\nTwo.\n" + footer)),
+            ])
+            assert store.duplicate_stats() == {"chunks": 4, "unique": 3, "duplicate_ratio": 0.25}
+
+            store.delete(["docs/a.md"])
+            assert store.get_chunk("docs/b.md", 1)["content"] == "## Support\n\nMail us."
+
+            store.put("docs/b.md", chunks_data("## B\n\nTwo.\n"))
+            assert store.duplicate_stats()["unique"] == 1
+
+    def test_older_store_is_rebuilt(self, tmp_path: Path):
+        path = get_chunk_store_path(tmp_path)
+        path.parent.mkdir()
+        with sqlite3.connect(path) as conn:
+            conn.execute("CREATE TABLE files (path TEXT PRIMARY KEY, chunks BLOB)")
+        conn.close()
+
+        assert ChunkStore.open(tmp_path, readonly=True) is None
+        with ChunkStore.open(tmp_path) as store:
+            store.put("docs/a.md", chunks_data("## A\n"))
+            assert store.hashes() == {"docs/a.md": "sha256:1"}
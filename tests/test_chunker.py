@@ -0,0 +1,378 @@
+"""Tests for chunker module."""
+
+import io
+import os
+import random
+import time
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+from aidocs_cli import chunker
+from aidocs_cli.chunk_store import ChunkStore, get_chunk_store_path
+from aidocs_cli.chunker import (
+    chunk_directory,
+    chunk_file,
+    chunking_budget,
+    iter_chunks,
+    read_lines,
+    split_by_headings,
+    split_by_tokens,
+)
+
+
+def make_docs(root: Path, count: int) -> Path:
+    docs = root / "docs"
+    for i in range(count):
+        page = docs / f"section{i % 3}" / f"page{i:03}.md"
+        page.parent.mkdir(parents=True, exist_ok=True)
+        page.write_text(f"# Page {i}\n\nIntro.\n\n## Usage\n\nStep {i}.\n")
+    return docs
+
+
+def age_files(docs: Path, seconds: int = 60) -> None:
+    """Backdate mtimes past the racy window so their stat is trusted."""
+    past = time.time_ns() - seconds * 1_000_000_000
+    for md_file in docs.rglob("*.md"):
+        os.utime(md_file, ns=(past, past))
+
+
+def manifest_entries(docs: Path) -> list[tuple]:
+    manifest = chunker.load_manifest(docs)
+    return [(path, info["hash"], info["chunk_count"]) for path, info in manifest["files"].items()]
+
+
+class TestSplitByHeadings:
+    def test_hierarchy_and_nested_headings(self):
+        content = (
+            "# Guide\n\nIntro.\n\n"
+            "## Install\n\n### Linux\n\nApt.\n\n#### Debian\n\nDeb.\n\n"
+            "## Configure\n\nSet it.\n"
+        )
+        chunks = split_by_headings(content)
+
+        assert [c["title"] for c in chunks] == ["Guide", "Install", "Configure"]
+        assert chunks[0]["metadata"]["headings"] == ["# Guide"]
+        assert chunks[1]["hierarchy"] == ["Guide", "Install"]
+        assert chunks[1]["metadata"]["headings"] == ["## Install", "### Linux", "#### Debian"]
+        assert chunks[2]["content"] == "## Configure\n\nSet it."
+
+    def test_hierarchy_skips_deeper_siblings(self):
+        content = "# A\n### Deep\n## B\ntext\n# C\n## D\n"
+        chunks = split_by_headings(content)
+
+        assert [c["hierarchy"] for c in chunks[1:]] == [["A", "B"], ["C", "D"]]
+
+    def test_code_comments_do_not_split(self):
+        content = "# Deploy\n\n## Steps\n\n```bash\n## build the image\ndocker build .\n```\n"
+        chunks = split_by_headings(content)
+
+        assert [c["title"] for c in chunks] == ["Deploy", "Steps"]
+        assert chunks[1]["metadata"]["headings"] == ["## Steps"]
+
+    def test_without_split_level_headings(self):
+        assert split_by_headings("Just text.")[0]["title"] == "Content"
+
+        chunks = split_by_headings("# Only\n\n### Deep\n")
+        assert len(chunks) == 1
+        assert chunks[0]["hierarchy"] == ["Only"]
+        assert chunks[0]["metadata"]["headings"] == ["# Only", "### Deep"]
+
+
+PARAGRAPH = "word " * 60  # about 100 estimated tokens
+
+
+class TestSplitByTokens:
+    def test_small_sections_are_merged(self):
+        content = "# Guide\n\nIntro.\n\n## A\n\nOne.\n\n## B\n\nTwo.\n\n# Other\n\n## C\n\nThree.\n"
+        chunks = split_by_tokens(content, target_tokens=100, max_tokens=200)
+
+        assert [c["hierarchy"] for c in chunks] == [["Guide"], ["Other", "C"]]
+        assert chunks[0]["metadata"]["headings"] == ["# Guide", "## A", "## B"]
+        assert chunks[1]["content"] == "# Other\n\n## C\n\nThree."
+
+    def test_oversized_section_splits_at_sub_headings(self):
+        content = f"## Install\n\n### Linux\n\n{PARAGRAPH}\n\n### macOS\n\n{PARAGRAPH}\n"
+        chunks = split_by_tokens(content, target_tokens=100, max_tokens=150)
+
+        assert [c["hierarchy"] for c in chunks] == [["Install", "Linux"], ["Install", "macOS"]]
+        assert chunks[0]["content"].startswith("## Install\n\n### Linux")
+        assert all(c["metadata"]["token_count"] <= 150 for c in chunks)
+
+    def test_paragraph_split_never_cuts_code(self):
+        code = "```bash\n" + "echo hi\n\n" * 30 + "```"
+        content = f"## Deploy\n\n{PARAGRAPH}\n\n{code}\n\n{PARAGRAPH}\n"
+        chunks = split_by_tokens(content, target_tokens=120, max_tokens=150)
+
+        assert len(chunks) == 3
+        assert [c["title"] for c in chunks] == ["Deploy"] * 3
+        assert chunks[0]["content"].startswith("## Deploy\n\nword")
+        assert chunks[1]["content"] == code
+
+    @pytest.mark.parametrize("seed", range(200))
+    def test_chunks_never_exceed_max_tokens(self, seed: int):
+        rng = random.Random(seed)
+        blocks = []
+        for _ in range(rng.randint(1, 30)):
+            kind = rng.random()
+            if kind < 0.35:
+                blocks.append("#" * rng.randint(1, 4) + f" Heading {rng.randint(0, 99)}")
+            elif kind < 0.45:
+                blocks.append("```\n" + "\n".join("code " * rng.randint(1, 8) for _ in range(rng.randint(1, 12))) + "\n```")
+            else:
+                blocks.append("\n".join("word " * rng.randint(1, 80) for _ in range(rng.randint(1, 6))))
+        target_tokens = rng.randint(20, 200)
+        max_tokens = rng.choice([target_tokens, rng.randint(target_tokens, 300)])
+
+        chunks = split_by_tokens("\n\n".join(blocks), target_tokens, max_tokens)
+
+        assert all(c["metadata"]["token_count"] <= max_tokens for c in chunks)
+
+    def test_long_lines_are_cut_at_sentences_then_anywhere(self):
+        sentences = " ".join(f"Sentence {i} is here." for i in range(40))
+        blob = "x" * 500
+        content = f"## Notes\n\n{sentences}\n\n## Data\n\n{blob}\n"
+        chunks = split_by_tokens(content, target_tokens=50, max_tokens=60)
+
+        assert all(c["metadata"]["token_count"] <= 60 for c in chunks)
+        notes = [c for c in chunks if c["title"] == "Notes"]
+        assert notes[0]["content"].startswith("## Notes\n\nSentence 0")
+        assert notes[0]["metadata"]["headings"] == ["## Notes"]
+        assert notes[1]["metadata"]["headings"] == []
+        assert all(c["content"].endswith(".") for c in notes)
+        assert " ".join(c["content"] for c in notes).replace("## Notes\n\n", "") == sentences
+        data = "".join(c["content"] for c in chunks if c["title"] == "Data")
+        assert data == "## Data\n\n" + blob
+        assert [c["chunk_index"] for c in chunks] == list(range(len(chunks)))
+
+    def test_lone_heading_takes_the_start_of_a_full_section(self):
+        lines = "\n".join(["word " * 10] * 6)  # about 100 estimated tokens
+        content = f"# Guide\n\n## Install\n\n{lines}\n"
+        chunks = split_by_tokens(content, target_tokens=100, max_tokens=105)
+
+        assert chunks[0]["content"].startswith("# Guide\n\n## Install\n\nword")
+        assert [c["title"] for c in chunks] == ["Install", "Install"]
+        assert all(c["metadata"]["token_count"] <= 105 for c in chunks)
+
+    def test_token_count_in_metadata(self):
+        chunk = split_by_headings("## A\n\nText.")[0]
+        assert chunk["metadata"]["token_count"] > 0
+
+    def test_budget_defaults(self):
+        assert chunking_budget() is None
+        assert chunking_budget(max_tokens=300) == {"target_tokens": 300, "max_tokens": 300}
+        assert chunking_budget(target_tokens=100)["max_tokens"] == 2048
+        with pytest.raises(ValueError):
+            chunking_budget(target_tokens=500, max_tokens=100)
+
+
+class TestIterChunks:
+    def test_chunks_are_yielded_as_sections_close(self):
+        read = []
+
+        def lines():
+            for i in range(100):
+                read.append(i)
+                yield f"## Section {i}"
+                yield "Text."
+
+        chunks = iter_chunks(lines())
+        assert next(chunks)["title"] == "Section 0"
+        assert len(read) == 2
+
+        chunks = iter_chunks(lines(), target_tokens=5, max_tokens=10)
+        assert next(chunks)["title"] == "Section 0"
+        assert len(read) < 10
+
+    def test_matches_whole_content_split(self):
+        content = "# Guide\n\nIntro.\n\n## A\n\n```\n## no\n```\n\n## B\n\n" + PARAGRAPH + "\n"
+
+        assert list(iter_chunks(content.split("\n"))) == split_by_headings(content)
+        assert list(iter_chunks(content.split("\n"), 50, 80)) == split_by_tokens(content, 50, 80)
+        assert list(iter_chunks(["", "  "])) == []
+
+    def test_read_lines_across_blocks(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(chunker, "READ_BLOCK_SIZE", 3)
+        data = "# Tïtle\r\nä\rb\n\r\nlast line\r\n".encode("utf-8")
+
+        assert list(read_lines(io.BytesIO(data))) == ["# Tïtle", "ä", "b", "", "last line", ""]
+
+    def test_chunk_file_hashes_while_reading(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(chunker, "READ_BLOCK_SIZE", 7)
+        path = tmp_path / "page.md"
+        path.write_text("# Page\n\n## A\n\nOne.\n")
+
+        chunks_data = chunk_file(path)
+        assert chunks_data["file_hash"] == chunker.calculate_file_hash(path)
+        assert [c["title"] for c in chunks_data["chunks"]] == ["Page", "A"]
+
+        path.write_text("\n  \n")
+        assert chunk_file(path) is None
+
+
+class TestChunkDirectory:
+    def test_parallel_matches_serial(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(chunker, "PARALLEL_MIN_FILES", 1)
+        serial = make_docs(tmp_path / "serial", 12)
+        parallel = make_docs(tmp_path / "parallel", 12)
+
+        serial_stats = chunk_directory(serial, jobs=1)
+        parallel_stats = chunk_directory(parallel, jobs=3)
+
+        assert parallel_stats["chunks_created"] == serial_stats["chunks_created"] == 24
+        assert [f["path"] for f in parallel_stats["files"]] == [f["path"] for f in serial_stats["files"]]
+        assert manifest_entries(parallel) == manifest_entries(serial)
+        with ChunkStore.open(parallel, readonly=True) as store:
+            assert store.get("docs/section0/page000.md")["total_chunks"] == 2
+
+    def test_large_files_are_streamed(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+        in_memory = make_docs(tmp_path / "memory", 3)
+        streamed = make_docs(tmp_path / "streamed", 3)
+
+        chunk_directory(in_memory)
+        monkeypatch.setattr(chunker, "STREAM_MIN_BYTES", 1)
+        chunk_directory(streamed)
+
+        assert manifest_entries(streamed) == manifest_entries(in_memory)
+        with ChunkStore.open(in_memory, readonly=True) as a, ChunkStore.open(streamed, readonly=True) as b:
+            assert [c["content"] for _, chunks in b.iter_files() for c in chunks] == [
+                c["content"] for _, chunks in a.iter_files() for c in chunks
+            ]
+
+    def test_large_file_memory_does_not_grow_with_the_file(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(chunker, "STREAM_MIN_BYTES", 1)
+        monkeypatch.setattr(chunker, "READ_BLOCK_SIZE", 16 * 1024)
+        section = "Some words about the topic.\n" * 60
+
+        def peak_bytes(name: str, sections: int) -> int:
+            docs = tmp_path / name / "docs"
+            docs.mkdir(parents=True)
+            (docs / "big.md").write_text("".join(f"## Section {i}\n\n{section}\n" for i in range(sections)))
+            tracemalloc.start()
+            try:
+                chunk_directory(docs, jobs=1)
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        small, large = peak_bytes("small", 100), peak_bytes("large", 400)
+        assert large < 2 * small
+
+    def test_unchanged_files_are_skipped(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(chunker, "PARALLEL_MIN_FILES", 1)
+        docs = make_docs(tmp_path, 6)
+        chunk_directory(docs, jobs=2)
+
+        (docs / "section1" / "page001.md").write_text("# Changed\n")
+        stats = chunk_directory(docs, jobs=2)
+
+        assert stats["processed"] == 1
+        assert stats["skipped"] == 5
+        assert [f["status"] for f in stats["files"] if f["status"] != "unchanged"] == ["updated"]
+
+    def test_dry_run_writes_nothing(self, tmp_path: Path):
+        docs = make_docs(tmp_path, 3)
+        stats = chunk_directory(docs, dry=True)
+
+        assert stats["processed"] == 3
+        assert not list(docs.rglob("*.chunks.json"))
+        assert not (docs / ".chunks").exists()
+
+    def test_changed_budget_rechunks(self, tmp_path: Path):
+        docs = make_docs(tmp_path, 3)
+        chunk_directory(docs)
+
+        stats = chunk_directory(docs, max_tokens=500)
+        assert stats["processed"] == 3
+        assert stats["chunks_created"] == 3
+
+        stats = chunk_directory(docs, max_tokens=500)
+        assert stats["skipped"] == 3
+
+    def test_unchanged_stat_skips_hashing(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+        docs = make_docs(tmp_path, 4)
+        age_files(docs)
+        chunk_directory(docs, jobs=1)
+
+        processed = []
+        process = chunker._process_markdown_file
+        monkeypatch.setattr(chunker, "_process_markdown_file", lambda md_file, *args: processed.append(md_file.name) or process(md_file, *args))
+
+        touched = docs / "section1" / "page001.md"
+        os.utime(touched)  # new mtime, same content
+        stats = chunk_directory(docs, jobs=1)
+
+        assert processed == ["page001.md"]
+        assert stats["skipped"] == 4
+
+        # New mtimes are hashed once, then trusted again
+        age_files(docs, 30)
+        processed.clear()
+        chunk_directory(docs, jobs=1)
+        assert len(processed) == 4
+
+        processed.clear()
+        stats = chunk_directory(docs, jobs=1)
+        assert processed == []
+        assert stats["skipped"] == 4
+
+    def test_recent_files_are_not_trusted(self, tmp_path: Path):
+        docs = make_docs(tmp_path, 1)
+        chunk_directory(docs)
+
+        entry = chunker.load_manifest(docs)["files"]
+        assert "mtime_ns" not in next(iter(entry.values()))
+
+    def test_store_replaces_chunks_json(self, tmp_path: Path):
+        docs = make_docs(tmp_path, 3)
+        legacy = docs / "section0" / "page000.chunks.json"
+        legacy.write_text("{}")
+
+        chunk_directory(docs)
+        (docs / "section1" / "page001.md").unlink()
+        chunk_directory(docs)
+
+        assert not legacy.exists()
+        with ChunkStore.open(docs, readonly=True) as store:
+            assert sorted(store.hashes()) == ["docs/section0/page000.md", "docs/section2/page002.md"]
+
+    def test_later_runs_journal_changes(self, tmp_path: Path):
+        docs = make_docs(tmp_path, 3)
+        chunk_directory(docs)
+        snapshot = (docs / ".chunks" / "manifest.json").read_text()
+
+        (docs / "section0" / "page000.md").write_text("# Changed\n")
+        (docs / "section1" / "page001.md").unlink()
+        chunk_directory(docs)
+
+        assert (docs / ".chunks" / "manifest.json").read_text() == snapshot
+        assert (docs / ".chunks" / "manifest.journal.jsonl").exists()
+        assert [(path, count) for path, _, count in manifest_entries(docs)] == [
+            ("docs/section0/page000.md", 1),
+            ("docs/section2/page002.md", 2),
+        ]
+
+    def test_first_run_keeps_concurrent_manifest_updates(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+        docs = make_docs(tmp_path, 2)
+        update_search_index = chunker.update_search_index
+
+        def watcher_writes_meanwhile(*args):
+            chunker.update_manifest(docs, {"docs/other.md": {"hash": "sha256:other"}})
+            update_search_index(*args)
+
+        monkeypatch.setattr(chunker, "update_search_index", watcher_writes_meanwhile)
+        chunk_directory(docs)
+
+        assert sorted(chunker.load_manifest(docs)["files"]) == [
+            "docs/other.md", "docs/section0/page000.md", "docs/section1/page001.md",
+        ]
+        assert not (docs / ".chunks" / "manifest.journal.jsonl").exists()
+
+    def test_missing_store_rechunks(self, tmp_path: Path):
+        docs = make_docs(tmp_path, 2)
+        chunk_directory(docs)
+        get_chunk_store_path(docs).unlink()
+
+        stats = chunk_directory(docs)
+        assert stats["processed"] == 2
@@ -0,0 +1,81 @@
+"""Tests for embedding_cache module."""
+
+from pathlib import Path
+
+import pytest
+
+from aidocs_cli.embedding_cache import EmbeddingCache, cache_key
+
+
+@pytest.fixture
+def cache(tmp_path: Path):
+    """Create a small embedding cache."""
+    with EmbeddingCache(tmp_path / "cache.db", model="m", dimensions=2, max_entries=3) as cache:
+        yield cache
+
+
+class TestCacheKey:
+    def test_ignores_cosmetic_whitespace(self):
+        assert cache_key("## A\nbody  \n", "m", 2) == cache_key("\r\n## A\r\nbody", "m", 2)
+
+    def test_depends_on_model_and_dimensions(self):
+        assert cache_key("text", "m", 2) != cache_key("text", "other", 2)
+        assert cache_key("text", "m", 2) != cache_key("text", "m", 3)
+
+
+class TestEmbeddingCache:
+    def test_round_trip(self, cache: EmbeddingCache):
+        cache.put_many(["a", "b"], [[0.5, 1.0], None])
+
+        assert cache.get_many(["a", "b"]) == [[0.5, 1.0], None]
+        assert cache.hits == 1
+        assert cache.misses == 1
+
+    def test_persists_across_instances(self, tmp_path: Path):
+        path = tmp_path / "cache.db"
+        with EmbeddingCache(path, model="m", dimensions=2) as cache:
+            cache.put_many(["a"], [[0.25, 0.75]])
+
+        with EmbeddingCache(path, model="m", dimensions=2) as cache:
+            assert cache.get_many(["a"]) == [[0.25, 0.75]]
+
+    def test_evicts_least_recently_used(self, cache: EmbeddingCache):
+        cache.put_many(["a", "b", "c"], [[1.0, 0.0]] * 3)
+        cache.conn.execute("UPDATE embeddings SET last_used = 0 WHERE key = ?", (cache.key("b"),))
+        cache.put_many(["d"], [[1.0, 0.0]])
+
+        assert len(cache) == 3
+        assert cache.get_many(["a", "b", "c", "d"])[1] is None
+
+    def test_count_follows_replaced_and_evicted_entries(self, cache: EmbeddingCache):
+        cache.put_many(["a", "b"], [[1.0, 0.0]] * 2)
+        cache.put_many(["a", "b"], [[0.0, 1.0]] * 2)
+        assert len(cache) == 2
+        assert cache.get_many(["a"]) == [[0.0, 1.0]]
+
+        cache.put_many(["c", "d", "e"], [[1.0, 0.0]] * 3)
+        (rows,) = cache.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        assert len(cache) == rows == 3
+
+    def test_puts_do_not_scan_the_table(self, cache: EmbeddingCache):
+        statements = []
+        cache.conn.set_trace_callback(statements.append)
+        for text in "abcdef":
+            cache.put_many([text], [[1.0, 0.0]])
+
+        assert len(cache) == 3
+        assert not [statement for statement in statements if "COUNT(" in statement]
+
+    def test_existing_entries_are_counted_once(self, tmp_path: Path):
+        path = tmp_path / "cache.db"
+        with EmbeddingCache(path, model="m", dimensions=2) as cache:
+            cache.put_many(["a", "b"], [[1.0, 0.0]] * 2)
+            # A cache written before the counter existed
+            cache.conn.executescript(
+                "DROP TRIGGER embeddings_inserted; DROP TRIGGER embeddings_deleted; DROP TABLE cache_stats;"
+            )
+
+        with EmbeddingCache(path, model="m", dimensions=2) as cache:
+            cache.put_many(["c"], [[1.0, 0.0]])
+        with EmbeddingCache(path, model="m", dimensions=2) as cache:
+            assert len(cache) == 3
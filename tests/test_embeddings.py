@@ -0,0 +1,495 @@
+"""Tests for embeddings module."""
+
+import importlib.util
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from aidocs_cli import embeddings, local_embeddings
+from aidocs_cli.chunker import chunk_directory
+from aidocs_cli.embeddings import (
+    EmbeddingProvider,
+    OpenAIProvider,
+    RateLimiter,
+    close_http_client,
+    generate_embeddings_batch,
+    generate_sync_sql,
+    get_embedding_provider,
+    get_http_client,
+    parse_reset_duration,
+    plan_batches,
+)
+from aidocs_cli.local_embeddings import LocalProvider
+from aidocs_cli.sinks import SqliteSink
+
+
+class FakeOpenAI:
+    """Stand-in for the embeddings endpoint that records every request."""
+
+    def __init__(self):
+        self.requests: list[list[str]] = []
+        self.payloads: list[dict] = []
+        self.urls: list[str] = []
+        self.fail_inputs: set[str] = set()
+        self.rate_limited = 0
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        inputs = payload["input"]
+        self.requests.append(inputs)
+        self.payloads.append(payload)
+        self.urls.append(str(request.url))
+
+        if self.rate_limited:
+            self.rate_limited -= 1
+            return httpx.Response(429, headers={"retry-after-ms": "10"})
+
+        if any(text in self.fail_inputs for text in inputs):
+            return httpx.Response(400, json={"error": {"message": "bad input"}})
+
+        # Return results out of order to check they are mapped back by index
+        data = [
+            {"index": i, "embedding": [float(len(text)), float(i)]}
+            for i, text in enumerate(inputs)
+        ]
+        return httpx.Response(200, json={"data": list(reversed(data))})
+
+
+@pytest.fixture
+def openai_api(monkeypatch: pytest.MonkeyPatch) -> FakeOpenAI:
+    """Route all embedding requests to a FakeOpenAI instance."""
+    fake = FakeOpenAI()
+    client = httpx.Client(transport=httpx.MockTransport(fake.handler))
+    monkeypatch.setattr(embeddings, "_http_client", client)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    return fake
+
+
+@pytest.fixture
+def docs_dir(tmp_path: Path) -> Path:
+    """Create a chunked docs directory."""
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "guide.md").write_text(
+        "# Guide\n\nIntro.\n\n## Install\n\nRun it.\n\n## Configure\n\nSet it.\n"
+    )
+    (docs / "faq.md").write_text("# FAQ\n\n## Why?\n\nBecause.\n")
+    chunk_directory(docs)
+    return docs
+
+
+class TestPlanBatches:
+    def test_respects_input_limit(self):
+        batches = plan_batches(["a"] * 5, max_inputs=2)
+        assert batches == [[0, 1], [2, 3], [4]]
+
+    def test_respects_token_limit(self):
+        texts = ["x" * 30, "x" * 30, "x" * 30]
+        batches = plan_batches(texts, max_tokens=15)
+        assert batches == [[0], [1], [2]]
+
+    def test_oversized_text_gets_own_batch(self):
+        batches = plan_batches(["short", "x" * 3000, "short"], max_tokens=100)
+        assert batches == [[0], [1], [2]]
+
+    def test_empty(self):
+        assert plan_batches([]) == []
+
+
+class TestRateLimiter:
+    def test_parse_reset_duration(self):
+        assert parse_reset_duration("1s") == 1.0
+        assert parse_reset_duration("6m0s") == 360.0
+        assert parse_reset_duration("20ms") == pytest.approx(0.02)
+        assert parse_reset_duration("") is None
+
+    def test_acquire_within_allowance_does_not_block(self):
+        limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=1000)
+        limiter.acquire(100)
+        assert limiter.request_allowance == pytest.approx(59, abs=0.1)
+        assert limiter.token_allowance == pytest.approx(900, abs=1)
+
+    def test_update_from_headers(self):
+        limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=1000)
+        limiter.update_from_headers(httpx.Headers({
+            "x-ratelimit-limit-requests": "500",
+            "x-ratelimit-remaining-requests": "3",
+            "x-ratelimit-limit-tokens": "2000",
+            "x-ratelimit-remaining-tokens": "oops",
+        }))
+
+        assert limiter.requests_per_minute == 500
+        assert limiter.request_allowance == pytest.approx(3, abs=0.1)
+        assert limiter.tokens_per_minute == 2000
+
+
+class TestGenerateEmbeddingsBatch:
+    def test_packs_texts_into_one_request(self, openai_api: FakeOpenAI):
+        texts = ["one", "three", "fifteen"]
+        result = generate_embeddings_batch(texts, "sk-test")
+
+        assert len(openai_api.requests) == 1
+        assert result == [[3.0, 0.0], [5.0, 1.0], [7.0, 2.0]]
+
+    def test_rejected_batch_falls_back_to_single_requests(self, openai_api: FakeOpenAI):
+        openai_api.fail_inputs = {"bad"}
+        result = generate_embeddings_batch(["good", "bad", "fine"], "sk-test")
+
+        assert result[0] == [4.0, 0.0]
+        assert result[1] is None
+        assert result[2] == [4.0, 0.0]
+
+    def test_retries_after_rate_limit(self, openai_api: FakeOpenAI):
+        openai_api.rate_limited = 2
+        result = generate_embeddings_batch(["a", "b"], "sk-test")
+
+        assert len(openai_api.requests) == 3
+        assert result == [[1.0, 0.0], [1.0, 1.0]]
+
+    def test_concurrent_requests_keep_order(self, openai_api: FakeOpenAI, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(embeddings, "MIN_BATCH_INPUTS", 1)
+        texts = ["x" * n for n in range(1, 21)]
+        result = generate_embeddings_batch(texts, "sk-test", concurrency=8)
+
+        assert len(openai_api.requests) == 7
+        assert [e[0] for e in result] == [float(n) for n in range(1, 21)]
+
+
+class CountingProvider(EmbeddingProvider):
+    """Provider that embeds a text as [length, batch size]."""
+
+    name = "counting"
+    max_batch_inputs = 3
+    workers = 2
+
+    def __init__(self, model: str = "counting-v1"):
+        super().__init__(model, 2)
+        self.batches: list[list[str]] = []
+
+    def embed(self, inputs: list[str]) -> list[list[float]]:
+        self.batches.append(inputs)
+        return [[float(len(text)), float(len(inputs))] for text in inputs]
+
+
+class FakeModel:
+    """Stand-in for a sentence-transformers model, embedding a text as its length."""
+
+    dimensions = 8
+
+    def __init__(self):
+        self.loads = True
+
+    def get_sentence_embedding_dimension(self) -> int:
+        if not self.loads:
+            raise BrokenProcessPool("A process in the process pool was terminated abruptly")
+        return self.dimensions
+
+    def encode(self, texts: list[str], **kwargs) -> SimpleNamespace:
+        if "bad" in texts:
+            raise ValueError("Input rejected")
+        if "crash" in texts:
+            raise BrokenProcessPool("A process in the process pool was terminated abruptly")
+        return SimpleNamespace(tolist=lambda: [[float(len(text))] * self.dimensions for text in texts])
+
+
+@pytest.fixture
+def fake_model(monkeypatch: pytest.MonkeyPatch) -> FakeModel:
+    """Run LocalProvider's workers as threads holding a FakeModel."""
+    model = FakeModel()
+    monkeypatch.setattr(local_embeddings, "_worker_model", model)
+    monkeypatch.setattr(
+        local_embeddings,
+        "ProcessPoolExecutor",
+        lambda max_workers, mp_context, initializer, initargs: ThreadPoolExecutor(max_workers),
+    )
+    return model
+
+
+class TestProviders:
+    def test_openai_provider_sends_model_dimensions_and_url(self, openai_api: FakeOpenAI):
+        provider = OpenAIProvider(
+            "sk-test",
+            model="text-embedding-3-large",
+            dimensions=256,
+            api_url="http://localhost:8080/v1/embeddings",
+        )
+        generate_embeddings_batch(["a"], provider=provider)
+
+        assert openai_api.payloads[0] == {"model": "text-embedding-3-large", "input": ["a"], "dimensions": 256}
+        assert openai_api.urls[0] == "http://localhost:8080/v1/embeddings"
+
+    def test_openai_provider_uses_model_dimensions(self):
+        assert OpenAIProvider("sk-test", model="text-embedding-3-large").dimensions == 3072
+        assert OpenAIProvider(None).check() == "OPENAI_API_KEY not set"
+
+    def test_provider_must_implement_embed(self):
+        class NoEmbed(EmbeddingProvider):
+            name = "none"
+
+        with pytest.raises(TypeError, match="embed"):
+            NoEmbed("none-v1")
+
+    def test_batches_follow_provider_limits(self):
+        provider = CountingProvider()
+        result = generate_embeddings_batch(["a", "bb", "ccc", "dddd"], provider=provider, concurrency=1)
+
+        assert sorted(len(batch) for batch in provider.batches) == [1, 3]
+        assert [e[0] for e in result] == [1.0, 2.0, 3.0, 4.0]
+
+    def test_configured_from_environment(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setenv("AIDOCS_EMBEDDING_MODEL", "text-embedding-3-large")
+        monkeypatch.setenv("AIDOCS_EMBEDDING_DIMENSIONS", "512")
+        monkeypatch.setenv("AIDOCS_EMBEDDING_URL", "http://localhost:11434/v1/embeddings")
+
+        provider = get_embedding_provider()
+        assert isinstance(provider, OpenAIProvider)
+        assert (provider.model, provider.dimensions) == ("text-embedding-3-large", 512)
+        assert provider.api_url == "http://localhost:11434/v1/embeddings"
+
+        monkeypatch.setenv("AIDOCS_EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2")
+        monkeypatch.delenv("AIDOCS_EMBEDDING_DIMENSIONS")
+        local = get_embedding_provider("local")
+        assert isinstance(local, LocalProvider)
+        assert local.dimensions == 768
+
+        with pytest.raises(ValueError):
+            get_embedding_provider("nope")
+
+    @pytest.mark.skipif(
+        importlib.util.find_spec("sentence_transformers") is not None,
+        reason="sentence-transformers is installed",
+    )
+    def test_local_provider_reports_missing_package(self):
+        assert "aidocs[local]" in LocalProvider(workers=1).check()
+
+    def test_local_provider_checks_the_model_size(self, fake_model: FakeModel):
+        provider = LocalProvider(dimensions=384, workers=1)
+        with pytest.raises(ValueError, match="8-dimensional"):
+            provider.embed(["text"])
+        assert provider.pool is None
+
+        provider = LocalProvider("custom/model", workers=1)
+        assert provider.dimensions == 8
+        provider.close()
+
+    def test_local_provider_only_swallows_bad_inputs(self, fake_model: FakeModel):
+        provider = LocalProvider(dimensions=8, workers=1)
+        assert provider.embed(["text"]) == [[4.0] * 8]
+        assert provider.embed(["bad"]) is None
+        with pytest.raises(BrokenProcessPool):
+            provider.embed(["crash"])
+        provider.close()
+
+        fake_model.loads = False
+        with pytest.raises(RuntimeError, match="Could not load"):
+            LocalProvider(dimensions=8, workers=1).embed(["text"])
+
+    def test_model_change_re_embeds_everything(self, docs_dir: Path, openai_api: FakeOpenAI):
+        generate_sync_sql(docs_dir)
+        result = generate_sync_sql(docs_dir, provider=CountingProvider())
+
+        assert result["stats"]["to_sync"] == 2
+        assert result["stats"]["embeddings_generated"] == 5
+        state = json.loads((docs_dir / ".chunks" / "last-sync.json").read_text())
+        assert state["model"] == "counting-v1"
+
+
+class TestHttpClient:
+    def test_client_is_shared_and_recreated_after_close(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(embeddings, "_http_client", None)
+
+        client = get_http_client()
+        assert get_http_client() is client
+
+        close_http_client()
+        assert client.is_closed
+        assert get_http_client() is not client
+        close_http_client()
+
+
+class TestGenerateSyncSql:
+    def test_batches_all_chunks(self, docs_dir: Path, openai_api: FakeOpenAI):
+        result = generate_sync_sql(docs_dir)
+
+        assert result["success"]
+        assert result["stats"]["embeddings_generated"] == 5
+        assert len(openai_api.requests) == 1
+
+        sql = Path(result["sql_file"]).read_text()
+        assert sql.count("INSERT INTO doc_embeddings") == 5
+        assert "ERROR" not in sql
+
+    def test_changed_file_only_embeds_changed_chunks(self, docs_dir: Path, openai_api: FakeOpenAI):
+        generate_sync_sql(docs_dir)
+
+        guide = docs_dir / "guide.md"
+        guide.write_text(guide.read_text().replace("Set it.", "Set it up."))
+        chunk_directory(docs_dir)
+        result = generate_sync_sql(docs_dir)
+
+        assert result["stats"]["chunks_updated"] == 1
+        assert result["stats"]["chunks_unchanged"] == 2
+        assert openai_api.requests[-1] == ["## Configure\n\nSet it up."]
+
+        sql = Path(result["sql_file"]).read_text()
+        assert "INSERT INTO" not in sql
+        assert "DELETE FROM" not in sql
+        assert "WHERE file_path = 'docs/guide.md' AND metadata->>'chunk_id' = 'Guide > Configure';" in sql
+
+    def test_removed_and_moved_chunks(self, docs_dir: Path, openai_api: FakeOpenAI):
+        generate_sync_sql(docs_dir)
+
+        (docs_dir / "guide.md").write_text("# Guide\n\nIntro.\n\n## Configure\n\nSet it.\n")
+        chunk_directory(docs_dir)
+        result = generate_sync_sql(docs_dir)
+
+        assert result["stats"]["chunks_deleted"] == 1
+        assert result["stats"]["chunks_moved"] == 1
+        assert len(openai_api.requests) == 1
+
+        sql = Path(result["sql_file"]).read_text()
+        assert "DELETE FROM doc_embeddings WHERE file_path = 'docs/guide.md' AND metadata->>'chunk_id' = 'Guide > Install';" in sql
+        assert "UPDATE doc_embeddings SET chunk_index = 1 WHERE file_path = 'docs/guide.md'" in sql
+
+    def test_legacy_sync_state_replaces_whole_file(self, docs_dir: Path, openai_api: FakeOpenAI):
+        generate_sync_sql(docs_dir)
+        sync_path = docs_dir / ".chunks" / "last-sync.json"
+        state = json.loads(sync_path.read_text())
+        for info in state["files"].values():
+            del info["chunks"]
+            info["hash"] = "sha256:old"
+        sync_path.write_text(json.dumps(state))
+
+        result = generate_sync_sql(docs_dir)
+
+        sql = Path(result["sql_file"]).read_text()
+        assert "DELETE FROM doc_embeddings WHERE file_path = 'docs/guide.md';" in sql
+        assert sql.count("INSERT INTO") == 5
+
+    def test_repeated_chunks_are_embedded_once(self, docs_dir: Path, openai_api: FakeOpenAI):
+        (docs_dir / "copy.md").write_text((docs_dir / "faq.md").read_text())
+        stats = chunk_directory(docs_dir)
+        assert stats["duplicates"]["chunks"] - stats["duplicates"]["unique"] == 2
+
+        result = generate_sync_sql(docs_dir)
+
+        assert result["stats"]["chunks_duplicate"] == 2
+        assert result["stats"]["embeddings_generated"] == 7
+        assert sum(len(inputs) for inputs in openai_api.requests) == 5
+
+    def test_second_run_is_up_to_date(self, docs_dir: Path, openai_api: FakeOpenAI):
+        generate_sync_sql(docs_dir)
+        result = generate_sync_sql(docs_dir)
+
+        assert result["message"] == "Nothing to sync - all files up to date"
+        assert len(openai_api.requests) == 1
+
+    def test_writes_directly_to_database(self, docs_dir: Path, openai_api: FakeOpenAI, tmp_path: Path):
+        db_path = tmp_path / "vectors.db"
+        result = generate_sync_sql(docs_dir, database_url=f"sqlite:///{db_path}")
+
+        assert result["database"] == "sqlite"
+        assert "sql_file" not in result
+        assert not (docs_dir / ".chunks" / "sync.sql").exists()
+
+        guide = docs_dir / "guide.md"
+        guide.write_text(guide.read_text().replace("## Install\n\nRun it.\n\n", ""))
+        chunk_directory(docs_dir)
+        generate_sync_sql(docs_dir, database_url=f"sqlite:///{db_path}")
+
+        conn = sqlite3.connect(db_path)
+        titles = [row[0] for row in conn.execute("SELECT title FROM doc_embeddings ORDER BY file_path, chunk_index")]
+        assert titles == ["FAQ", "Why?", "Guide", "Configure"]
+
+    def test_sql_written_through_temp_file(self, docs_dir: Path, openai_api: FakeOpenAI, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(embeddings, "SYNC_GROUP_CHUNKS", 2)
+        result = generate_sync_sql(docs_dir)
+
+        sql_path = Path(result["sql_file"])
+        assert not sql_path.with_name("sync.sql.tmp").exists()
+        assert sql_path.read_text().rstrip().endswith("-- Embeddings: 5")
+        assert len(openai_api.requests) == 2
+
+    def test_failed_run_keeps_previous_sql(self, docs_dir: Path, openai_api: FakeOpenAI, monkeypatch: pytest.MonkeyPatch):
+        sql_path = docs_dir / ".chunks" / "sync.sql"
+        sql_path.write_text("-- previous")
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("boom")
+
+        monkeypatch.setattr(embeddings, "generate_embeddings_batch", fail)
+        with pytest.raises(RuntimeError):
+            generate_sync_sql(docs_dir)
+
+        assert sql_path.read_text() == "-- previous"
+        assert "BEGIN;" in sql_path.with_name("sync.sql.tmp").read_text()
+
+
+class TestResume:
+    @pytest.fixture
+    def interrupted(self, docs_dir: Path, openai_api: FakeOpenAI, monkeypatch: pytest.MonkeyPatch):
+        """Run a sync that dies while embedding its second group of files."""
+        monkeypatch.setattr(embeddings, "SYNC_GROUP_CHUNKS", 2)
+        real = embeddings.generate_embeddings_batch
+        calls = []
+
+        def fail_second(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError("boom")
+            return real(*args, **kwargs)
+
+        monkeypatch.setattr(embeddings, "generate_embeddings_batch", fail_second)
+        return lambda **kwargs: generate_sync_sql(docs_dir, **kwargs)
+
+    def test_rerun_continues_sql_file(self, interrupted, docs_dir: Path, openai_api: FakeOpenAI, monkeypatch: pytest.MonkeyPatch):
+        with pytest.raises(RuntimeError):
+            interrupted()
+        journal_path = docs_dir / ".chunks" / "sync-journal.jsonl"
+        assert journal_path.exists()
+
+        monkeypatch.setattr(embeddings, "generate_embeddings_batch", generate_embeddings_batch)
+        result = generate_sync_sql(docs_dir)
+
+        # Every chunk is embedded exactly once across both runs
+        assert result["stats"]["resumed"] == 1
+        assert sum(len(inputs) for inputs in openai_api.requests) == 5
+        assert not journal_path.exists()
+
+        sql = Path(result["sql_file"]).read_text()
+        assert sql.count("BEGIN;") == 1
+        assert sql.count("INSERT INTO doc_embeddings") == 5
+        assert "-- Synced: 2 file(s)" in sql
+
+        state = json.loads((docs_dir / ".chunks" / "last-sync.json").read_text())
+        assert set(state["files"]) == {"docs/guide.md", "docs/faq.md"}
+
+    def test_rerun_continues_database(self, interrupted, docs_dir: Path, openai_api: FakeOpenAI, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+        url = f"sqlite:///{tmp_path / 'vectors.db'}"
+        monkeypatch.setattr(embeddings, "create_database_sink", lambda url, table: SqliteSink(tmp_path / "vectors.db", table, batch_size=1))
+        with pytest.raises(RuntimeError):
+            interrupted(database_url=url)
+
+        monkeypatch.setattr(embeddings, "generate_embeddings_batch", generate_embeddings_batch)
+        result = generate_sync_sql(docs_dir, database_url=url)
+
+        assert result["stats"]["resumed"] == 1
+        conn = sqlite3.connect(tmp_path / "vectors.db")
+        (rows,) = conn.execute("SELECT COUNT(*) FROM doc_embeddings").fetchone()
+        assert rows == 5
+
+    def test_other_output_format_starts_over(self, interrupted, docs_dir: Path, monkeypatch: pytest.MonkeyPatch):
+        with pytest.raises(RuntimeError):
+            interrupted()
+
+        monkeypatch.setattr(embeddings, "generate_embeddings_batch", generate_embeddings_batch)
+        result = generate_sync_sql(docs_dir, output_format="csv")
+
+        assert result["stats"]["resumed"] == 0
+        assert result["stats"]["to_sync"] == 2
@@ -0,0 +1,51 @@
+"""Tests for journal module."""
+
+from pathlib import Path
+
+from aidocs_cli.journal import SyncJournal
+
+RUN = {"table": "doc_embeddings", "target": "sql"}
+
+
+class TestSyncJournal:
+    def test_only_checkpointed_files_are_done(self, tmp_path: Path):
+        journal = SyncJournal(tmp_path / "sync-journal.jsonl")
+        with journal.start(RUN):
+            journal.record("docs/a.md", {"hash": "a"})
+            journal.record("docs/old.md", None)
+            journal.checkpoint({"sink": {"offset": 10}})
+            journal.record("docs/b.md", {"hash": "b"})
+            journal.file.flush()
+
+        resumed = journal.load(RUN)
+        assert resumed["files"] == {"docs/a.md": {"hash": "a"}, "docs/old.md": None}
+        assert resumed["checkpoint"] == {"sink": {"offset": 10}}
+
+    def test_resume_drops_entries_after_checkpoint(self, tmp_path: Path):
+        path = tmp_path / "sync-journal.jsonl"
+        journal = SyncJournal(path)
+        with journal.start(RUN):
+            journal.record("docs/a.md", {"hash": "a"})
+            journal.checkpoint({"sink": {"offset": 10}})
+            journal.record("docs/b.md", {"hash": "b"})
+
+        with journal.start(RUN, journal.load(RUN)):
+            journal.checkpoint({"sink": {"offset": 20}})
+
+        assert set(journal.load(RUN)["files"]) == {"docs/a.md"}
+
+    def test_ignores_other_runs_and_torn_lines(self, tmp_path: Path):
+        path = tmp_path / "sync-journal.jsonl"
+        journal = SyncJournal(path)
+        with journal.start(RUN):
+            journal.record("docs/a.md", {"hash": "a"})
+            journal.checkpoint({"sink": {"offset": 10}})
+        with open(path, "a") as f:
+            f.write('{"path": "docs/b.m')
+
+        assert journal.load({**RUN, "target": "csv"}) is None
+        assert set(journal.load(RUN)["files"]) == {"docs/a.md"}
+
+        journal.clear()
+        assert not path.exists()
+        assert journal.load(RUN) is None
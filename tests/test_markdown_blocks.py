@@ -0,0 +1,61 @@
+"""Tests for markdown_blocks module."""
+
+from aidocs_cli.markdown_blocks import CODE, FRONT_MATTER, HTML, BlockScanner, find_headings
+from aidocs_cli.pdf_exporter import extract_headings
+
+
+def titles(content: str) -> list[str]:
+    return [title for _, _, title in find_headings(content.split("\n"))]
+
+
+class TestFindHeadings:
+    def test_ignores_comments_in_code_fences(self):
+        content = (
+            "# Setup\n\n```bash\n# install deps\nnpm install\n```\n\n"
+            "## Usage\n\n~~~python\n# comment\n~~~\n"
+        )
+        assert titles(content) == ["Setup", "Usage"]
+
+    def test_fence_closes_only_on_matching_fence(self):
+        content = "````md\n```\n# Inside\n```\n````\n# After\n"
+        assert titles(content) == ["After"]
+
+    def test_backtick_info_string_is_not_a_fence(self):
+        assert titles("``` not `a` fence\n# Heading\n") == ["Heading"]
+
+    def test_skips_front_matter(self):
+        content = "---\ntitle: Guide\n# not: a heading\n---\n# Guide\n"
+        assert titles(content) == ["Guide"]
+        assert titles("+++\n# toml\n+++\n# Real\n") == ["Real"]
+
+    def test_thematic_break_later_is_not_front_matter(self):
+        assert titles("# A\n---\n# B\n") == ["A", "B"]
+
+    def test_skips_html_blocks(self):
+        content = (
+            "<!--\n# commented out\n-->\n"
+            "<pre>\n# preformatted\n</pre>\n"
+            "<div>\n# inside div\n\n# After div\n"
+        )
+        assert titles(content) == ["After div"]
+
+    def test_unclosed_fence_runs_to_end(self):
+        assert titles("# A\n```\n# B\n") == ["A"]
+
+
+class TestBlockScanner:
+    def test_line_kinds(self):
+        scanner = BlockScanner()
+        kinds = [scanner.scan(line) for line in ["---", "a: 1", "---", "```", "x", "```", "<!-- c -->", "text"]]
+        assert kinds == [FRONT_MATTER] * 3 + [CODE] * 3 + [HTML, "text"]
+
+
+class TestExtractHeadings:
+    def test_toc_skips_code_blocks(self):
+        content = "# Title\n\n```bash\n# comment\n## also comment\n```\n\n## Section One\n### Deep\n"
+        headings = extract_headings(content)
+
+        assert [(h["level"], h["text"], h["anchor"]) for h in headings] == [
+            (1, "Title", "title"),
+            (2, "Section One", "section-one"),
+        ]
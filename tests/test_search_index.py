@@ -0,0 +1,271 @@
+"""Tests for search_index module."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from aidocs_cli import mcp_server
+from aidocs_cli.chunk_store import ChunkStore
+from aidocs_cli.chunker import chunk_directory
+from aidocs_cli.search_index import (
+    INDEX_MANIFEST_FILENAME,
+    SearchIndex,
+    get_search_index_dir,
+    open_search_index,
+    stem,
+    tokenize,
+    update_search_index,
+)
+
+
+def chunk(title: str, content: str, chunk_index: int = 0, parents: list[str] | None = None) -> dict:
+    return {"chunk_index": chunk_index, "title": title, "hierarchy": (parents or []) + [title], "content": content}
+
+
+def filler(n: int) -> list[tuple[str, list[dict]]]:
+    """Files that match nothing, so query terms are rare."""
+    return [(f"other{i}.md", [chunk("Other", "Nothing relevant here.")]) for i in range(n)]
+
+
+class TestTokenize:
+    def test_stopwords_and_stemming(self):
+        assert tokenize("How do I create the Webhooks?") == ["create", "webhook"]
+        assert tokenize("Creating webhooks", stemming=False) == ["creating", "webhooks"]
+
+    def test_stem(self):
+        assert [stem(w) for w in ["users", "invoices", "created", "running", "policies", "class", "v2"]] == [
+            "user", "invoice", "create", "run", "polici", "class", "v2",
+        ]
+
+
+class TestSearchIndex:
+    def test_title_matches_outweigh_body_matches(self):
+        index = SearchIndex.build([
+            ("a.md", [chunk("Intro", "Webhooks send events.")]),
+            ("b.md", [chunk("Webhooks", "Events are sent.")]),
+        ] + filler(5))
+
+        results = index.search("webhooks")
+
+        assert [r["file_path"] for r in results] == ["b.md", "a.md"]
+        assert results[0]["hierarchy"] == ["Webhooks"]
+        assert results[0]["score"] > results[1]["score"] > 0
+
+    def test_parent_headings_are_searched(self):
+        index = SearchIndex.build([
+            ("a.md", [chunk("Retries", "Failed calls are retried.", parents=["Webhooks"])]),
+        ] + filler(3))
+
+        assert [r["title"] for r in index.search("webhook retries")] == ["Retries"]
+
+    def test_rare_terms_outweigh_common_ones(self):
+        index = SearchIndex.build([
+            ("a.md", [chunk("Users", "Users and more users.")]),
+            ("b.md", [chunk("Export", "Export users.")]),
+        ] + [(f"u{i}.md", [chunk("Users", "Users.")]) for i in range(10)])
+
+        assert index.search("users export")[0]["file_path"] == "b.md"
+
+    def test_term_frequency_saturates_and_long_bodies_are_normalised(self):
+        index = SearchIndex.build([
+            ("short.md", [chunk("Intro", "Token rotation.")]),
+            ("long.md", [chunk("Intro", "Token rotation. " + "Unrelated words go here. " * 50)]),
+            ("spam.md", [chunk("Intro", "token " * 40 + "Unrelated words go here. " * 40)]),
+        ] + filler(5))
+
+        results = {r["file_path"]: r["score"] for r in index.search("token")}
+
+        assert results["short.md"] > results["long.md"]
+        assert results["short.md"] < results["spam.md"] < 2 * results["short.md"]
+
+    def test_matches_whole_words_and_forms(self):
+        index = SearchIndex.build([("a.md", [chunk("Catalog", "Browse the catalogs.")])])
+
+        assert index.search("log") == []
+        assert len(index.search("CATALOG")) == 1
+        assert index.search("the") == []
+
+    def test_without_stemming(self):
+        index = SearchIndex.build([("a.md", [chunk("Webhooks", "Send webhooks.")])], stemming=False)
+
+        assert index.search("webhook") == []
+        assert len(index.search("webhooks")) == 1
+
+    def test_ties_keep_docs_order_and_limit(self):
+        index = SearchIndex.build([
+            (f"{name}.md", [chunk("Setup", "Install the client.")]) for name in ["c", "a", "b"]
+        ] + filler(3))
+
+        assert [r["file_path"] for r in index.search("install client", limit=2)] == ["c.md", "a.md"]
+        assert [r["file_path"] for r in index.search("install", limit=2)] == ["c.md", "a.md"]
+
+    def test_long_content_preview_is_cut(self):
+        index = SearchIndex.build([("a.md", [chunk("Long", "word " * 100)])])
+
+        assert index.search("word")[0]["content_preview"] == ("word " * 60) + "..."
+
+
+def open_index(docs: Path):
+    def resolve(hits):
+        with ChunkStore.open(docs, readonly=True) as store:
+            return [store.get_chunk(path, chunk_index) for path, chunk_index in hits]
+
+    return open_search_index(docs, resolve)
+
+
+class TestPersistedIndex:
+    def test_chunk_directory_updates_changed_files(self, tmp_path: Path):
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        (docs / "a.md").write_text("# Users\n\nCreate users.\n")
+        (docs / "b.md").write_text("# Teams\n\nInvite people.\n")
+        chunk_directory(docs)
+
+        index = open_index(docs)
+        assert [(r["file_path"], r["title"]) for r in index.search("users")] == [(f"{docs.name}/a.md", "Users")]
+
+        (docs / "a.md").write_text("# Roles\n\nAssign roles.\n")
+        (docs / "b.md").unlink()
+        chunk_directory(docs)
+
+        index = open_index(docs)
+        assert index.search("users") == []
+        assert index.search("teams") == []
+        assert [r["title"] for r in index.search("roles")] == ["Roles"]
+
+    def test_unchanged_run_writes_nothing(self, tmp_path: Path):
+        (tmp_path / "a.md").write_text("# Users\n\nCreate users.\n")
+        chunk_directory(tmp_path)
+        manifest_path = get_search_index_dir(tmp_path) / INDEX_MANIFEST_FILENAME
+        before = manifest_path.read_text()
+
+        chunk_directory(tmp_path)
+
+        assert json.loads(manifest_path.read_text())["segments"] == json.loads(before)["segments"]
+
+    def test_other_version_is_rebuilt(self, tmp_path: Path):
+        (tmp_path / "a.md").write_text("# Users\n\nCreate users.\n")
+        chunk_directory(tmp_path)
+        manifest_path = get_search_index_dir(tmp_path) / INDEX_MANIFEST_FILENAME
+        manifest_path.write_text(json.dumps({"version": 0}))
+        assert open_index(tmp_path) is None
+
+        chunk_directory(tmp_path)
+
+        assert len(open_index(tmp_path).search("users")) == 1
+
+    def test_segments_are_merged(self, tmp_path: Path):
+        (tmp_path / "base.md").write_text("".join(f"## Section {i}\n\nText.\n\n" for i in range(20)))
+        chunk_directory(tmp_path)
+
+        for i in range(16):
+            chunks = [{"chunk_index": 0, "title": f"Page {i}", "hierarchy": [f"Page {i}"], "content": f"Topic{i}."}]
+            stats = update_search_index(tmp_path, [(f"page{i}.md", chunks)])
+
+        assert stats["chunks"] == 20 + 16
+        assert stats["segments"] <= 4
+        assert len(list(get_search_index_dir(tmp_path).glob("*.seg"))) == stats["segments"]
+
+
+    def test_scores_survive_delete_and_reinsert(self, tmp_path: Path):
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        for i in range(12):
+            words = " ".join(["retries"] * (i % 3 + 1) + ["payload"] * (i % 4))
+            (docs / f"hook{i:02}.md").write_text(f"# Webhook {i}\n\nEach webhook {words} body.\n")
+        chunk_directory(docs)
+
+        def ranking():
+            return [(r["file_path"], r["score"]) for r in open_index(docs).search("webhook retries payload", 20)]
+
+        before = ranking()
+        content = (docs / "hook05.md").read_text()
+        (docs / "hook05.md").unlink()
+        chunk_directory(docs)
+        (docs / "hook05.md").write_text(content)
+        chunk_directory(docs)
+
+        manifest = json.loads((get_search_index_dir(docs) / INDEX_MANIFEST_FILENAME).read_text())
+        assert [entry["deleted"] for entry in manifest["segments"]] == [[f"{docs.name}/hook05.md"], []]
+        assert sorted(ranking()) == sorted(before)
+        with ChunkStore.open(docs, readonly=True) as store:
+            rebuilt = SearchIndex.build([(path, list(chunks)) for path, chunks in store.iter_files()])
+        assert sorted((r["file_path"], r["score"]) for r in rebuilt.search("webhook retries payload", 20)) == sorted(before)
+
+    def test_many_deletes_rewrite_the_index(self, tmp_path: Path):
+        for i in range(8):
+            (tmp_path / f"page{i}.md").write_text(f"# Page {i}\n\nUsers {'and teams ' * i}here.\n")
+        chunk_directory(tmp_path)
+
+        for i in range(3):
+            (tmp_path / f"page{i}.md").unlink()
+        chunk_directory(tmp_path)
+
+        manifest = json.loads((get_search_index_dir(tmp_path) / INDEX_MANIFEST_FILENAME).read_text())
+        assert [(entry["chunks"], entry["deleted"]) for entry in manifest["segments"]] == [(5, [])]
+        with ChunkStore.open(tmp_path, readonly=True) as store:
+            rebuilt = SearchIndex.build([(path, list(chunks)) for path, chunks in store.iter_files()])
+        assert open_index(tmp_path).search("users teams") == rebuilt.search("users teams")
+
+
+class TestMcpSearch:
+    def test_index_is_rebuilt_after_chunking(self, tmp_path: Path):
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        (docs / "a.md").write_text("# Users\n\nCreate users.\n")
+        chunk_directory(docs)
+
+        assert [r["file_path"] for r in mcp_server.search_chunks(docs, "users")] == ["a.md"]
+        index = mcp_server.get_search_index(docs)
+        assert mcp_server.get_search_index(docs) is index
+
+        (docs / "b.md").write_text("# Teams\n\nInvite users to teams.\n")
+        chunk_directory(docs)
+
+        assert mcp_server.get_search_index(docs) is not index
+        assert [r["file_path"] for r in mcp_server.search_chunks(docs, "teams")] == ["b.md"]
+
+    def test_works_without_chunking(self, tmp_path: Path):
+        docs = tmp_path / "docs"
+        (docs / "guides").mkdir(parents=True)
+        (docs / "guides" / "a.md").write_text("# Users\n\nCreate users.\n")
+
+        assert [r["file_path"] for r in mcp_server.search_chunks(docs, "users")] == ["guides/a.md"]
+
+    def test_files_not_chunked_yet_are_searched(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(mcp_server, "DOCS_RESCAN_SECONDS", 0)
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        (docs / "a.md").write_text("# Users\n\nCreate users.\n")
+        (docs / "b.md").write_text("# Teams\n\nInvite people.\n")
+        chunk_directory(docs)
+        assert mcp_server.search_chunks(docs, "webhooks") == []
+
+        (docs / "a.md").write_text("# Roles\n\nAssign roles.\n")
+        (docs / "b.md").unlink()
+        (docs / "c.md").write_text("# Webhooks\n\nSend webhooks.\n")
+
+        assert [r["file_path"] for r in mcp_server.search_chunks(docs, "webhooks")] == ["c.md"]
+        assert [r["title"] for r in mcp_server.search_chunks(docs, "roles")] == ["Roles"]
+        assert mcp_server.search_chunks(docs, "users") == []
+        assert mcp_server.search_chunks(docs, "teams") == []
+
+    def test_repeated_queries_do_not_rescan_the_docs(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        (docs / "a.md").write_text("# Users\n\nCreate users.\n")
+        chunk_directory(docs)
+        scans = []
+        docs_signature = mcp_server._docs_signature
+        monkeypatch.setattr(mcp_server, "_docs_signature", lambda docs_dir: scans.append(docs_dir) or docs_signature(docs_dir))
+
+        for _ in range(20):
+            assert [r["file_path"] for r in mcp_server.search_chunks(docs, "users")] == ["a.md"]
+        assert len(scans) == 1
+
+        # Chunking changes the store, which is noticed right away
+        (docs / "b.md").write_text("# Teams\n\nInvite users to teams.\n")
+        chunk_directory(docs)
+        assert [r["file_path"] for r in mcp_server.search_chunks(docs, "teams")] == ["b.md"]
+        assert len(scans) == 2
@@ -0,0 +1,182 @@
+"""Tests for sinks module."""
+
+import csv
+import json
+import sqlite3
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+import pytest
+
+from aidocs_cli.sinks import (
+    PGCOPY_HEADER,
+    PGCOPY_TRAILER,
+    DatabaseSink,
+    PostgresSink,
+    SqliteSink,
+    create_database_sink,
+    create_file_sink,
+)
+
+CHUNK = {
+    "chunk_index": 1,
+    "title": "Install",
+    "hierarchy": ["Guide", "Install"],
+    "content": "## Install\n\nIt's \"easy\", really.",
+    "metadata": {"has_code": False},
+}
+SUMMARY = {"deleted": 1, "synced": 1, "embeddings": 1}
+
+
+def write_sample(sink) -> None:
+    with sink:
+        sink.start_file("docs/old.md", "delete")
+        sink.end_file()
+        sink.start_file("docs/guide.md", "update")
+        sink.delete_chunk("docs/guide.md", "Guide > Gone")
+        sink.update_chunk("docs/guide.md", "Guide > Install", CHUNK, [0.5, -0.25])
+        sink.end_file()
+        sink.commit(SUMMARY)
+
+
+class TestSqlFileSink:
+    def test_writes_statements(self, tmp_path: Path):
+        sink = create_file_sink(tmp_path, "doc_embeddings")
+        write_sample(sink)
+
+        sql = (tmp_path / "sync.sql").read_text()
+        assert "DELETE FROM doc_embeddings WHERE file_path = 'docs/old.md';" in sql
+        assert "content = '## Install\n\nIt''s \"easy\", really.'" in sql
+        assert "embedding = '[0.50000000, -0.25000000]'::vector" in sql
+        assert sql.index("BEGIN;") < sql.index("COMMIT;")
+        assert not (tmp_path / "sync.sql.tmp").exists()
+
+
+    def test_resume_truncates_to_checkpoint(self, tmp_path: Path):
+        sink = create_file_sink(tmp_path, "doc_embeddings")
+        with sink:
+            sink.start_file("docs/old.md", "delete")
+            checkpoint = sink.end_file()
+            sink.start_file("docs/lost.md", "delete")
+            sink.abort()
+
+        resumed = create_file_sink(tmp_path, "doc_embeddings")
+        assert resumed.resume(checkpoint)
+        with resumed:
+            resumed.start_file("docs/guide.md", "replace")
+            resumed.end_file()
+            resumed.commit(SUMMARY)
+
+        sql = (tmp_path / "sync.sql").read_text()
+        assert sql.count("BEGIN;") == 1
+        assert "docs/old.md" in sql
+        assert "docs/lost.md" not in sql
+        assert "docs/guide.md" in sql
+
+    def test_resume_needs_temp_file(self, tmp_path: Path):
+        sink = create_file_sink(tmp_path, "doc_embeddings")
+        assert not sink.resume({"offset": 10})
+
+
+class TestCopyFileSink:
+    def test_csv_rows_and_loader(self, tmp_path: Path):
+        sink = create_file_sink(tmp_path, "doc_embeddings", "csv")
+        write_sample(sink)
+
+        with open(tmp_path / "sync.copy.csv", newline="") as f:
+            rows = list(csv.reader(f))
+        assert rows == [[
+            "docs/guide.md",
+            CHUNK["content"],
+            "1",
+            "Install",
+            json.dumps({"has_code": False, "hierarchy": ["Guide", "Install"], "chunk_id": "Guide > Install"}),
+            "[0.5,-0.25]",
+        ]]
+
+        loader = (tmp_path / "sync.load.sql").read_text()
+        # Modified rows are deleted before the bulk load re-adds them
+        delete = loader.index("metadata->>'chunk_id' = 'Guide > Install';")
+        copy = loader.index("\\copy doc_embeddings (file_path, content, chunk_index, title, metadata, embedding)")
+        assert delete < copy < loader.index("COMMIT;")
+        assert f"FROM '{tmp_path / 'sync.copy.csv'}' WITH (FORMAT csv)" in loader
+
+    def test_binary_encoding(self, tmp_path: Path):
+        sink = create_file_sink(tmp_path, "doc_embeddings", "binary")
+        write_sample(sink)
+
+        data = (tmp_path / "sync.copy.bin").read_bytes()
+        assert data.startswith(PGCOPY_HEADER)
+        assert data.endswith(PGCOPY_TRAILER)
+
+        pos = len(PGCOPY_HEADER)
+        (field_count,) = struct.unpack_from("!h", data, pos)
+        pos += 2
+        fields = []
+        for _ in range(field_count):
+            (length,) = struct.unpack_from("!i", data, pos)
+            pos += 4
+            fields.append(data[pos:pos + length])
+            pos += length
+
+        assert field_count == 6
+        assert fields[0] == b"docs/guide.md"
+        assert struct.unpack("!i", fields[2]) == (1,)
+        assert fields[4][:1] == b"\x01"
+        assert struct.unpack("!hhff", fields[5]) == (2, 0, 0.5, -0.25)
+        assert "WITH (FORMAT binary)" in (tmp_path / "sync.load.sql").read_text()
+
+
+class TestDatabaseSinks:
+    def test_create_from_url(self, tmp_path: Path):
+        assert isinstance(create_database_sink("postgresql://localhost/db", "t"), PostgresSink)
+        sink = create_database_sink(f"sqlite:///{tmp_path}/docs.db", "t")
+        assert isinstance(sink, SqliteSink)
+        assert sink.db_path == tmp_path / "docs.db"
+
+        with pytest.raises(ValueError):
+            create_database_sink("mysql://localhost/db", "t")
+
+    def test_incomplete_sink_cannot_be_created(self):
+        class NoConnection(DatabaseSink):
+            def _execute(self, ops):
+                pass
+
+        with pytest.raises(TypeError, match="open"):
+            NoConnection("t")
+
+    def test_sqlite_upserts_are_idempotent(self, tmp_path: Path):
+        db_path = tmp_path / "docs.db"
+        for _ in range(2):
+            write_sample(SqliteSink(db_path, "doc_embeddings"))
+
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute("SELECT file_path, chunk_index, metadata, embedding FROM doc_embeddings").fetchall()
+        assert len(rows) == 1
+
+        file_path, chunk_index, metadata, blob = rows[0]
+        assert (file_path, chunk_index) == ("docs/guide.md", 1)
+        assert json.loads(metadata)["chunk_id"] == "Guide > Install"
+        assert array("f", blob).tolist() == [0.5, -0.25]
+
+    def test_batches_are_separate_transactions(self, tmp_path: Path):
+        sink = SqliteSink(tmp_path / "docs.db", "doc_embeddings", batch_size=1)
+        batches = []
+        execute = sink._execute
+        sink._execute = lambda ops: (batches.append(len(ops)), execute(ops))
+
+        with sink:
+            for name in ("a", "b"):
+                sink.start_file(f"docs/{name}.md", "new")
+                sink.insert_chunk(f"docs/{name}.md", name, CHUNK, [1.0])
+                sink.end_file()
+            sink.commit(SUMMARY)
+
+        assert batches == [2, 2]
+
+    def test_postgres_requires_optional_dependency(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setitem(sys.modules, "psycopg_pool", None)
+        with pytest.raises(RuntimeError, match="aidocs\\[postgres\\]"):
+            PostgresSink("postgresql://localhost/db", "t").open()
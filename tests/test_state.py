@@ -0,0 +1,79 @@
+"""Tests for state module."""
+
+import json
+import threading
+from pathlib import Path
+
+from aidocs_cli import state as state_module
+from aidocs_cli.state import JournaledState, atomic_write_text, file_lock
+
+
+class TestAtomicWrite:
+    def test_replaces_content_without_leftovers(self, tmp_path: Path):
+        path = tmp_path / ".chunks" / "manifest.json"
+        atomic_write_text(path, "old")
+        atomic_write_text(path, "new")
+
+        assert path.read_text() == "new"
+        assert [p.name for p in path.parent.iterdir()] == ["manifest.json"]
+
+
+class TestJournaledState:
+    def test_updates_replay_over_snapshot(self, tmp_path: Path):
+        state = JournaledState(tmp_path / "manifest.json")
+        assert state.load() is None
+
+        state.save({"version": "1.0", "files": {"a.md": {"hash": "a"}, "b.md": {"hash": "b"}}})
+        state.update({"a.md": {"hash": "a2"}}, last_run="now")
+        state.update({"b.md": None, "c.md": {"hash": "c"}})
+
+        assert json.loads(state.path.read_text())["files"]["a.md"] == {"hash": "a"}
+        assert state.load() == {
+            "version": "1.0",
+            "files": {"a.md": {"hash": "a2"}, "c.md": {"hash": "c"}},
+            "last_run": "now",
+        }
+
+    def test_torn_line_is_skipped(self, tmp_path: Path):
+        state = JournaledState(tmp_path / "manifest.json")
+        state.update({"a.md": {"hash": "a"}})
+        with open(state.journal_path, "a") as f:
+            f.write('{"files": {"b.md"')  # crashed mid-write
+
+        state.update({"c.md": {"hash": "c"}})
+
+        assert state.load()["files"] == {"a.md": {"hash": "a"}, "c.md": {"hash": "c"}}
+
+    def test_journal_is_compacted(self, tmp_path: Path, monkeypatch):
+        monkeypatch.setattr(state_module, "COMPACT_MIN_BYTES", 200)
+        state = JournaledState(tmp_path / "manifest.json")
+        state.save({"files": {}})
+
+        for i in range(10):
+            state.update({f"page{i}.md": {"hash": str(i)}})
+
+        # Entries were folded into the snapshot along the way
+        assert len(json.loads(state.path.read_text())["files"]) >= 5
+        assert len(state.load()["files"]) == 10
+
+    def test_load_waits_for_a_compaction(self, tmp_path: Path):
+        state = JournaledState(tmp_path / "manifest.json")
+        state.update({"a.md": {"hash": "a"}})
+        loaded = []
+
+        with file_lock(state.lock_path):
+            reader = threading.Thread(target=lambda: loaded.append(state.load()))
+            reader.start()
+            reader.join(0.2)
+            assert reader.is_alive()
+            state._write_snapshot(state._read())
+
+        reader.join()
+        assert loaded[0]["files"] == {"a.md": {"hash": "a"}}
+
+    def test_lock_is_released(self, tmp_path: Path):
+        lock_path = tmp_path / "state.lock"
+        with file_lock(lock_path):
+            pass
+        with file_lock(lock_path):
+            assert lock_path.exists()
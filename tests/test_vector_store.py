@@ -0,0 +1,212 @@
+"""Tests for vector_store module."""
+
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from aidocs_cli import mcp_server, vector_store  # noqa: E402
+from aidocs_cli.chunker import chunk_directory  # noqa: E402
+from aidocs_cli.embedding_cache import CACHE_FILENAME  # noqa: E402
+from aidocs_cli.embeddings import EmbeddingProvider, generate_sync_sql  # noqa: E402
+from aidocs_cli.vector_store import (  # noqa: E402
+    INDEX_FILENAME,
+    MIN_CAPACITY,
+    VectorStore,
+    get_vector_store_dir,
+    update_vector_store,
+)
+
+TOPICS = ["user", "team", "invoice", "webhook"]
+
+
+class TopicProvider(EmbeddingProvider):
+    """Embeds a text as the counts of a few topic words in it."""
+
+    name = "topics"
+
+    def __init__(self, model: str = "topics-v1"):
+        super().__init__(model, len(TOPICS))
+        self.embedded: list[str] = []
+
+    def embed(self, inputs: list[str]) -> list[list[float]]:
+        self.embedded += inputs
+        return [[float(text.lower().count(topic)) for topic in TOPICS] for text in inputs]
+
+
+@pytest.fixture
+def docs_dir(tmp_path: Path) -> Path:
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "users.md").write_text("# Users\n\nInvite a user.\n\n## Teams\n\nAdd the user to a team.\n")
+    (docs / "billing.md").write_text("# Billing\n\nEach invoice is sent by webhook.\n")
+    chunk_directory(docs)
+    return docs
+
+
+class TestVectorStore:
+    def test_search_ranks_by_cosine_similarity(self, docs_dir: Path):
+        stats = update_vector_store(docs_dir, TopicProvider())
+        assert stats == {"chunks": 3, "updated": 2, "removed": 0, "lists": 0, "missing": 0, "missing_tokens": 0}
+
+        vectors = VectorStore.open(docs_dir)
+        results = vectors.search([0, 0, 1, 0], limit=2)
+
+        assert [(path, chunk_index) for path, chunk_index, _ in results] == [
+            ("docs/billing.md", 0), ("docs/users.md", 0),
+        ]
+        assert results[0][2] == pytest.approx(2 ** -0.5)
+        assert results[1][2] == 0
+
+    def test_only_new_contents_are_embedded(self, docs_dir: Path):
+        update_vector_store(docs_dir, TopicProvider())
+
+        (docs_dir / "users.md").write_text("# Users\n\nInvite a user.\n\n## Teams\n\nRename a team.\n")
+        (docs_dir / "billing.md").unlink()
+        chunk_directory(docs_dir)
+        provider = TopicProvider()
+        stats = update_vector_store(docs_dir, provider)
+
+        assert provider.embedded == ["## Teams\n\nRename a team."]
+        assert stats == {"chunks": 2, "updated": 1, "removed": 1, "lists": 0, "missing": 0, "missing_tokens": 0}
+        results = VectorStore.open(docs_dir).search([0, 1, 0, 0])
+        assert [(path, chunk_index) for path, chunk_index, _ in results] == [("docs/users.md", 1), ("docs/users.md", 0)]
+
+    def test_unchanged_run_writes_nothing(self, docs_dir: Path):
+        update_vector_store(docs_dir, TopicProvider())
+        index_path = get_vector_store_dir(docs_dir) / INDEX_FILENAME
+        mtime = index_path.stat().st_mtime_ns
+
+        provider = TopicProvider()
+        assert update_vector_store(docs_dir, provider)["updated"] == 0
+        assert provider.embedded == []
+        assert index_path.stat().st_mtime_ns == mtime
+
+    def test_other_model_starts_over(self, docs_dir: Path):
+        update_vector_store(docs_dir, TopicProvider())
+        provider = TopicProvider("topics-v2")
+
+        update_vector_store(docs_dir, provider)
+
+        assert len(provider.embedded) == 3
+        assert VectorStore.open(docs_dir).model == "topics-v2"
+
+    def test_matrix_grows_and_drops_stale_rows(self, docs_dir: Path):
+        page = docs_dir / "many.md"
+        for round_no in range(4):
+            page.write_text("".join(f"## User {i}\n\nUser {round_no} {i}.\n\n" for i in range(MIN_CAPACITY // 2)))
+            chunk_directory(docs_dir)
+            update_vector_store(docs_dir, TopicProvider())
+
+        vector_dir = get_vector_store_dir(docs_dir)
+        index = json.loads((vector_dir / INDEX_FILENAME).read_text())
+        live = sum(entry["end"] - entry["start"] for entry in index["files"].values())
+        assert live == MIN_CAPACITY // 2 + 3
+        assert index["rows"] - live <= max(live, MIN_CAPACITY)
+        assert len(list(vector_dir.glob("*.npy"))) == 2
+        assert len(VectorStore.open(docs_dir).search([1, 0, 0, 0], limit=1000)) == live
+
+    def test_ann_index_is_built_and_kept_up_to_date(self, docs_dir: Path):
+        notes = "".join(
+            f"## Note {i}\n\n" + "user " * (i % 3) + "team " * (i % 5) + "invoice " * (i % 7) + "\n\n"
+            for i in range(200)
+        )
+        (docs_dir / "notes.md").write_text(notes)
+        chunk_directory(docs_dir)
+
+        stats = update_vector_store(docs_dir, TopicProvider(), ann_min_chunks=100, ann_lists=8)
+        assert stats["lists"] == 8
+
+        (docs_dir / "hooks.md").write_text("# Hooks\n\nEvery webhook, webhook and webhook.\n")
+        chunk_directory(docs_dir)
+        assert update_vector_store(docs_dir, TopicProvider(), ann_min_chunks=100, ann_lists=8)["lists"] == 8
+
+        vectors = VectorStore.open(docs_dir)
+        exact = vectors.search([1, 1, 1, 0], limit=5, probes=0)
+        assert vectors.search([1, 1, 1, 0], limit=5, probes=8) == exact
+        assert vectors.search([0, 0, 0, 1], limit=1, probes=1)[0][:2] == ("docs/hooks.md", 0)
+        assert vectors.search([1, 1, 1, 0], limit=1, probes=2)[0][2] == pytest.approx(exact[0][2])
+
+    def test_ann_index_follows_the_settings(self, docs_dir: Path):
+        update_vector_store(docs_dir, TopicProvider())
+        assert update_vector_store(docs_dir, TopicProvider(), ann_min_chunks=2, ann_lists=2)["lists"] == 2
+        assert update_vector_store(docs_dir, TopicProvider(), ann_min_chunks=2, ann_lists=3)["lists"] == 3
+        assert len(VectorStore.open(docs_dir).search([1, 0, 0, 0], limit=10, probes=1)) >= 1
+
+    def test_clusters_are_only_trained_again_for_new_vectors(self, docs_dir: Path, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(vector_store, "MIN_CAPACITY", 16)
+        for n in range(3):
+            (docs_dir / f"notes{n}.md").write_text("".join(
+                f"## Note {n} {i}\n\n" + "user " * (i % 3) + "team " * (i % 5) + "invoice " * (i % 7) + "\n\n"
+                for i in range(110)
+            ))
+        chunk_directory(docs_dir)
+        update_vector_store(docs_dir, TopicProvider(), ann_min_chunks=100, ann_lists=8)
+
+        trained = []
+        train_centroids = vector_store.train_centroids
+        monkeypatch.setattr(vector_store, "train_centroids", lambda *args: trained.append(args) or train_centroids(*args))
+
+        # Rows of removed files are compacted away, keeping the clusters
+        (docs_dir / "notes1.md").unlink()
+        (docs_dir / "notes2.md").unlink()
+        chunk_directory(docs_dir)
+        stats = update_vector_store(docs_dir, TopicProvider(), ann_min_chunks=100, ann_lists=8)
+        index = json.loads((get_vector_store_dir(docs_dir) / INDEX_FILENAME).read_text())
+        assert (stats["removed"], stats["lists"], index["rows"]) == (2, 8, 113)
+        assert trained == []
+
+        # A file missing from the cache is left alone until it can be embedded
+        (docs_dir / "hooks.md").write_text("# Hooks\n\nEvery webhook.\n")
+        chunk_directory(docs_dir)
+        index_path = get_vector_store_dir(docs_dir) / INDEX_FILENAME
+        assert update_vector_store(docs_dir, TopicProvider(), ann_min_chunks=100, ann_lists=8, cache_only=True)["missing"] == 1
+        mtime = index_path.stat().st_mtime_ns
+        assert update_vector_store(docs_dir, TopicProvider(), ann_min_chunks=100, ann_lists=8, cache_only=True)["updated"] == 0
+        assert index_path.stat().st_mtime_ns == mtime
+        assert trained == []
+
+        vectors = VectorStore.open(docs_dir)
+        assert vectors.search([1, 1, 1, 0], limit=5, probes=8) == vectors.search([1, 1, 1, 0], limit=5, probes=0)
+
+    def test_sync_keeps_local_vectors(self, docs_dir: Path):
+        result = generate_sync_sql(docs_dir, provider=TopicProvider())
+
+        assert result["stats"]["local_vectors"]["chunks"] == 3
+        assert len(VectorStore.open(docs_dir)) == 3
+
+    def test_sync_only_embeds_for_local_vectors_when_asked(self, docs_dir: Path):
+        generate_sync_sql(docs_dir, provider=TopicProvider())
+        shutil.rmtree(get_vector_store_dir(docs_dir))
+        (docs_dir / ".chunks" / CACHE_FILENAME).unlink()
+
+        provider = TopicProvider()
+        result = generate_sync_sql(docs_dir, provider=provider)
+        assert provider.embedded == []
+        assert result["stats"]["local_vectors"]["missing"] == 3
+        assert len(VectorStore.open(docs_dir)) == 0
+
+        statuses = []
+        result = generate_sync_sql(docs_dir, provider=provider, on_status=statuses.append, local_vectors=True)
+        assert len(provider.embedded) == 3
+        assert any(status.startswith("Embedding 3 chunks (~") for status in statuses)
+        assert result["stats"]["local_vectors"]["missing"] == 0
+        assert len(VectorStore.open(docs_dir)) == 3
+
+
+class TestSemanticSearch:
+    def test_results_come_from_the_chunk_store(self, docs_dir: Path, monkeypatch: pytest.MonkeyPatch):
+        update_vector_store(docs_dir, TopicProvider())
+        monkeypatch.setattr(mcp_server, "get_embedding_provider", lambda name, model, dimensions=None: TopicProvider(model))
+        monkeypatch.setattr(mcp_server, "_query_providers", {})
+
+        results = mcp_server.semantic_search(docs_dir, "Which team?", limit=1)
+
+        assert [(r["file_path"], r["title"]) for r in results] == [("users.md", "Teams")]
+        assert results[0]["score"] == pytest.approx(0.8944)
+
+    def test_without_vectors(self, tmp_path: Path):
+        assert "aidocs rag" in mcp_server.semantic_search(tmp_path, "users")["error"]
@@ -0,0 +1,50 @@
+"""Tests for watcher module."""
+
+from pathlib import Path
+
+from aidocs_cli.chunker import chunk_directory
+from aidocs_cli.embeddings import EmbeddingProvider, generate_sync_sql, load_last_sync
+from aidocs_cli.watcher import WatchState, process_pending_files
+
+
+class LengthProvider(EmbeddingProvider):
+    """Embeds a text as [length, 1], recording every text it embeds."""
+
+    name = "length"
+
+    def __init__(self):
+        super().__init__("length-v1", 2)
+        self.embedded: list[str] = []
+
+    def embed(self, inputs: list[str]) -> list[list[float]]:
+        self.embedded += inputs
+        return [[float(len(text)), 1.0] for text in inputs]
+
+
+class TestProcessPendingFiles:
+    def test_sync_state_is_left_to_rag_vectors(self, tmp_path: Path):
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        page = docs / "users.md"
+        page.write_text("# Users\n\nInvite a user.\n")
+        chunk_directory(docs)
+        provider = LengthProvider()
+        generate_sync_sql(docs, provider=provider)
+        synced = load_last_sync(docs)["files"]
+
+        page.write_text("# Users\n\nInvite a user.\n\n## Roles\n\nAssign a role.\n")
+        state = WatchState(docs)
+        state.provider = provider
+        state.embeddings_enabled = True
+        state.pending_files.add(page)
+        process_pending_files(state, with_vectors=True, table_name="doc_embeddings")
+
+        assert provider.embedded[-1] == "## Roles\n\nAssign a role."
+        assert load_last_sync(docs)["files"] == synced
+
+        # The next sync writes the change, with the embedding the watcher cached
+        embedded = len(provider.embedded)
+        result = generate_sync_sql(docs, provider=provider)
+        assert result["stats"]["to_sync"] == 1
+        assert len(provider.embedded) == embedded
+        assert "Assign a role." in Path(result["sql_file"]).read_text()